@@ -0,0 +1,205 @@
+"""
+Launch-latency benchmarks for the ``harlequin`` management command.
+
+Everything runs offline: ``os.execvpe`` is stubbed out, as in the test suite,
+and database connections are configured but never opened.
+
+Run from the repository root:
+
+.. code-block:: console
+
+    $ python benchmarks/launch.py --output before.json
+    $ python benchmarks/launch.py --output after.json --compare before.json
+
+Results are written as JSON. With ``--compare``, each benchmark’s median is
+compared against the previous run, and the exit code is 1 if any regressed by
+more than ``--threshold``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "src"))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.exceptions import ImproperlyConfigured  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db.utils import ConnectionHandler  # noqa: E402
+
+from django_harlequin.management.commands import (  # noqa: E402
+    harlequin as harlequin_command,
+)
+
+COMMAND_MODULE = "django_harlequin.management.commands.harlequin"
+
+DATABASES: dict[str, dict[str, Any]] = {
+    "mysql": {
+        "ENGINE": "django.db.backends.mysql",
+        "NAME": "exampledb",
+        "USER": "user",
+        "PASSWORD": "password123",
+        "HOST": "localhost",
+        "PORT": "3307",
+    },
+    "postgres": {
+        "ENGINE": "django.db.backends.postgresql",
+        "HOST": "localhost",
+        "NAME": "exampledb",
+        "OPTIONS": {},
+        "PASSWORD": "password123",
+        "PORT": "5433",
+        "USER": "user",
+    },
+    "sqlite": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "example.db",
+    },
+}
+
+
+def summarize(timings: list[float], loops: int) -> dict[str, Any]:
+    per_loop = [t / loops for t in timings]
+    return {
+        "unit": "seconds",
+        "loops": loops,
+        "repeat": len(timings),
+        "min": min(per_loop),
+        "median": statistics.median(per_loop),
+        "mean": statistics.fmean(per_loop),
+        "stdev": statistics.stdev(per_loop) if len(per_loop) > 1 else 0.0,
+    }
+
+
+def time_callable(func: Callable[[], object], repeat: int) -> dict[str, Any]:
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    return summarize(timer.repeat(repeat=repeat, number=loops), loops)
+
+
+def bench_vendor(vendor: str, repeat: int) -> dict[str, dict[str, Any]]:
+    connections = ConnectionHandler({"default": DATABASES[vendor]})
+    try:
+        connection = connections["default"]
+    except ImproperlyConfigured as exc:
+        return {f"{vendor}.skipped": {"reason": str(exc)}}
+
+    command = harlequin_command.Command()
+    extend = getattr(command, f"extend_command_env_{vendor}")
+
+    def run_extend() -> None:
+        extend(connection, ["harlequin"], {})
+
+    def run_handle() -> None:
+        call_command("harlequin")
+
+    results = {f"extend_command_env_{vendor}": time_callable(run_extend, repeat)}
+    with (
+        mock.patch.object(harlequin_command, "connections", connections),
+        mock.patch.object(os, "execvpe"),
+    ):
+        results[f"handle.{vendor}"] = time_callable(run_handle, repeat)
+    return results
+
+
+def bench_cold_import(repeat: int) -> dict[str, dict[str, Any]]:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+
+    def run(code: str) -> float:
+        start = timeit.default_timer()
+        subprocess.run([sys.executable, "-c", code], env=env, check=True)
+        return timeit.default_timer() - start
+
+    baseline = [run("pass") for _ in range(repeat)]
+    imports = [run(f"import {COMMAND_MODULE}") for _ in range(repeat)]
+    return {
+        "cold_import.interpreter": summarize(baseline, 1),
+        "cold_import.command_module": summarize(imports, 1),
+    }
+
+
+def compare(
+    results: dict[str, dict[str, Any]],
+    previous: dict[str, dict[str, Any]],
+    threshold: float,
+) -> bool:
+    regressed = False
+    for name, stats in sorted(results.items()):
+        before = previous.get(name, {}).get("median")
+        if "median" not in stats or not before:
+            continue
+        ratio = stats["median"] / before
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  REGRESSION"
+            regressed = True
+        print(f"{name:40} {ratio:6.2f}x{marker}", file=sys.stderr)
+    return regressed
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Write results to this file, rather than stdout.",
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        help="A previous results file to compare medians against.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown counted as a regression. Default: 0.1.",
+    )
+    args = parser.parse_args(argv)
+
+    results: dict[str, dict[str, Any]] = {}
+    for vendor in DATABASES:
+        results.update(bench_vendor(vendor, args.repeat))
+    results.update(bench_cold_import(args.repeat))
+
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "django": django.get_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        args.output.write_text(output)
+    else:
+        sys.stdout.write(output)
+
+    if args.compare:
+        previous = json.loads(args.compare.read_text())["benchmarks"]
+        if compare(results, previous, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,6 @@
+from __future__ import annotations
+
+from django_harlequin.launcher import main
+
+if __name__ == "__main__":  # pragma: no branch
+    raise SystemExit(main())
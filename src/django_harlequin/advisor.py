@@ -0,0 +1,430 @@
+"""
+An index advisor, comparing the indexes Django’s models declare with those in
+the live database and the database’s index usage statistics.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from django.db import DatabaseError
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Model
+
+from django_harlequin.catalog import database_models, model_indexes
+
+# Rows read by sequential scans, above which a table is flagged, if it was also
+# scanned sequentially more often than through an index.
+SEQ_SCAN_ROWS = 1_000_000
+
+# Files written per kind of finding, with their descriptions.
+SECTIONS = {
+    "unused": (
+        "unused-indexes.sql",
+        "Indexes never scanned since statistics were last reset. They slow "
+        + "down writes and take space, for no benefit to reads.",
+    ),
+    "duplicate": (
+        "duplicate-indexes.sql",
+        "Indexes whose columns are a leading prefix of another index on the "
+        + "same table, which can serve the same queries.",
+    ),
+    "unindexed-foreign-key": (
+        "unindexed-foreign-keys.sql",
+        "Foreign key columns that no index starts with, making joins and "
+        + "cascading deletes from the referenced table scan this one.",
+    ),
+    "seq-scan": (
+        "sequential-scans.sql",
+        f"Tables that sequential scans read over {SEQ_SCAN_ROWS:,} rows from, "
+        + "which may need an index for their common queries.",
+    ),
+    "missing": (
+        "missing-indexes.sql",
+        "Indexes declared by models but missing from the database, from "
+        + "unapplied migrations or schema drift.",
+    ),
+}
+
+
+# Queries of the live statistics behind some findings, to rerun in Harlequin.
+STATISTICS_QUERIES = {
+    ("postgresql", "unused"): """\
+SELECT relname AS table_name, indexrelname AS index_name, idx_scan,
+    pg_size_pretty(pg_relation_size(indexrelid)) AS size
+FROM pg_stat_user_indexes
+ORDER BY idx_scan, pg_relation_size(indexrelid) DESC;""",
+    ("postgresql", "seq-scan"): """\
+SELECT relname AS table_name, seq_scan, seq_tup_read, idx_scan, n_live_tup
+FROM pg_stat_user_tables
+ORDER BY seq_tup_read DESC;""",
+    ("mysql", "unused"): """\
+SELECT object_name AS table_name, index_name
+FROM sys.schema_unused_indexes
+WHERE object_schema = DATABASE();""",
+    ("mysql", "seq-scan"): """\
+SELECT object_name AS table_name, rows_full_scanned, latency
+FROM sys.schema_tables_with_full_table_scans
+WHERE object_schema = DATABASE();""",
+}
+
+
+@dataclass
+class Finding:
+    kind: str
+    table: str
+    model: str | None
+    detail: str
+    fix: str | None = None
+
+
+def live_indexes(
+    connection: BaseDatabaseWrapper, tables: Iterable[str]
+) -> dict[str, dict[str, dict[str, Any]]]:
+    """
+    The indexes in the database for each existing table, from Django’s
+    introspection, including those backing primary keys and unique
+    constraints.
+    """
+    result: dict[str, Any] = {}
+    with connection.cursor() as cursor:
+        existing = set(connection.introspection.table_names(cursor))
+        for table in tables:
+            if table not in existing:
+                continue
+            result[table] = {
+                name: info
+                for name, info in connection.introspection.get_constraints(
+                    cursor, table
+                ).items()
+                if info["index"] or info["primary_key"] or info["unique"]
+            }
+    return result
+
+
+def index_scans(connection: BaseDatabaseWrapper) -> dict[tuple[str, str], int] | None:
+    """
+    The number of scans of each index, keyed by table and index name, since
+    statistics were last reset, or None if the database doesn’t track them.
+    """
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":  # pragma: no cover
+                cursor.execute(
+                    """
+                    SELECT relname, indexrelname, idx_scan
+                    FROM pg_stat_user_indexes
+                    WHERE schemaname = ANY(current_schemas(false))
+                    """
+                )
+                return {(table, index): scans for table, index, scans in cursor}
+            elif connection.vendor == "mysql":  # pragma: no cover
+                # The sys schema only lists unused indexes, so others are
+                # reported as used once.
+                cursor.execute(
+                    """
+                    SELECT s.table_name, s.index_name, u.index_name IS NULL
+                    FROM information_schema.statistics s
+                    LEFT JOIN sys.schema_unused_indexes u
+                    ON u.object_schema = s.table_schema
+                    AND u.object_name = s.table_name
+                    AND u.index_name = s.index_name
+                    WHERE s.table_schema = DATABASE() AND s.seq_in_index = 1
+                    """
+                )
+                return {(table, index): int(used) for table, index, used in cursor}
+            else:
+                return None
+    except DatabaseError:  # pragma: no cover
+        # Statistics views need privileges, or performance_schema on MySQL.
+        return None
+
+
+def seq_scan_rows(connection: BaseDatabaseWrapper) -> dict[str, int]:
+    """
+    Rows read by sequential scans of each table, for those scanned that way
+    more often than through indexes.
+    """
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":  # pragma: no cover
+                cursor.execute(
+                    """
+                    SELECT relname, seq_tup_read
+                    FROM pg_stat_user_tables
+                    WHERE schemaname = ANY(current_schemas(false))
+                    AND seq_scan > coalesce(idx_scan, 0)
+                    """
+                )
+                return dict(cursor.fetchall())
+            elif connection.vendor == "mysql":  # pragma: no cover
+                cursor.execute(
+                    """
+                    SELECT object_name, rows_full_scanned
+                    FROM sys.schema_tables_with_full_table_scans
+                    WHERE object_schema = DATABASE()
+                    """
+                )
+                return dict(cursor.fetchall())
+            else:
+                return {}
+    except DatabaseError:  # pragma: no cover
+        return {}
+
+
+def drop_index_sql(connection: BaseDatabaseWrapper, table: str, index: str) -> str:
+    qn = connection.ops.quote_name
+    if connection.vendor == "postgresql":
+        return f"DROP INDEX CONCURRENTLY {qn(index)};"
+    elif connection.vendor == "mysql":
+        return f"DROP INDEX {qn(index)} ON {qn(table)};"
+    return f"DROP INDEX {qn(index)};"
+
+
+def has_expressions(info: dict[str, Any]) -> bool:
+    """
+    Whether a live index is on expressions, such as Lower("name"), which
+    introspection reports as columns of None.
+    """
+    return None in info["columns"]
+
+
+def sentences(*parts: str | None) -> str:
+    return " ".join(part for part in parts if part)
+
+
+def declared_by(
+    model: type[Model], columns: list[str]
+) -> tuple[str | None, str | None]:
+    """
+    Describe who owns a non-unique index, so the fix is made in the right
+    place.
+    """
+    for index in model_indexes(model):
+        if index["columns"] != columns or index["unique"]:
+            continue
+        if model._meta.auto_created:
+            return (
+                f"Created for the many-to-many table {model._meta.label}.",
+                "Use a custom through model to control its indexes.",
+            )
+        return (
+            f"Declared by {model._meta.label}.",
+            f"Remove it from {model._meta.label} and make a migration.",
+        )
+    return None, None
+
+
+def find_unused(
+    connection: BaseDatabaseWrapper,
+    models: dict[str, type[Model]],
+    indexes: dict[str, dict[str, dict[str, Any]]],
+    scans: dict[tuple[str, str], int],
+) -> list[Finding]:
+    findings = []
+    for table, table_indexes in indexes.items():
+        model = models[table]
+        for name, info in table_indexes.items():
+            if info["primary_key"] or info["unique"]:
+                # Needed to enforce the constraint, even if never scanned.
+                continue
+            if scans.get((table, name)) != 0:
+                continue
+            declared, fix = declared_by(model, info["columns"])
+            findings.append(
+                Finding(
+                    "unused",
+                    table,
+                    model._meta.label,
+                    sentences(
+                        f"{name} ({', '.join(info['columns'])}) has no scans.",
+                        declared,
+                    ),
+                    fix or drop_index_sql(connection, table, name),
+                )
+            )
+    return findings
+
+
+def covering_index(
+    name: str, info: dict[str, Any], table_indexes: dict[str, dict[str, Any]]
+) -> str | None:
+    """
+    Another index that can serve the queries of an index, because its columns
+    start with the index’s columns.
+    """
+    columns = info["columns"]
+    for other_name, other in sorted(table_indexes.items()):
+        if other_name == name or has_expressions(other):
+            continue
+        if other.get("type") and info.get("type") != other["type"]:
+            # Such as a GIN index and a B-tree index.
+            continue
+        if other["columns"][: len(columns)] != columns:
+            continue
+        if (
+            other["columns"] == columns
+            and not (other["primary_key"] or other["unique"])
+            and other_name > name
+        ):
+            # Report only one of two identical indexes.
+            continue
+        return other_name
+    return None
+
+
+def find_duplicates(
+    connection: BaseDatabaseWrapper,
+    models: dict[str, type[Model]],
+    indexes: dict[str, dict[str, dict[str, Any]]],
+) -> list[Finding]:
+    findings = []
+    for table, table_indexes in indexes.items():
+        model = models[table]
+        if model._meta.auto_created:
+            # Django always indexes each foreign key of many-to-many tables,
+            # as well as their unique pair.
+            continue
+        for name, info in sorted(table_indexes.items()):
+            if info["primary_key"] or info["unique"] or has_expressions(info):
+                continue
+            other_name = covering_index(name, info, table_indexes)
+            if other_name is None:
+                continue
+            other_columns = table_indexes[other_name]["columns"]
+            declared, fix = declared_by(model, info["columns"])
+            findings.append(
+                Finding(
+                    "duplicate",
+                    table,
+                    model._meta.label,
+                    sentences(
+                        f"{name} ({', '.join(info['columns'])}) is covered by "
+                        + f"{other_name} ({', '.join(other_columns)}).",
+                        declared,
+                    ),
+                    fix or drop_index_sql(connection, table, name),
+                )
+            )
+    return findings
+
+
+def find_unindexed_foreign_keys(
+    connection: BaseDatabaseWrapper,
+    models: dict[str, type[Model]],
+    indexes: dict[str, dict[str, dict[str, Any]]],
+) -> list[Finding]:
+    qn = connection.ops.quote_name
+    findings = []
+    for table, model in models.items():
+        if table not in indexes:
+            continue
+        leading = {info["columns"][0] for info in indexes[table].values()}
+        for field in model._meta.local_concrete_fields:
+            if field.remote_field is None or field.column in leading:
+                continue
+            if field.db_index:  # type: ignore[attr-defined]
+                # Reported as a missing model index instead.
+                continue
+            findings.append(
+                Finding(
+                    "unindexed-foreign-key",
+                    table,
+                    model._meta.label,
+                    f"{model._meta.label}.{field.name} ({field.column}) is not "
+                    + "indexed.",
+                    f"Add db_index=True to {model._meta.label}.{field.name}, or "
+                    + f"an index on ({qn(str(field.column))}).",
+                )
+            )
+    return findings
+
+
+def find_seq_scans(
+    models: dict[str, type[Model]], rows: dict[str, int]
+) -> list[Finding]:
+    return [
+        Finding(
+            "seq-scan",
+            table,
+            models[table]._meta.label if table in models else None,
+            f"{table} had {count:,} rows read by sequential scans.",
+        )
+        for table, count in sorted(rows.items(), key=lambda item: -item[1])
+        if count >= SEQ_SCAN_ROWS
+    ]
+
+
+def find_missing(
+    models: dict[str, type[Model]], indexes: dict[str, dict[str, dict[str, Any]]]
+) -> list[Finding]:
+    findings = []
+    for table, model in models.items():
+        table_indexes = indexes.get(table, {})
+        live = {tuple(info["columns"]) for info in table_indexes.values()}
+        for index in model_indexes(model):
+            if index["expressions"]:
+                # Expression indexes are always named, and can only be matched
+                # by name.
+                if index["name"] in table_indexes:
+                    continue
+                columns = "expressions"
+            elif tuple(index["columns"]) in live:
+                continue
+            else:
+                columns = ", ".join(index["columns"])
+            description = index["name"] or "index"
+            findings.append(
+                Finding(
+                    "missing",
+                    table,
+                    model._meta.label,
+                    f"{description} ({columns}) is missing"
+                    + ("" if table in indexes else ", as is the table")
+                    + ".",
+                    "Check for unapplied migrations with: "
+                    + "./manage.py showmigrations",
+                )
+            )
+    return findings
+
+
+def advise(connection: BaseDatabaseWrapper) -> list[Finding]:
+    models = {model._meta.db_table: model for model in database_models(connection)}
+    indexes = live_indexes(connection, models)
+    findings = []
+    scans = index_scans(connection)
+    if scans is not None:
+        findings += find_unused(connection, models, indexes, scans)
+    findings += find_duplicates(connection, models, indexes)
+    findings += find_unindexed_foreign_keys(connection, models, indexes)
+    findings += find_seq_scans(models, seq_scan_rows(connection))
+    findings += find_missing(models, indexes)
+    return findings
+
+
+def write_advice(
+    findings: list[Finding], directory: Path, connection: BaseDatabaseWrapper
+) -> None:
+    """
+    Write a file per kind of finding, with the fixes commented out so that
+    running a file never changes the schema, followed by any query of the
+    statistics behind them.
+    """
+    for kind, (filename, description) in SECTIONS.items():
+        lines = [f"-- {description}", f"-- Database: {connection.alias!r}.", ""]
+        found = [finding for finding in findings if finding.kind == kind]
+        if not found:
+            lines.append("-- Nothing found.")
+        for finding in found:
+            lines.append(f"-- {finding.model or finding.table}: {finding.detail}")
+            if finding.fix:
+                lines.append(f"--   Fix: {finding.fix}")
+        query = STATISTICS_QUERIES.get((connection.vendor, kind))
+        if query is not None:
+            lines += ["", query]
+        lines.append("")
+        (directory / filename).write_text("\n".join(lines))
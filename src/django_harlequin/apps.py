@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class DjangoHarlequinConfig(AppConfig):
+    name = "django_harlequin"
+    verbose_name = "django-harlequin"
+
+    def ready(self) -> None:
+        if hasattr(settings, "HARLEQUIN_SLOW_QUERIES"):
+            from django_harlequin.slow_queries import install
+
+            install()
@@ -0,0 +1,120 @@
+"""
+Attach every database to one DuckDB session, for cross-database queries.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from django_harlequin.cache import cache_dir, write_private
+
+# DuckDB extensions that scan each vendor’s databases.
+DUCKDB_TYPES = {
+    "mysql": "mysql",
+    "postgresql": "postgres",
+    "sqlite": "sqlite",
+}
+
+# libpq keywords for the environment variables set for Harlequin’s Postgres
+# adapter, which can’t be shared between several attached databases.
+POSTGRES_ENV_KEYWORDS = {
+    "PGAPPNAME": "application_name",
+    "PGLOADBALANCEHOSTS": "load_balance_hosts",
+    "PGOPTIONS": "options",
+    "PGPASSFILE": "passfile",
+    "PGPASSWORD": "password",
+    "PGSERVICE": "service",
+    "PGSSLCERT": "sslcert",
+    "PGSSLKEY": "sslkey",
+    "PGSSLMODE": "sslmode",
+    "PGSSLROOTCERT": "sslrootcert",
+    "PGTARGETSESSIONATTRS": "target_session_attrs",
+}
+
+# DuckDB’s MySQL keywords for Harlequin’s adapter options that differ, and
+# the options it has no keyword for.
+MYSQL_KEYWORDS = {"unix_socket": "socket"}
+MYSQL_UNSUPPORTED_OPTIONS = {"connect_timeout"}
+
+
+def parse_command(command: list[str]) -> tuple[dict[str, str], bool, list[str]]:
+    """
+    Split Harlequin adapter arguments, after "-a <adapter>", into options,
+    whether the session is read-only, and positional arguments.
+    """
+    options: dict[str, str] = {}
+    read_only = False
+    positional: list[str] = []
+    arguments = iter(command[2:])
+    for argument in arguments:
+        if argument == "--read-only":
+            read_only = True
+        elif argument.startswith("--"):
+            options[argument[2:].replace("-", "_")] = next(arguments)
+        else:
+            positional.append(argument)
+    return options, read_only, positional
+
+
+def conninfo_value(value: str) -> str:
+    """
+    Quote a value for a libpq-style "key=value" connection string.
+    """
+    if value and not any(char in value for char in " '\\"):
+        return value
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def conninfo(params: dict[str, str]) -> str:
+    return " ".join(f"{key}={conninfo_value(value)}" for key, value in params.items())
+
+
+def attach_sql(
+    alias: str, vendor: str, command: list[str], env: dict[str, str], name: str
+) -> str:
+    """
+    An ATTACH statement for a database, from the arguments and environment
+    resolved for Harlequin’s adapter for it. name is the database’s NAME
+    setting, used for SQLite files.
+    """
+    options, read_only, positional = parse_command(command)
+    if vendor == "postgresql":
+        params = {
+            **options,
+            **{
+                POSTGRES_ENV_KEYWORDS[key]: value
+                for key, value in env.items()
+                if key in POSTGRES_ENV_KEYWORDS
+            },
+        }
+        # Extra options passed as a connection string, such as keepalives.
+        target = " ".join([conninfo(params), *positional]).strip()
+    elif vendor == "mysql":
+        params = {
+            MYSQL_KEYWORDS.get(key, key): value
+            for key, value in options.items()
+            if key not in MYSQL_UNSUPPORTED_OPTIONS
+        }
+        target = conninfo(params)
+    else:
+        target = name
+    attach_options = f"TYPE {DUCKDB_TYPES[vendor]}"
+    if read_only:
+        attach_options += ", READ_ONLY"
+    target = target.replace("'", "''")
+    alias = alias.replace('"', '""')
+    return f"ATTACH '{target}' AS \"{alias}\" ({attach_options});"
+
+
+def write_attach_script(attachments: list[tuple[str, str]]) -> Path:
+    """
+    Write a DuckDB init script that loads the needed extensions, then runs
+    the ATTACH statements, given with their databases’ vendors. The script
+    holds credentials, so it’s private to the user.
+    """
+    types = sorted({DUCKDB_TYPES[vendor] for vendor, _ in attachments})
+    lines = [f"INSTALL {name};\nLOAD {name};" for name in types]
+    lines.extend(statement for _, statement in attachments)
+    path = cache_dir() / "duckdb" / "attach.sql"
+    write_private(path, "\n".join(lines) + "\n")
+    return path
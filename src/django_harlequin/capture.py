@@ -0,0 +1,199 @@
+"""
+Capture the queries a test suite runs, fingerprinted and aggregated per test,
+for --from-capture to open.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+
+from django_harlequin.cache import write_private
+from django_harlequin.slow_queries import example_sql
+from django_harlequin.sql import fingerprint
+
+CAPTURE_VERSION = 1
+
+# The default number of executions of one SELECT fingerprint within one test
+# that flag a likely N+1 pattern, such as a query per object in a loop. Lower
+# counts are common in ordinary tests, such as for a session and a user.
+N_PLUS_ONE_THRESHOLD = 10
+
+
+class QueryCapture:
+    """
+    An execute wrapper that aggregates every query run during a test by
+    database alias and fingerprint, with the count and time per test.
+    Queries run outside tests, such as when creating test databases, are
+    ignored.
+    """
+
+    def __init__(self) -> None:
+        self.entries: dict[tuple[str, str], dict[str, Any]] = {}
+        self.test: str | None = None
+        self.lock = threading.Lock()
+
+    def __call__(
+        self,
+        execute: Callable[..., Any],
+        sql: str,
+        params: Any,
+        many: bool,
+        context: dict[str, Any],
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if self.test is not None:
+                self.record(context["connection"], sql, params, many, duration)
+
+    def record(
+        self,
+        connection: BaseDatabaseWrapper,
+        sql: str,
+        params: Any,
+        many: bool,
+        duration: float,
+    ) -> None:
+        key = (connection.alias, fingerprint(sql))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    "alias": connection.alias,
+                    "fingerprint": key[1],
+                    "sql": example_sql(connection, sql, params, many),
+                    "count": 0,
+                    "total": 0.0,
+                    "tests": {},
+                }
+            entry["count"] += 1
+            entry["total"] += duration
+            test = entry["tests"].setdefault(self.test, [0, 0.0])
+            test[0] += 1
+            test[1] += duration
+
+    def connection_created(
+        self, sender: Any, connection: BaseDatabaseWrapper, **kwargs: Any
+    ) -> None:
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self) -> None:
+        connection_created.connect(self.connection_created, weak=False)
+        for connection in connections.all(initialized_only=True):
+            self.connection_created(sender=None, connection=connection)
+
+    def uninstall(self) -> None:
+        connection_created.disconnect(self.connection_created)
+        for connection in connections.all(initialized_only=True):
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    def merge(self, entries: list[dict[str, Any]]) -> None:
+        """
+        Add queries captured elsewhere, such as by another pytest-xdist worker.
+        """
+        with self.lock:
+            for other in entries:
+                key = (other["alias"], other["fingerprint"])
+                entry = self.entries.get(key)
+                if entry is None:
+                    self.entries[key] = other
+                    continue
+                entry["count"] += other["count"]
+                entry["total"] += other["total"]
+                for name, (count, total) in other["tests"].items():
+                    test = entry["tests"].setdefault(name, [0, 0.0])
+                    test[0] += count
+                    test[1] += total
+
+    def write(self, path: Path) -> None:
+        """
+        Write the captured queries, heaviest total time first.
+        """
+        entries = sorted(self.entries.values(), key=lambda e: e["total"], reverse=True)
+        write_private(
+            path, json.dumps({"version": CAPTURE_VERSION, "queries": entries})
+        )
+
+
+def load_capture(path: Path) -> list[dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError) as exc:
+        raise CommandError(f"Cannot read query capture {str(path)!r}: {exc}")
+    if not isinstance(data, dict) or data.get("version") != CAPTURE_VERSION:
+        raise CommandError(f"Unsupported query capture {str(path)!r}.")
+    queries: list[dict[str, Any]] = data["queries"]
+    return queries
+
+
+def n_plus_one(
+    entry: dict[str, Any], threshold: int = N_PLUS_ONE_THRESHOLD
+) -> tuple[str, int] | None:
+    """
+    The test that repeats a SELECT fingerprint the most, if it does so at
+    least the threshold number of times, suggesting an N+1 pattern.
+    """
+    if not entry["fingerprint"].upper().startswith("SELECT"):
+        return None
+    test, (count, _) = max(entry["tests"].items(), key=lambda item: item[1][0])
+    if count < threshold:
+        return None
+    return test, count
+
+
+def write_captured_queries(
+    entries: list[dict[str, Any]],
+    directory: Path,
+    connection: BaseDatabaseWrapper,
+    top: int,
+    threshold: int = N_PLUS_ONE_THRESHOLD,
+) -> None:
+    """
+    Write the heaviest queries for the connection’s alias, one file each
+    named so the file tree lists them by total time, and likely N+1 queries,
+    most repeated first.
+    """
+    entries = [entry for entry in entries if entry["alias"] == connection.alias]
+
+    def write(path: Path, entry: dict[str, Any], flag: tuple[str, int] | None) -> None:
+        slowest = max(entry["tests"].items(), key=lambda item: item[1][1])[0]
+        lines = [
+            f"-- Captured on database {connection.alias!r}.",
+            f"-- Count: {entry['count']:,}",
+            f"-- Total: {entry['total'] * 1000:,.1f}ms",
+            f"-- Tests: {len(entry['tests']):,}",
+            f"-- Slowest test: {slowest}",
+        ]
+        if flag is not None:
+            lines.append(f"-- N+1: run {flag[1]:,} times in {flag[0]}")
+        lines += [f"-- Fingerprint: {entry['fingerprint']}", "", f"{entry['sql']};", ""]
+        path.write_text("\n".join(lines))
+
+    for number, entry in enumerate(entries[:top], start=1):
+        write(directory / f"{number:02d}.sql", entry, n_plus_one(entry, threshold))
+
+    repeated = [
+        (entry, flag)
+        for entry in entries
+        if (flag := n_plus_one(entry, threshold)) is not None
+    ]
+    repeated.sort(key=lambda item: item[1][1], reverse=True)
+    if repeated:
+        n_plus_one_dir = directory / "n-plus-one"
+        n_plus_one_dir.mkdir()
+        for number, (entry, flag) in enumerate(repeated, start=1):
+            write(n_plus_one_dir / f"{number:02d}.sql", entry, flag)
@@ -0,0 +1,248 @@
+"""
+Schema snapshots built from Django’s app registry rather than by introspecting
+the live database.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+from django.apps import apps
+from django.db import router
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Model, UniqueConstraint
+
+from django_harlequin.cache import cache_dir, write_private
+
+CATALOG_VERSION = 2
+
+
+def database_models(connection: BaseDatabaseWrapper) -> list[type[Model]]:
+    """
+    The models with tables in the given database, including auto-created
+    many-to-many through models, sorted by table name.
+    """
+    models = []
+    for model in apps.get_models(include_auto_created=True):
+        opts = model._meta
+        if opts.proxy or opts.swapped:
+            continue
+        if not router.allow_migrate_model(connection.alias, model):
+            continue
+        models.append(model)
+    return sorted(models, key=lambda model: model._meta.db_table)
+
+
+def model_indexes(model: type[Model]) -> list[dict[str, Any]]:
+    """
+    The indexes Django creates for a model, as column lists. Indexes that Django
+    names automatically have no name. Expression indexes, such as on
+    Lower("name"), are marked with ``expressions`` and have no column list.
+    """
+    opts = model._meta
+    indexes: list[dict[str, Any]] = []
+
+    def add(name: str | None, field_names: Any, unique: bool) -> None:
+        indexes.append(
+            {
+                "name": name,
+                "columns": [
+                    str(opts.get_field(field_name.removeprefix("-")).column)  # type: ignore[union-attr]
+                    for field_name in field_names
+                ],
+                "expressions": False,
+                "unique": unique,
+            }
+        )
+
+    def add_expressions(name: str, unique: bool) -> None:
+        indexes.append(
+            {"name": name, "columns": None, "expressions": True, "unique": unique}
+        )
+
+    for field in opts.local_concrete_fields:
+        if field.primary_key or field.unique:
+            add(None, [field.name], unique=True)
+        elif field.db_index:  # type: ignore[attr-defined]
+            add(None, [field.name], unique=False)
+    for field_names in opts.unique_together:
+        add(None, field_names, unique=True)
+    for index in opts.indexes:
+        if index.expressions:
+            add_expressions(index.name, unique=False)
+        else:
+            add(index.name, index.fields, unique=False)
+    for constraint in opts.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            if constraint.expressions:
+                add_expressions(constraint.name, unique=True)
+            else:
+                add(constraint.name, constraint.fields, unique=True)
+    return indexes
+
+
+def row_estimates(connection: BaseDatabaseWrapper) -> dict[str, int]:
+    """
+    Cheap row count estimates from the database’s own statistics, without
+    counting any rows. Tables without statistics are omitted.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":  # pragma: no cover
+            cursor.execute(
+                """
+                SELECT c.relname, c.reltuples::bigint
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.relkind IN ('r', 'p', 'm')
+                AND n.nspname = ANY(current_schemas(false))
+                """
+            )
+            rows = cursor.fetchall()
+        elif connection.vendor == "mysql":  # pragma: no cover
+            cursor.execute(
+                """
+                SELECT table_name, table_rows
+                FROM information_schema.tables
+                WHERE table_schema = DATABASE()
+                """
+            )
+            rows = cursor.fetchall()
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                + "AND name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return {}
+            cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+            rows = [(table, int(stat.split()[0])) for table, stat in cursor.fetchall()]
+        else:  # pragma: no cover
+            return {}
+
+    estimates: dict[str, int] = {}
+    for table, count in rows:
+        # PostgreSQL reports -1 for tables that have never been analyzed.
+        if count is not None and count >= 0:
+            estimates[table] = max(estimates.get(table, 0), int(count))
+    return estimates
+
+
+def migration_key(connection: BaseDatabaseWrapper) -> str:
+    """
+    Identify the schema by the applied migrations, and the migrations on disk.
+    """
+    loader = MigrationLoader(connection, ignore_no_migrations=True)
+    state = {
+        "version": CATALOG_VERSION,
+        "alias": connection.alias,
+        "vendor": connection.vendor,
+        "host": connection.settings_dict["HOST"],
+        "name": str(connection.settings_dict["NAME"]),
+        "applied": sorted(f"{app}.{name}" for app, name in loader.applied_migrations),
+        "leaves": sorted(f"{app}.{name}" for app, name in loader.graph.leaf_nodes()),
+    }
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+def build_catalog(connection: BaseDatabaseWrapper) -> dict[str, Any]:
+    estimates = row_estimates(connection)
+    tables = []
+    for model in database_models(connection):
+        opts = model._meta
+        fields = opts.local_concrete_fields
+        tables.append(
+            {
+                "table": opts.db_table,
+                "model": opts.label,
+                "columns": [
+                    {
+                        "name": field.column,
+                        "type": field.db_type(connection),
+                        "null": field.null,
+                        "primary_key": field.primary_key,
+                    }
+                    for field in fields
+                ],
+                "foreign_keys": [
+                    {
+                        "column": field.column,
+                        "references_table": field.target_field.model._meta.db_table,  # type: ignore[attr-defined]
+                        "references_column": field.target_field.column,  # type: ignore[attr-defined]
+                    }
+                    for field in fields
+                    if field.remote_field is not None
+                ],
+                "indexes": model_indexes(model),
+                "rows": estimates.get(opts.db_table),
+            }
+        )
+    return {"alias": connection.alias, "vendor": connection.vendor, "tables": tables}
+
+
+def load_catalog(connection: BaseDatabaseWrapper) -> dict[str, Any]:
+    """
+    Return the catalog snapshot, building it only if the migration state has
+    changed since it was last built.
+    """
+    path = cache_dir() / "catalogs" / f"{migration_key(connection)[:16]}.json"
+    try:
+        catalog: dict[str, Any] = json.loads(path.read_text())
+    except (OSError, ValueError):
+        catalog = build_catalog(connection)
+        write_private(path, json.dumps(catalog))
+    return catalog
+
+
+def write_catalog(
+    catalog: dict[str, Any], directory: Path, connection: BaseDatabaseWrapper
+) -> None:
+    """
+    Write the catalog as one SQL file per table, grouped by app, for browsing
+    in Harlequin’s file tree.
+    """
+    qn = connection.ops.quote_name
+    (directory / "catalog.json").write_text(json.dumps(catalog, indent=2) + "\n")
+    for table in catalog["tables"]:
+        references = {
+            fk["column"]: f"{fk['references_table']} ({fk['references_column']})"
+            for fk in table["foreign_keys"]
+        }
+        lines = [
+            f"-- {table['model']}",
+            f"-- Table: {table['table']}",
+        ]
+        if table["rows"] is not None:
+            lines.append(f"-- Estimated rows: {table['rows']:,}")
+        lines += ["--", "-- Columns:"]
+        for column in table["columns"]:
+            parts = [column["name"], column["type"] or ""]
+            if not column["null"]:
+                parts.append("NOT NULL")
+            if column["primary_key"]:
+                parts.append("PRIMARY KEY")
+            if column["name"] in references:
+                parts.append(f"REFERENCES {references[column['name']]}")
+            lines.append("--   " + " ".join(part for part in parts if part))
+        if table["indexes"]:
+            lines += ["--", "-- Indexes:"]
+            for index in table["indexes"]:
+                parts = []
+                if index["name"]:
+                    parts.append(index["name"])
+                if index["unique"]:
+                    parts.append("UNIQUE")
+                if index["expressions"]:
+                    parts.append("(expressions)")
+                else:
+                    parts.append(f"({', '.join(index['columns'])})")
+                lines.append("--   " + " ".join(parts))
+        lines += ["", f"SELECT * FROM {qn(table['table'])} LIMIT 100;", ""]
+
+        app_label = table["model"].split(".")[0]
+        path = directory / app_label / f"{table['table']}.sql"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text("\n".join(lines))
@@ -0,0 +1,359 @@
+"""
+A pack of diagnostic queries for incidents, per vendor, with tables
+annotated with the Django models they belong to.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.core.management.base import CommandError
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from django_harlequin.catalog import database_models
+from django_harlequin.sql import quote_literal
+
+# Queries that list tables start with a common table expression of the models
+# routed to the database, django_models (table_name, model), filled in for
+# {models}.
+POSTGRES_DIAGNOSTICS = {
+    "blocking-locks.sql": (
+        "Sessions blocked by others, as a tree under each blocking session "
+        + "that isn’t blocked itself, with the models they hold locks on.",
+        """\
+WITH RECURSIVE {models},
+blocked AS (
+    SELECT pid, unnest(pg_blocking_pids(pid)) AS blocking_pid
+    FROM pg_stat_activity
+    WHERE cardinality(pg_blocking_pids(pid)) > 0
+),
+tree AS (
+    SELECT pid, NULL::integer AS blocked_by, 0 AS depth, ARRAY[pid] AS path
+    FROM pg_stat_activity
+    WHERE pid IN (SELECT blocking_pid FROM blocked)
+    AND pid NOT IN (SELECT pid FROM blocked)
+    UNION ALL
+    SELECT b.pid, b.blocking_pid, t.depth + 1, t.path || b.pid
+    FROM blocked b
+    JOIN tree t ON b.blocking_pid = t.pid
+    WHERE NOT b.pid = ANY(t.path)
+)
+SELECT
+    repeat('  ', t.depth) || t.pid AS pid,
+    t.blocked_by,
+    a.usename,
+    a.state,
+    now() - a.xact_start AS transaction_age,
+    a.wait_event_type,
+    a.wait_event,
+    (
+        SELECT string_agg(DISTINCT coalesce(m.model, c.relname), ', ')
+        FROM pg_locks l
+        JOIN pg_class c ON c.oid = l.relation AND c.relkind IN ('r', 'p')
+        LEFT JOIN django_models m ON m.table_name = c.relname
+        WHERE l.pid = t.pid
+    ) AS models,
+    left(a.query, 200) AS query
+FROM tree t
+JOIN pg_stat_activity a ON a.pid = t.pid
+ORDER BY t.path;""",
+    ),
+    "long-transactions.sql": (
+        "The longest-running open transactions, with the models they hold "
+        + "locks on.",
+        """\
+WITH {models}
+SELECT
+    a.pid,
+    a.usename,
+    a.application_name,
+    a.client_addr,
+    a.state,
+    now() - a.xact_start AS transaction_age,
+    now() - a.query_start AS query_age,
+    (
+        SELECT string_agg(DISTINCT coalesce(m.model, c.relname), ', ')
+        FROM pg_locks l
+        JOIN pg_class c ON c.oid = l.relation AND c.relkind IN ('r', 'p')
+        LEFT JOIN django_models m ON m.table_name = c.relname
+        WHERE l.pid = a.pid
+    ) AS models,
+    left(a.query, 200) AS query
+FROM pg_stat_activity a
+WHERE a.xact_start IS NOT NULL AND a.pid <> pg_backend_pid()
+ORDER BY a.xact_start
+LIMIT 50;""",
+    ),
+    "bloat.sql": (
+        "Table bloat estimated from dead tuples, which vacuum reclaims. For "
+        + "exact figures, including for indexes, use the pgstattuple "
+        + "extension’s pgstattuple() and pgstatindex() functions.",
+        """\
+WITH {models}
+SELECT
+    s.relname AS table_name,
+    m.model,
+    pg_size_pretty(pg_table_size(s.relid)) AS table_size,
+    pg_size_pretty(pg_indexes_size(s.relid)) AS indexes_size,
+    s.n_live_tup,
+    s.n_dead_tup,
+    round(100.0 * s.n_dead_tup / nullif(s.n_live_tup + s.n_dead_tup, 0), 1)
+        AS dead_percent,
+    pg_size_pretty(
+        (pg_table_size(s.relid) * s.n_dead_tup
+            / nullif(s.n_live_tup + s.n_dead_tup, 0))::bigint
+    ) AS estimated_waste,
+    s.last_autovacuum,
+    s.last_vacuum
+FROM pg_stat_user_tables s
+LEFT JOIN django_models m ON m.table_name = s.relname
+ORDER BY s.n_dead_tup DESC
+LIMIT 50;""",
+    ),
+    "cache-hit-ratio.sql": (
+        "Shared buffer hit ratios for the database and each table, with the "
+        + "tables reading most blocks from outside shared buffers first.",
+        """\
+SELECT
+    datname,
+    round(100.0 * blks_hit / nullif(blks_hit + blks_read, 0), 2) AS hit_percent
+FROM pg_stat_database
+WHERE datname = current_database();
+
+WITH {models}
+SELECT
+    s.relname AS table_name,
+    m.model,
+    s.heap_blks_read,
+    round(
+        100.0 * s.heap_blks_hit / nullif(s.heap_blks_hit + s.heap_blks_read, 0), 2
+    ) AS heap_hit_percent,
+    s.idx_blks_read,
+    round(
+        100.0 * s.idx_blks_hit / nullif(s.idx_blks_hit + s.idx_blks_read, 0), 2
+    ) AS index_hit_percent
+FROM pg_statio_user_tables s
+LEFT JOIN django_models m ON m.table_name = s.relname
+ORDER BY s.heap_blks_read + coalesce(s.idx_blks_read, 0) DESC
+LIMIT 50;""",
+    ),
+    "replication-lag.sql": (
+        "Replication lag: on a primary, for each standby, and on a standby, "
+        + "since the last replayed transaction.",
+        """\
+SELECT
+    application_name,
+    client_addr,
+    state,
+    sync_state,
+    write_lag,
+    flush_lag,
+    replay_lag,
+    pg_size_pretty(pg_wal_lsn_diff(pg_current_wal_lsn(), replay_lsn))
+        AS replay_lag_size
+FROM pg_stat_replication;
+
+SELECT
+    pg_is_in_recovery() AS standby,
+    now() - pg_last_xact_replay_timestamp() AS replay_lag;""",
+    ),
+}
+
+MYSQL_DIAGNOSTICS = {
+    "blocking-locks.sql": (
+        "InnoDB lock waits, grouped by the transaction blocking them, with "
+        + "the models of the locked tables.",
+        """\
+WITH {models}
+SELECT
+    bt.processlist_id AS blocking_connection,
+    w.blocking_engine_transaction_id AS blocking_transaction,
+    bl.lock_mode AS blocking_lock_mode,
+    rt.processlist_id AS waiting_connection,
+    w.requesting_engine_transaction_id AS waiting_transaction,
+    rl.lock_mode AS waiting_lock_mode,
+    rl.object_name AS table_name,
+    m.model,
+    rl.index_name,
+    LEFT(rt.processlist_info, 200) AS waiting_query
+FROM performance_schema.data_lock_waits w
+JOIN performance_schema.data_locks rl
+    ON rl.engine_lock_id = w.requesting_engine_lock_id
+JOIN performance_schema.data_locks bl
+    ON bl.engine_lock_id = w.blocking_engine_lock_id
+JOIN performance_schema.threads rt ON rt.thread_id = w.requesting_thread_id
+JOIN performance_schema.threads bt ON bt.thread_id = w.blocking_thread_id
+LEFT JOIN django_models m
+    ON m.table_name = rl.object_name AND rl.object_schema = DATABASE()
+ORDER BY blocking_transaction, waiting_transaction;""",
+    ),
+    "long-transactions.sql": (
+        "The longest-running open InnoDB transactions, with the models they "
+        + "hold locks on.",
+        """\
+WITH {models}
+SELECT
+    t.trx_mysql_thread_id AS connection_id,
+    t.trx_state,
+    TIMEDIFF(NOW(), t.trx_started) AS transaction_age,
+    t.trx_rows_locked,
+    t.trx_rows_modified,
+    (
+        SELECT GROUP_CONCAT(DISTINCT COALESCE(m.model, l.object_name))
+        FROM performance_schema.data_locks l
+        LEFT JOIN django_models m ON m.table_name = l.object_name
+        WHERE l.engine_transaction_id = t.trx_id
+    ) AS models,
+    LEFT(t.trx_query, 200) AS query
+FROM information_schema.innodb_trx t
+ORDER BY t.trx_started
+LIMIT 50;""",
+    ),
+    "bloat.sql": (
+        "Free space allocated to each table, which OPTIMIZE TABLE reclaims.",
+        """\
+WITH {models}
+SELECT
+    t.table_name AS table_name,
+    m.model,
+    t.data_length + t.index_length AS size_bytes,
+    t.data_free AS free_bytes,
+    ROUND(
+        100 * t.data_free / NULLIF(t.data_length + t.index_length + t.data_free, 0),
+        1
+    ) AS free_percent
+FROM information_schema.tables t
+LEFT JOIN django_models m ON m.table_name = t.table_name
+WHERE t.table_schema = DATABASE()
+ORDER BY t.data_free DESC
+LIMIT 50;""",
+    ),
+    "cache-hit-ratio.sql": (
+        "The InnoDB buffer pool hit ratio, and the tables with the most "
+        + "pages in it. The second query scans the buffer pool, so it can be "
+        + "slow with a large one.",
+        """\
+SELECT
+    ROUND(100 * (1 - r.variable_value / NULLIF(q.variable_value, 0)), 2)
+        AS buffer_pool_hit_percent
+FROM performance_schema.global_status r
+JOIN performance_schema.global_status q
+    ON q.variable_name = 'Innodb_buffer_pool_read_requests'
+WHERE r.variable_name = 'Innodb_buffer_pool_reads';
+
+WITH {models}
+SELECT
+    b.object_name AS table_name,
+    m.model,
+    b.pages,
+    b.allocated
+FROM sys.innodb_buffer_stats_by_table b
+LEFT JOIN django_models m ON m.table_name = b.object_name
+WHERE b.object_schema = DATABASE()
+ORDER BY b.pages DESC
+LIMIT 50;""",
+    ),
+    "replication-lag.sql": (
+        "Replication status, on a replica, including Seconds_Behind_Source.",
+        "SHOW REPLICA STATUS;",
+    ),
+}
+
+SQLITE_DIAGNOSTICS = {
+    "blocking-locks.sql": (
+        "SQLite locks the whole database file, so there is no lock tree. In "
+        + "WAL mode, readers don’t block the writer, and a writer waits for up "
+        + "to busy_timeout milliseconds for another.",
+        """\
+SELECT
+    j.journal_mode,
+    l.locking_mode,
+    b.timeout AS busy_timeout
+FROM pragma_journal_mode() j, pragma_locking_mode() l, pragma_busy_timeout() b;""",
+    ),
+    "long-transactions.sql": (
+        "SQLite doesn’t expose other connections’ transactions. In WAL mode, "
+        + "a checkpoint that can’t copy every frame of the log back to the "
+        + "database, with checkpointed less than log, shows that a "
+        + "long-running reader is holding it back. This runs a passive "
+        + "checkpoint, which doesn’t wait for readers.",
+        "PRAGMA wal_checkpoint(PASSIVE);",
+    ),
+    "bloat.sql": (
+        "Free pages in the database file, which VACUUM reclaims, and unused "
+        + "space in each table’s and index’s pages. The second query needs "
+        + "SQLite compiled with the dbstat virtual table.",
+        """\
+SELECT
+    f.freelist_count AS free_pages,
+    p.page_count AS pages,
+    round(100.0 * f.freelist_count / p.page_count, 1) AS free_percent
+FROM pragma_freelist_count() f, pragma_page_count() p;
+
+WITH {models}
+SELECT
+    d.name AS table_name,
+    m.model,
+    sum(d.pgsize) AS size_bytes,
+    sum(d.unused) AS unused_bytes,
+    round(100.0 * sum(d.unused) / sum(d.pgsize), 1) AS unused_percent
+FROM dbstat d
+LEFT JOIN django_models m ON m.table_name = d.name
+GROUP BY d.name
+ORDER BY unused_bytes DESC
+LIMIT 50;""",
+    ),
+    "cache-hit-ratio.sql": (
+        "SQLite doesn’t expose its page cache hit ratio through SQL. These are "
+        + "the page cache size, in pages or, if negative, kibibytes, and the "
+        + "size of the file memory-mapped for reads.",
+        "PRAGMA cache_size;\n\nPRAGMA mmap_size;",
+    ),
+    "replication-lag.sql": (
+        "SQLite has no built-in replication.",
+        "",
+    ),
+}
+
+DIAGNOSTICS = {
+    "postgresql": POSTGRES_DIAGNOSTICS,
+    "mysql": MYSQL_DIAGNOSTICS,
+    "sqlite": SQLITE_DIAGNOSTICS,
+}
+
+
+def models_cte(connection: BaseDatabaseWrapper) -> str:
+    """
+    A common table expression mapping each table in the database to its
+    model’s label.
+    """
+    rows = [
+        "SELECT "
+        + quote_literal(model._meta.db_table, connection.vendor)
+        + ", "
+        + quote_literal(model._meta.label, connection.vendor)
+        for model in database_models(connection)
+    ] or ["SELECT NULL, NULL"]
+    return (
+        "django_models (table_name, model) AS (\n    "
+        + "\n    UNION ALL ".join(rows)
+        + "\n)"
+    )
+
+
+def write_diagnostics(directory: Path, connection: BaseDatabaseWrapper) -> None:
+    """
+    Write the vendor’s diagnostic queries, one SQL file each.
+    """
+    try:
+        diagnostics = DIAGNOSTICS[connection.vendor]
+    except KeyError:
+        raise CommandError(
+            f"--diagnostics doesn’t support {connection.display_name} databases."
+        )
+    models = models_cte(connection)
+    for filename, (description, sql) in diagnostics.items():
+        lines = [f"-- {description}", f"-- Database: {connection.alias!r}.", ""]
+        if sql:
+            lines += [sql.format(models=models), ""]
+        (directory / filename).write_text("\n".join(lines))
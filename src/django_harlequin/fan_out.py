@@ -0,0 +1,332 @@
+"""
+Run one query against many databases, such as tenant shards, and merge the
+results into a local SQLite file, with each row tagged with its source alias.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import fnmatch
+import math
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from django_harlequin.cache import cache_dir
+from django_harlequin.guards import get_guards, is_select, session_statements
+from django_harlequin.sampling import to_sqlite
+
+# Rows fetched from each database, and passed to the writer, per batch.
+BATCH_SIZE = 2000
+
+# The column results are tagged with.
+ALIAS_COLUMN = "source_alias"
+
+
+@dataclass
+class AliasResult:
+    alias: str
+    status: str
+    rows: int
+    seconds: float
+    error: str = ""
+
+
+def match_aliases(pattern: str) -> list[str]:
+    aliases = [alias for alias in connections if fnmatch.fnmatchcase(alias, pattern)]
+    if not aliases:
+        raise CommandError(f"No databases match {pattern!r}.")
+    return aliases
+
+
+def timeout_statements(vendor: str, timeout: float) -> list[str]:
+    """
+    Statements that make the database abort the query at the timeout itself,
+    where it can, so timed out queries don’t keep running on the server.
+    """
+    milliseconds = max(1, round(timeout * 1000))
+    if vendor == "postgresql":
+        return [f"SELECT set_config('statement_timeout', '{milliseconds}ms', false)"]
+    elif vendor == "mysql":
+        return [f"SET SESSION max_execution_time = {milliseconds}"]
+    return []
+
+
+def connect_options(vendor: str, timeout: float) -> dict[str, Any]:
+    """
+    Driver options that give up connecting at the timeout, where the driver
+    has one.
+    """
+    if vendor in ("postgresql", "mysql"):
+        return {"connect_timeout": max(1, math.ceil(timeout))}
+    return {}
+
+
+def interrupt(connection: BaseDatabaseWrapper | None) -> None:
+    """
+    Abort the connection’s running query from another thread, where the
+    driver supports it. The worker may not have sent its connection yet.
+    """
+    if connection is None:
+        return
+    # The query may finish, and its connection close, meanwhile.
+    with contextlib.suppress(Exception):
+        if connection.vendor == "sqlite":
+            connection.connection.interrupt()
+        elif connection.vendor == "postgresql":  # pragma: no cover
+            connection.connection.cancel()
+
+
+class ResultWriter:
+    """
+    Inserts rows into the results table of a SQLite file, which takes its
+    columns from the first database to describe its result.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.db = sqlite3.connect(path)
+        self.columns: list[str] | None = None
+
+    def quote(self, name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+    def set_columns(self, columns: list[str]) -> None:
+        if self.columns is None:
+            self.columns = columns
+            self.db.execute(
+                f"CREATE TABLE results ({self.quote(ALIAS_COLUMN)}, "
+                + ", ".join(self.quote(column) for column in columns)
+                + ")"
+            )
+        elif columns != self.columns:
+            raise ValueError(
+                f"Columns ({', '.join(columns)}) differ from those of other "
+                + f"databases ({', '.join(self.columns)})."
+            )
+
+    def insert(self, alias: str, rows: list[tuple[Any, ...]]) -> None:
+        assert self.columns is not None
+        placeholders = ", ".join("?" for _ in range(len(self.columns) + 1))
+        self.db.executemany(
+            f"INSERT INTO results VALUES ({placeholders})",
+            [[alias, *(to_sqlite(value) for value in row)] for row in rows],
+        )
+
+    def discard(self, alias: str) -> None:
+        if self.columns is not None:
+            self.db.execute(
+                f"DELETE FROM results WHERE {self.quote(ALIAS_COLUMN)} = ?", [alias]
+            )
+
+    def finish(self, results: list[AliasResult]) -> None:
+        if self.columns is None:
+            self.db.execute(f"CREATE TABLE results ({self.quote(ALIAS_COLUMN)})")
+        self.db.execute(
+            "CREATE TABLE fan_out_aliases "
+            + "(alias TEXT, status TEXT, rows INTEGER, seconds REAL, error TEXT)"
+        )
+        self.db.executemany(
+            "INSERT INTO fan_out_aliases VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    result.alias,
+                    result.status,
+                    result.rows,
+                    round(result.seconds, 3),
+                    result.error,
+                )
+                for result in results
+            ],
+        )
+        self.db.commit()
+        self.db.close()
+
+
+class FanOut:
+    """
+    Runs a query against each database, on up to a number of threads at once.
+    Workers stream batches of rows through a queue to this thread, which
+    writes them as they arrive, so slow databases don’t hold up collecting
+    the others. Each database’s timeout starts when its worker starts, so it
+    covers connecting. When it passes, the database’s rows are discarded and
+    its query interrupted, and its worker is abandoned, so a waiting database
+    can take its place. Each session has its database’s guards applied first.
+    """
+
+    def __init__(
+        self,
+        aliases: list[str],
+        sql: str,
+        workers: int,
+        timeout: float,
+        progress: Callable[[str], None],
+        guards: dict[str, dict[str, Any]],
+    ) -> None:
+        self.aliases = aliases
+        self.sql = sql
+        self.workers = workers
+        self.timeout = timeout
+        self.progress = progress
+        self.guards = guards
+        self.messages: queue.Queue[tuple[str, str, Any]] = queue.Queue()
+        # Aliases whose workers should stop sending rows.
+        self.cancelled: set[str] = set()
+
+    def worker(self, alias: str) -> None:
+        # A connection of its own, rather than the thread’s shared one, with
+        # a connect timeout added unless the settings have one.
+        connection = connections.create_connection(alias)
+        settings_dict = connection.settings_dict
+        connection.settings_dict = {
+            **settings_dict,
+            "OPTIONS": {
+                **connect_options(connection.vendor, self.timeout),
+                **settings_dict["OPTIONS"],
+            },
+        }
+        self.messages.put(("connection", alias, connection))
+        try:
+            connection.ensure_connection()
+            with connection.cursor() as cursor:
+                for sql in [
+                    *session_statements(connection.vendor, self.guards[alias]),
+                    *timeout_statements(connection.vendor, self.timeout),
+                ]:
+                    cursor.execute(sql)
+                cursor.execute(self.sql)
+                if cursor.description is None:
+                    raise ValueError("The statement returned no rows.")
+                self.messages.put(
+                    ("columns", alias, [column[0] for column in cursor.description])
+                )
+                while alias not in self.cancelled and (
+                    rows := cursor.fetchmany(BATCH_SIZE)
+                ):
+                    self.messages.put(("rows", alias, rows))
+            self.messages.put(("done", alias, None))
+        except Exception as exc:
+            self.messages.put(("error", alias, f"{type(exc).__name__}: {exc}"))
+        finally:
+            connection.close()
+
+    def run(self, writer: ResultWriter) -> list[AliasResult]:
+        waiting = deque(self.aliases)
+        pending = set(self.aliases)
+        started: dict[str, float] = {}
+        running: dict[str, BaseDatabaseWrapper] = {}
+        counts = dict.fromkeys(self.aliases, 0)
+        results: dict[str, AliasResult] = {}
+
+        def launch() -> None:
+            # Abandoned workers don’t count towards the limit.
+            while waiting and len(pending & started.keys()) < self.workers:
+                alias = waiting.popleft()
+                started[alias] = time.monotonic()
+                threading.Thread(
+                    target=self.worker,
+                    args=(alias,),
+                    name=f"fan-out-{alias}",
+                    # Abandoned workers mustn’t hold up exiting.
+                    daemon=True,
+                ).start()
+
+        def finish(alias: str, status: str, error: str = "") -> None:
+            pending.discard(alias)
+            if status != "ok":
+                counts[alias] = 0
+                writer.discard(alias)
+            seconds = time.monotonic() - started[alias]
+            results[alias] = AliasResult(alias, status, counts[alias], seconds, error)
+            # Failures are in the results, for the caller to report.
+            if status == "ok":
+                self.progress(f"{alias}: {counts[alias]:,} rows in {seconds:.1f}s.")
+
+        try:
+            while pending:
+                launch()
+                now = time.monotonic()
+                expired = [
+                    alias
+                    for alias in sorted(pending & started.keys())
+                    if now - started[alias] >= self.timeout
+                ]
+                for alias in expired:
+                    self.cancelled.add(alias)
+                    interrupt(running.get(alias))
+                    finish(alias, "timeout", f"Timed out after {self.timeout:g}s.")
+                if expired:
+                    continue
+                first = min(started[alias] for alias in pending & started.keys())
+                wait = first + self.timeout - now
+                try:
+                    kind, alias, value = self.messages.get(timeout=max(wait, 0.001))
+                except queue.Empty:
+                    continue
+                if alias not in pending:
+                    # From a worker that timed out.
+                    continue
+                if kind == "connection":
+                    running[alias] = value
+                elif kind == "columns":
+                    try:
+                        writer.set_columns(value)
+                    except ValueError as exc:
+                        self.cancelled.add(alias)
+                        finish(alias, "error", str(exc))
+                elif kind == "rows":
+                    writer.insert(alias, value)
+                    counts[alias] += len(value)
+                elif kind == "done":
+                    finish(alias, "ok")
+                else:
+                    finish(alias, "error", value)
+        finally:
+            # Stop workers still sending rows, if collection failed.
+            self.cancelled.update(self.aliases)
+        return [results[alias] for alias in self.aliases]
+
+
+def fan_out(
+    pattern: str,
+    sql: str,
+    workers: int,
+    timeout: float,
+    progress: Callable[[str], None],
+    guard_overrides: dict[str, Any],
+) -> tuple[Path, list[AliasResult]]:
+    """
+    Run the query against every database whose alias matches the pattern,
+    with its guards and the overrides applied, and merge the results into a
+    SQLite file. Return its path, and the outcome for each database.
+    """
+    # Checked before any database runs it, as it runs on all of them.
+    if not is_select(sql):
+        raise CommandError("The fan-out query must be a single SELECT statement.")
+    aliases = match_aliases(pattern)
+    guards = {alias: get_guards(alias, guard_overrides) for alias in aliases}
+    path = cache_dir() / "fan-out" / "results.sqlite3"
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.")
+    os.close(fd)
+    writer = ResultWriter(tmp)
+    try:
+        results = FanOut(aliases, sql, workers, timeout, progress, guards).run(writer)
+        writer.finish(results)
+    except BaseException:
+        writer.db.close()
+        os.unlink(tmp)
+        raise
+    os.replace(tmp, path)
+    return path, results
@@ -0,0 +1,130 @@
+"""
+Per-session resource guards, limiting what ad-hoc queries can do to a busy
+database.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any
+
+import sqlparse
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from django_harlequin.profiles import get_profile
+
+GUARDS = (
+    "statement_timeout",
+    "lock_timeout",
+    "idle_in_transaction_session_timeout",
+    "work_mem",
+    "read_only",
+)
+
+DURATION_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(us|ms|s|min|h|d)?\s*$")
+DURATION_UNITS = {
+    "us": 0.000001,
+    "ms": 0.001,
+    "s": 1.0,
+    "min": 60.0,
+    "h": 3600.0,
+    "d": 86400.0,
+}
+
+
+def get_guards(alias: str, overrides: dict[str, Any]) -> dict[str, Any]:
+    """
+    The guards for a database alias, from the HARLEQUIN_GUARDS setting, with
+    those from command options taking precedence. A read_only option in the
+    alias’s HARLEQUIN_PROFILES profile acts as a default.
+    """
+    configured = getattr(settings, "HARLEQUIN_GUARDS", {}).get(alias, {})
+    unknown = sorted(set(configured) - set(GUARDS))
+    if unknown:
+        raise CommandError(
+            f"Unknown HARLEQUIN_GUARDS option for {alias!r}: {', '.join(unknown)}."
+        )
+    profile = get_profile(alias)
+    defaults = {"read_only": profile["read_only"]} if "read_only" in profile else {}
+    guards = {**defaults, **configured, **overrides}
+    # Identity checks, as 0 == False, and a zero timeout disables it.
+    return {
+        name: value
+        for name, value in guards.items()
+        if value is not None and value is not False
+    }
+
+
+def duration_seconds(value: int | float | str) -> float:
+    """
+    Parse a duration in PostgreSQL’s format, where numbers without a unit are
+    milliseconds.
+    """
+    if isinstance(value, (int, float)):
+        return value / 1000
+    match = DURATION_RE.match(value)
+    if match is None:
+        raise CommandError(f"Invalid duration {value!r}.")
+    number, unit = match.groups()
+    return float(number) * DURATION_UNITS[unit or "ms"]
+
+
+def postgres_options(guards: dict[str, Any], base: str | None) -> str:
+    """
+    Build a libpq options string, for PGOPTIONS, that sets the guards as
+    configuration parameters, after any options from the database settings.
+    """
+    parts = [base] if base else []
+    for name, value in guards.items():
+        if name == "read_only":
+            name, value = "default_transaction_read_only", "on"
+        value = str(value).replace("\\", "\\\\").replace(" ", "\\ ")
+        parts.append(f"-c {name}={value}")
+    return " ".join(parts)
+
+
+def session_statements(vendor: str, guards: dict[str, Any]) -> list[str]:
+    """
+    SQL statements that apply the guards to an open session, as Harlequin’s
+    adapter for the vendor would, so other sessions behave the same. Guards
+    the adapter cannot apply are skipped.
+    """
+    statements = []
+    for name, value in guards.items():
+        if vendor == "postgresql":
+            if name == "read_only":
+                name, value = "default_transaction_read_only", "on"
+            value = str(value).replace("'", "''")
+            statements.append(f"SELECT set_config('{name}', '{value}', false)")
+        elif vendor == "mysql":
+            if name == "read_only":
+                statements.append("SET SESSION TRANSACTION READ ONLY")
+        elif vendor == "sqlite":
+            if name == "lock_timeout":
+                milliseconds = round(duration_seconds(value) * 1000)
+                statements.append(f"PRAGMA busy_timeout = {milliseconds}")
+            elif name == "read_only":
+                statements.append("PRAGMA query_only = ON")
+    return statements
+
+
+def is_select(sql: str) -> bool:
+    """
+    Whether the SQL is a single SELECT statement, without data-modifying
+    common table expressions or locking clauses, so running it cannot change
+    the database.
+    """
+    # sqlparse is untyped.
+    statements: list[Any] = [
+        statement
+        for statement in sqlparse.parse(sql)
+        if statement.token_first(skip_cm=True) is not None  # type: ignore[no-untyped-call]
+    ]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
+        return False
+    return all(
+        token.value.upper() == "SELECT"
+        for token in statements[0].flatten()
+        if token.ttype is sqlparse.tokens.Keyword.DML
+    )
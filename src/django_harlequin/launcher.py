@@ -0,0 +1,232 @@
+"""
+A fast path for launching Harlequin, run with ``python -m django_harlequin``.
+
+When it has no up-to-date connection spec for a database alias, the launcher
+runs the ``harlequin`` management command, which records the command line and
+environment it builds in one. The launcher reuses that spec, without running
+``django.setup()``, until the settings module file changes.
+
+Passwords are never written to the spec. When a connection needs one, the
+launcher imports the settings module to rebuild the command line, which still
+skips loading installed apps.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections.abc import Sequence
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qsl
+
+from django_harlequin.cache import cache_dir, write_private
+
+SPEC_VERSION = 1
+
+SECRET_ENV = ("PGPASSWORD",)
+SECRET_ARGS = ("--password",)
+
+# A libpq "key=value" connection string, and its settings.
+CONNINFO_RE = re.compile(r"^\s*\w+\s*=")
+CONNINFO_SETTING_RE = re.compile(r"(\w+)\s*=\s*(?:'(?:[^'\\]|\\.)*'|\S*)")
+
+
+def settings_key(settings_module: str) -> dict[str, Any] | None:
+    """
+    Identify the current version of the settings module file, without
+    importing it.
+    """
+    try:
+        spec = find_spec(settings_module)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+        return None
+    stat = os.stat(spec.origin)
+    return {
+        "version": SPEC_VERSION,
+        "module": settings_module,
+        "origin": spec.origin,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+def spec_path(key: dict[str, Any], database: str) -> Path:
+    digest = hashlib.sha256(f"{key['origin']}\0{database}".encode()).hexdigest()
+    return cache_dir() / "launch" / f"{digest[:16]}.json"
+
+
+def harlequin_config_key(command: list[str] | None) -> list[list[Any]] | None:
+    """
+    For commands that pass a generated Harlequin config file, identify the
+    user’s own config files, whose default profile it is based on, so a
+    change to them regenerates it.
+    """
+    if command is None or "--config-path" not in command:
+        return None
+    # Imported only then, as it imports Django’s settings.
+    from django_harlequin.profiles import harlequin_config_key as config_key
+
+    return config_key()
+
+
+def write_spec(
+    settings_module: str, database: str, command: list[str], env: dict[str, str]
+) -> None:
+    key = settings_key(settings_module)
+    if key is None:  # pragma: no cover
+        return
+    has_secrets = any(name in env for name in SECRET_ENV) or any(
+        arg in command for arg in SECRET_ARGS
+    )
+    spec = {
+        "key": key,
+        "command": None if has_secrets else command,
+        "env": None if has_secrets else env,
+        "harlequin_config": harlequin_config_key(None if has_secrets else command),
+    }
+    write_private(spec_path(key, database), json.dumps(spec))
+
+
+def read_spec(settings_module: str, database: str) -> dict[str, Any] | None:
+    key = settings_key(settings_module)
+    if key is None:
+        return None
+    try:
+        spec: dict[str, Any] = json.loads(spec_path(key, database).read_text())
+    except (OSError, ValueError):
+        return None
+    if spec.get("key") != key:
+        return None
+    if spec.get("harlequin_config") != harlequin_config_key(spec.get("command")):
+        return None
+    return spec
+
+
+def is_conninfo(arg: str) -> bool:
+    return arg.startswith(("postgresql://", "postgres://")) or bool(
+        CONNINFO_RE.match(arg)
+    )
+
+
+def conninfo_settings(conninfo: str) -> dict[str, str]:
+    """
+    Split a libpq connection string, in either the keyword or URI form, into
+    its settings.
+    """
+    if "://" in conninfo:
+        return dict(parse_qsl(conninfo.partition("?")[2]))
+    return {
+        match[1]: match[0].partition("=")[2].strip()
+        for match in CONNINFO_SETTING_RE.finditer(conninfo)
+    }
+
+
+def extend_parameters(command: list[str], parameters: Sequence[str]) -> None:
+    """
+    Pass parameters through to Harlequin. Its Postgres adapter takes only one
+    connection string, so when the command has one, for settings without
+    options, and a parameter is another, the command’s settings are added to
+    the parameter’s, unless it sets them itself.
+    """
+    index = None
+    if command[1:3] == ["-a", "postgres"]:
+        index = next(
+            (i for i, arg in enumerate(command) if CONNINFO_RE.match(arg)), None
+        )
+    parameter = next((i for i, arg in enumerate(parameters) if is_conninfo(arg)), None)
+    if index is None or parameter is None:
+        command.extend(parameters)
+        return
+
+    own = conninfo_settings(command.pop(index))
+    conninfo = parameters[parameter]
+    user = conninfo_settings(conninfo)
+    extra = {name: value for name, value in own.items() if name not in user}
+    if extra and "://" in conninfo:
+        conninfo += ("&" if "?" in conninfo else "?") + "&".join(
+            f"{name}={value}" for name, value in extra.items()
+        )
+    elif extra:
+        conninfo += " " + " ".join(f"{name}={value}" for name, value in extra.items())
+    command.extend([*parameters[:parameter], conninfo, *parameters[parameter + 1 :]])
+
+
+def build_from_settings(database: str) -> tuple[list[str], dict[str, str]]:
+    """
+    Rebuild the command line from the settings module alone, for connections
+    whose secrets are not cached.
+    """
+    from django.conf import settings
+    from django.db.utils import ConnectionHandler
+
+    from django_harlequin.management.commands.harlequin import Command
+    from django_harlequin.profiles import extend_command as extend_command_profile
+
+    connection = ConnectionHandler(settings.DATABASES)[database]
+    command = ["harlequin"]
+    env: dict[str, str] = {}
+    Command().extend_command_env(connection, command, env)
+    extend_command_profile(database, command)
+    return command, env
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m django_harlequin",
+        description=(
+            "Launch Harlequin with your Django database configuration, reusing "
+            "the connection spec cached by the harlequin management command."
+        ),
+    )
+    parser.add_argument(
+        "--settings",
+        help=(
+            "The Python path to a settings module. If this isn't provided, the "
+            "DJANGO_SETTINGS_MODULE environment variable will be used."
+        ),
+    )
+    parser.add_argument(
+        "--database",
+        default="default",
+        help='Nominates a database to open. Defaults to the "default" database.',
+    )
+    parser.add_argument("parameters", nargs="*")
+    args = parser.parse_args(argv)
+
+    if args.settings:
+        os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+    settings_module = os.environ.get("DJANGO_SETTINGS_MODULE")
+    if not settings_module:
+        parser.error("Pass --settings or set DJANGO_SETTINGS_MODULE.")
+
+    spec = read_spec(settings_module, args.database)
+    if spec is None:
+        # Cache miss: run the full management command, which writes the spec.
+        import django
+        from django.core.management import call_command
+
+        from django_harlequin.management.commands.harlequin import Command
+
+        django.setup()
+        management_command = Command()
+        management_command.write_launcher_spec = True
+        call_command(
+            management_command, "--database", args.database, "--", *args.parameters
+        )
+        return 0
+
+    if spec["command"] is None:
+        command, env = build_from_settings(args.database)
+    else:
+        command, env = spec["command"], spec["env"]
+
+    extend_parameters(command, args.parameters)
+    env = {**os.environ, **env}
+    os.execvpe(command[0], command, env=env)
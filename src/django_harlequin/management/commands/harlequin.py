@@ -1,15 +1,68 @@
 from __future__ import annotations
 
 import os
-from argparse import ArgumentParser
-from typing import Any
+import random
+import signal
+import time
+from argparse import ArgumentParser, BooleanOptionalAction
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.utils import ConnectionHandler
+
+from django_harlequin.cache import cache_dir
+from django_harlequin.guards import (
+    GUARDS,
+    duration_seconds,
+    get_guards,
+    postgres_options,
+)
+from django_harlequin.profiles import extend_command as extend_command_profile
+from django_harlequin.profiling import (
+    TRACE_ENV,
+    NullProfiler,
+    Profiler,
+    now_us,
+    process_start_us,
+)
+from django_harlequin.workspace import Workspace
+
+if TYPE_CHECKING:
+    from django_harlequin.spawn import Limits
+
+# libpq keepalive parameters, which have no environment variable equivalents.
+POSTGRES_KEEPALIVE_OPTIONS = (
+    "keepalives",
+    "keepalives_idle",
+    "keepalives_interval",
+    "keepalives_count",
+    "tcp_user_timeout",
+)
+
+
+def libpq_list(value: Any) -> str:
+    """
+    Normalize a comma-separated libpq host or port list, which can’t contain
+    spaces.
+    """
+    return ",".join(part.strip() for part in str(value).split(","))
 
 
 class Command(BaseCommand):
+    # Guards from command options, which take precedence over settings.
+    guard_overrides: dict[str, Any] = {}
+    # Times launch phases for --profile.
+    profiler: Profiler = NullProfiler()
+    # Whether to cache the launch for the fast launcher, which sets this when
+    # it has no up-to-date spec, so other launches don’t pay for writing one.
+    write_launcher_spec = False
+    # From --verbosity, for warnings from deep in building the command.
+    verbosity = 1
+
     def add_arguments(self, parser: ArgumentParser) -> None:
         parser.add_argument(
             "--database",
@@ -20,17 +73,849 @@ class Command(BaseCommand):
                 "database."
             ),
         )
+        parser.add_argument(
+            "--catalog",
+            action="store_true",
+            help=(
+                "Write a snapshot of the schema, built from Django’s models, to "
+                "a workspace shown in Harlequin’s file tree. The snapshot is "
+                "cached until the applied migrations change."
+            ),
+        )
+        parser.add_argument(
+            "--snippets",
+            action="store_true",
+            help=(
+                "Write query snippets for each model, with keyset pagination, "
+                "lookups through indexes, and joins through indexed foreign "
+                "keys, to a workspace shown in Harlequin’s file tree."
+            ),
+        )
+        parser.add_argument(
+            "--queryset",
+            metavar="EXPRESSION",
+            help=(
+                "An ORM queryset expression, such as "
+                '"app_label.Model.objects.filter(...)", to compile and write, with '
+                "an EXPLAIN for it, to a workspace shown in Harlequin’s file tree."
+            ),
+        )
+        parser.add_argument(
+            "--slow-queries",
+            type=int,
+            nargs="?",
+            const=20,
+            metavar="N",
+            help=(
+                "Write the top N slow queries, by total time, recorded for the "
+                "database by the HARLEQUIN_SLOW_QUERIES recorder, to a workspace "
+                "shown in Harlequin’s file tree. Defaults to 20."
+            ),
+        )
+        parser.add_argument(
+            "--top-statements",
+            type=int,
+            nargs="?",
+            const=20,
+            metavar="N",
+            help=(
+                "Write the top N statements by total time, I/O, and rows, from "
+                "pg_stat_statements on PostgreSQL or performance_schema on "
+                "MySQL, with the models they touch, to a workspace shown in "
+                "Harlequin’s file tree. Defaults to 20."
+            ),
+        )
+        parser.add_argument(
+            "--from-capture",
+            metavar="FILE",
+            help=(
+                "Write the 20 heaviest queries, by total time, from a capture "
+                "made with the django_harlequin.pytest_plugin pytest plugin, "
+                "and those repeated enough within one test to suggest an N+1 "
+                "pattern, to a workspace shown in Harlequin’s file tree."
+            ),
+        )
+        parser.add_argument(
+            "--n-plus-one-threshold",
+            type=int,
+            default=10,
+            metavar="N",
+            help=(
+                "With --from-capture, the times a SELECT query must run within "
+                "one test to suggest an N+1 pattern. Defaults to 10."
+            ),
+        )
+        parser.add_argument(
+            "--index-advisor",
+            action="store_true",
+            help=(
+                "Compare the indexes models declare with those in the database "
+                "and its index usage statistics, and write the unused, "
+                "duplicate, and missing indexes found to a workspace shown in "
+                "Harlequin’s file tree."
+            ),
+        )
+        parser.add_argument(
+            "--diagnostics",
+            action="store_true",
+            help=(
+                "Write diagnostic queries for incidents, covering blocking "
+                "locks, long-running transactions, bloat, cache hit ratios, and "
+                "replication lag, with tables annotated with their models, to a "
+                "workspace shown in Harlequin’s file tree."
+            ),
+        )
+        parser.add_argument(
+            "--snapshot",
+            action="store_true",
+            help=(
+                "SQLite only: open a consistent copy of the database, made with "
+                "the online backup API, rather than the live file."
+            ),
+        )
+        parser.add_argument(
+            "--sample",
+            metavar="PERCENT",
+            help=(
+                "Extract a sample of this size, such as 1%%, of the tables into a "
+                "local SQLite file, with the rows their foreign keys reference, "
+                "and open that instead."
+            ),
+        )
+        parser.add_argument(
+            "--sample-models",
+            metavar="LABELS",
+            help=(
+                'Comma-separated models to sample, such as "app_label.Model". '
+                "Defaults to all models in the database."
+            ),
+        )
+        parser.add_argument(
+            "--sample-ttl",
+            type=float,
+            default=3600.0,
+            metavar="SECONDS",
+            help="Seconds to reuse a cached sample for. Defaults to 3600.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            metavar="ROWS",
+            help=(
+                "Insert this many synthetic rows into each table, generated "
+                "from the models’ fields, foreign keys, and unique constraints, "
+                "before opening the database."
+            ),
+        )
+        parser.add_argument(
+            "--seed-models",
+            metavar="LABELS",
+            help=(
+                'Comma-separated models to seed, such as "app_label.Model", '
+                "plus those their foreign keys reach. Defaults to all models in "
+                "the database."
+            ),
+        )
+        parser.add_argument(
+            "--random-seed",
+            type=int,
+            metavar="SEED",
+            help=(
+                "Seed for the random number generator used by --seed, to "
+                "reproduce a previous run. Defaults to a random seed, which is "
+                "reported."
+            ),
+        )
+        parser.add_argument(
+            "--seed-workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            metavar="N",
+            help=(
+                "Processes generating rows for --seed. Defaults to the number of CPUs."
+            ),
+        )
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Tells Django to NOT prompt the user for input of any kind.",
+        )
+        parser.add_argument(
+            "--fan-out",
+            metavar="SQL",
+            help=(
+                "Run a query against every database matching --fan-out-aliases, "
+                "concurrently, and open its results, merged into a local SQLite "
+                "file with each row tagged with its source alias."
+            ),
+        )
+        parser.add_argument(
+            "--fan-out-aliases",
+            default="*",
+            metavar="PATTERN",
+            help=(
+                'A glob pattern of database aliases for --fan-out, such as "shard*". '
+                "Defaults to all databases."
+            ),
+        )
+        parser.add_argument(
+            "--fan-out-workers",
+            type=int,
+            default=8,
+            metavar="N",
+            help="Databases to query at once for --fan-out. Defaults to 8.",
+        )
+        parser.add_argument(
+            "--fan-out-timeout",
+            type=float,
+            default=60.0,
+            metavar="SECONDS",
+            help=(
+                "Seconds to wait for each database’s results for --fan-out, "
+                "after which its results are left out. Defaults to 60."
+            ),
+        )
+        parser.add_argument(
+            "--parquet",
+            metavar="LABELS",
+            help=(
+                'Comma-separated models, such as "app_label.Model", to export to '
+                "Parquet files and open with Harlequin’s DuckDB adapter."
+            ),
+        )
+        parser.add_argument(
+            "--all-databases",
+            action="store_true",
+            help=(
+                "Attach every database to one session of Harlequin’s DuckDB "
+                "adapter, for queries that join across them."
+            ),
+        )
+        parser.add_argument(
+            "--prefer-replica",
+            action="store_true",
+            help=(
+                "Probe the database and its replicas, the other databases with "
+                "the same vendor and NAME, in parallel and launch on the best "
+                "one: within the lag limit, read from by the database routers, "
+                "and with the lowest connect time and latency."
+            ),
+        )
+        parser.add_argument(
+            "--probe-timeout",
+            type=float,
+            default=2.0,
+            metavar="SECONDS",
+            help="Seconds to wait for --prefer-replica probes. Defaults to 2.",
+        )
+        parser.add_argument(
+            "--max-lag",
+            type=float,
+            default=30.0,
+            metavar="SECONDS",
+            help=(
+                "Replication lag, in seconds, above which --prefer-replica avoids "
+                "a database. Defaults to 30."
+            ),
+        )
+        parser.add_argument(
+            "--profile",
+            nargs="?",
+            const="",
+            metavar="PATH",
+            help=(
+                "Write a Chrome trace of the time each launch phase takes, to "
+                "PATH or a file in the cache directory, and pass its path to "
+                f"Harlequin in the {TRACE_ENV} environment variable."
+            ),
+        )
+        parser.add_argument(
+            "--spawn",
+            action="store_true",
+            help=(
+                "Run Harlequin as a child process, rather than replacing this "
+                "one, and report its peak memory use and wall time when it "
+                "exits. Implied by the limit options."
+            ),
+        )
+        limits = parser.add_argument_group(
+            "limits",
+            "Resource limits for Harlequin run as a child process.",
+        )
+        limits.add_argument(
+            "--memory-limit",
+            metavar="SIZE",
+            help='Limit the address space (RLIMIT_AS), such as "4GB", with prlimit.',
+        )
+        limits.add_argument(
+            "--cpu-limit",
+            type=int,
+            metavar="SECONDS",
+            help="Limit the CPU time (RLIMIT_CPU), with prlimit.",
+        )
+        limits.add_argument(
+            "--nice",
+            type=int,
+            metavar="INCREMENT",
+            help="Lower the CPU scheduling priority by this much.",
+        )
+        limits.add_argument(
+            "--ionice",
+            type=int,
+            choices=range(8),
+            metavar="LEVEL",
+            help=(
+                "Set the best-effort I/O scheduling priority, from 0 (highest) "
+                "to 7 (lowest), with ionice."
+            ),
+        )
+        limits.add_argument(
+            "--cgroup-memory-max",
+            metavar="SIZE",
+            help=(
+                "Cap memory, without swap, in a cgroup v2 scope created with "
+                "systemd-run."
+            ),
+        )
+        guards = parser.add_argument_group(
+            "guards",
+            "Limits for the Harlequin session, overriding HARLEQUIN_GUARDS.",
+        )
+        guards.add_argument(
+            "--statement-timeout",
+            metavar="DURATION",
+            help='Abort statements that run longer than this, such as "30s".',
+        )
+        guards.add_argument(
+            "--lock-timeout",
+            metavar="DURATION",
+            help="Abort statements that wait longer than this for a lock.",
+        )
+        guards.add_argument(
+            "--idle-in-transaction-session-timeout",
+            metavar="DURATION",
+            help="Close sessions left idle in a transaction longer than this.",
+        )
+        guards.add_argument(
+            "--work-mem",
+            metavar="SIZE",
+            help='Memory for each sort or hash operation, such as "64MB".',
+        )
+        guards.add_argument(
+            "--read-only",
+            action=BooleanOptionalAction,
+            default=None,
+            help=(
+                "Make the session read-only, or with --no-read-only, not, "
+                "whatever the settings say."
+            ),
+        )
         parameters = parser.add_argument_group("parameters")
         parameters.add_argument("parameters", nargs="*")
 
     def handle(self, *args: Any, **options: Any) -> None:
         database: str = options["database"]
         parameters: list[str] = options["parameters"]
+        self.verbosity = options["verbosity"]
+
+        if options["profile"] is not None:
+            self.profiler = Profiler()
+            started = process_start_us()
+            if started is not None:  # pragma: no branch
+                # Interpreter start, django.setup(), and argument parsing.
+                self.profiler.add("startup", started, now_us())
+        profiler = self.profiler
+
+        if options["prefer_replica"]:
+            # Seeding writes, so must target the database that was asked for.
+            if options["seed"] is not None:
+                raise CommandError("--seed cannot be combined with --prefer-replica.")
+            with profiler.span("choose database"):
+                database = self.choose_database(
+                    database,
+                    options["probe_timeout"],
+                    options["max_lag"],
+                    options["verbosity"],
+                )
+
+        # Feature modules are imported lazily, here and below, since the fast
+        # launcher imports this module before Django is set up.
+        from django_harlequin.spawn import Limits, parse_size
+
+        # Parsed before any work, so invalid sizes fail fast.
+        limits = Limits(
+            memory=(
+                parse_size(options["memory_limit"]) if options["memory_limit"] else None
+            ),
+            cpu=options["cpu_limit"],
+            nice=options["nice"],
+            ionice=options["ionice"],
+            cgroup_memory=(
+                parse_size(options["cgroup_memory_max"])
+                if options["cgroup_memory_max"]
+                else None
+            ),
+        )
+
+        self.guard_overrides = {
+            name: options[name] for name in GUARDS if options[name] is not None
+        }
 
         command = ["harlequin"]
         env: dict[str, str] = {}
 
         connection = connections[database]
+        if options["parquet"] and (options["snapshot"] or options["sample"]):
+            raise CommandError(
+                "--parquet cannot be combined with --snapshot or --sample."
+            )
+        if options["all_databases"] and (
+            options["snapshot"] or options["sample"] or options["parquet"]
+        ):
+            raise CommandError(
+                "--all-databases cannot be combined with --snapshot, --sample, "
+                + "or --parquet."
+            )
+        if options["fan_out"] and (
+            options["snapshot"]
+            or options["sample"]
+            or options["parquet"]
+            or options["all_databases"]
+        ):
+            raise CommandError(
+                "--fan-out cannot be combined with --snapshot, --sample, "
+                + "--parquet, or --all-databases."
+            )
+        if options["seed"] is not None:
+            with profiler.span("seed"):
+                self.seed(
+                    connection,
+                    options["seed"],
+                    options["seed_models"],
+                    options["random_seed"],
+                    options["seed_workers"],
+                    options["interactive"],
+                    options["verbosity"],
+                )
+        if options["snapshot"]:
+            with profiler.span("snapshot"):
+                connection = self.snapshot(connection, options["verbosity"])
+        if options["sample"]:
+            with profiler.span("sample"):
+                connection = self.sample(
+                    connection,
+                    options["sample"],
+                    options["sample_models"],
+                    options["sample_ttl"],
+                    options["verbosity"],
+                )
+        if options["fan_out"]:
+            with profiler.span("fan out"):
+                connection = self.fan_out(
+                    connection,
+                    options["fan_out"],
+                    options["fan_out_aliases"],
+                    options["fan_out_workers"],
+                    options["fan_out_timeout"],
+                    options["verbosity"],
+                )
+        if options["parquet"]:
+            with profiler.span("export parquet"):
+                init_path = self.export_parquet(
+                    connection, options["parquet"], options["verbosity"]
+                )
+            self.extend_command_env_duckdb(init_path, command, env)
+        elif options["all_databases"]:
+            with profiler.span("attach databases"):
+                init_path = self.attach_databases()
+            self.extend_command_env_duckdb(init_path, command, env)
+        else:
+            with profiler.span(
+                "resolve settings", alias=connection.alias, vendor=connection.vendor
+            ):
+                self.extend_command_env(connection, command, env)
+        extend_command_profile(database, command)
+
+        # Cache for the fast launcher, python -m django_harlequin, when it
+        # asks, unless options make this launch differ from the settings.
+        if (
+            self.write_launcher_spec
+            and settings.SETTINGS_MODULE
+            and not self.guard_overrides
+            and not options["snapshot"]
+            and not options["sample"]
+            and not options["parquet"]
+            and not options["all_databases"]
+            and not options["fan_out"]
+        ):
+            with profiler.span("write launcher spec"):
+                from django_harlequin.launcher import write_spec
+
+                write_spec(settings.SETTINGS_MODULE, database, command, env)
+
+        workspace = Workspace(database)
+        if options["catalog"]:
+            with profiler.span("catalog"):
+                from django_harlequin.catalog import load_catalog, write_catalog
+
+                write_catalog(
+                    load_catalog(connection), workspace.section("catalog"), connection
+                )
+        if options["snippets"]:
+            with profiler.span("snippets"):
+                from django_harlequin.snippets import write_snippets
+
+                write_snippets(workspace.section("snippets"), connection)
+        if options["queryset"]:
+            with profiler.span("queryset"):
+                from django_harlequin.querysets import queryset_workspace_sql
+
+                path = workspace.section("queryset") / "queryset.sql"
+                path.write_text(queryset_workspace_sql(options["queryset"], connection))
+        if options["slow_queries"] is not None:
+            with profiler.span("slow queries"):
+                from django_harlequin.slow_queries import (
+                    get_config,
+                    load_slow_queries,
+                    slow_queries_dir,
+                    write_slow_queries,
+                )
+
+                path = slow_queries_dir(get_config()) / f"{database}.json"
+                entries = load_slow_queries(path)
+                if not entries:
+                    raise CommandError(f"No slow queries recorded in {str(path)!r}.")
+                write_slow_queries(
+                    entries[: options["slow_queries"]],
+                    workspace.section("slow-queries"),
+                    connection,
+                )
+        if options["top_statements"] is not None:
+            with profiler.span("top statements"):
+                from django_harlequin.statements import (
+                    top_statements,
+                    write_top_statements,
+                )
+
+                write_top_statements(
+                    top_statements(connection, options["top_statements"]),
+                    workspace.section("top-statements"),
+                    connection,
+                )
+        if options["from_capture"]:
+            with profiler.span("from capture"):
+                from django_harlequin.capture import (
+                    load_capture,
+                    write_captured_queries,
+                )
+
+                write_captured_queries(
+                    load_capture(Path(options["from_capture"])),
+                    workspace.section("capture"),
+                    connection,
+                    top=20,
+                    threshold=options["n_plus_one_threshold"],
+                )
+        if options["index_advisor"]:
+            with profiler.span("index advisor"):
+                from django_harlequin.advisor import advise, write_advice
+
+                findings = advise(connection)
+                write_advice(findings, workspace.section("advisor"), connection)
+                if options["verbosity"] >= 1:
+                    self.stderr.write(
+                        f"Index advisor found {len(findings)} issue"
+                        + ("" if len(findings) == 1 else "s")
+                        + "."
+                    )
+        if options["diagnostics"]:
+            with profiler.span("diagnostics"):
+                from django_harlequin.diagnostics import write_diagnostics
+
+                write_diagnostics(workspace.section("diagnostics"), connection)
+        workspace.extend_command(command)
+
+        # Pass through extra options
+        from django_harlequin.launcher import extend_parameters
+
+        extend_parameters(command, parameters)
+        env = {**os.environ, **env}
+        if options["profile"] is not None:
+            trace_path = self.trace_path(options["profile"])
+            env[TRACE_ENV] = str(trace_path)
+            profiler.write(trace_path, command[0])
+            if options["verbosity"] >= 1:
+                self.stderr.write(f"Profile written to {trace_path}.")
+        if limits or options["spawn"]:
+            self.spawn(command, env, limits, options["verbosity"])
+        else:
+            os.execvpe(command[0], command, env=env)
+
+    def spawn(
+        self, command: list[str], env: dict[str, str], limits: Limits, verbosity: int
+    ) -> None:
+        from django_harlequin.spawn import format_size, run
+
+        usage = run(command, env, limits)
+        if verbosity >= 1:
+            self.stderr.write(
+                f"Harlequin exited after {usage.wall_time:,.1f}s, with a peak "
+                + f"RSS of {format_size(usage.peak_rss)}."
+            )
+        if usage.returncode < 0:
+            # Such as SIGKILL from the cgroup memory cap, or SIGXCPU from the
+            # CPU limit.
+            name = signal.Signals(-usage.returncode).name
+            raise CommandError(
+                f"Harlequin was killed by {name}.", returncode=128 - usage.returncode
+            )
+        elif usage.returncode != 0:
+            raise CommandError(
+                f"Harlequin exited with code {usage.returncode}.",
+                returncode=usage.returncode,
+            )
+
+    def trace_path(self, path: str) -> Path:
+        if path:
+            return Path(path)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return cache_dir() / "profiles" / f"{stamp}-{os.getpid()}.json"
+
+    def choose_database(
+        self, database: str, timeout: float, max_lag: float, verbosity: int
+    ) -> str:
+        from django_harlequin.replicas import (
+            candidate_aliases,
+            probe_all,
+            rank,
+            read_aliases,
+        )
+
+        aliases = candidate_aliases(connections, database)
+        if len(aliases) == 1:
+            raise CommandError(
+                f"No replicas of database {database!r} to choose from: no other "
+                + "database has the same vendor and NAME."
+            )
+        probes = probe_all(connections, aliases, timeout)
+        if verbosity >= 1:
+            for probe in probes:
+                self.stderr.write(f"Probed {probe.describe()}")
+        ranked = rank(probes, read_aliases(), max_lag)
+        if not ranked:
+            raise CommandError("No database could be reached.")
+        if verbosity >= 1:
+            self.stderr.write(f"Using database {ranked[0].alias!r}.")
+        return ranked[0].alias
+
+    def snapshot(
+        self, connection: BaseDatabaseWrapper, verbosity: int
+    ) -> BaseDatabaseWrapper:
+        """
+        Copy a SQLite database and return a connection to the copy.
+        """
+        if connection.vendor != "sqlite":
+            raise CommandError("--snapshot is only supported for SQLite databases.")
+
+        from django_harlequin.sqlite import snapshot
+
+        def progress(remaining: int, total: int) -> None:
+            if verbosity >= 2:
+                self.stderr.write(f"Copied {total - remaining} of {total} pages.")
+
+        path = snapshot(connection, progress)
+        if verbosity >= 1:
+            self.stderr.write(f"Snapshot written to {path}.")
+        settings_dict = {**connection.settings_dict, "NAME": str(path)}
+        return type(connection)(settings_dict, connection.alias)
+
+    def seed(
+        self,
+        connection: BaseDatabaseWrapper,
+        rows: int,
+        models: str | None,
+        seed: int | None,
+        workers: int,
+        interactive: bool,
+        verbosity: int,
+    ) -> None:
+        """
+        Insert synthetic rows into the database’s tables.
+        """
+        from django_harlequin.seeding import seed_database
+
+        if interactive:
+            confirm = input(
+                f"You have requested to insert {rows:,} rows into each table "
+                + f"in database {connection.alias!r}.\n"
+                + "Are you sure you want to do this?\n\n"
+                + "    Type 'yes' to continue, or 'no' to cancel: "
+            )
+            if confirm != "yes":
+                raise CommandError("Seeding cancelled.")
+        if seed is None:
+            seed = random.randrange(2**32)
+        if verbosity >= 1:
+            self.stderr.write(f"Seeding with --random-seed {seed}.")
+
+        def progress(message: str) -> None:
+            if verbosity >= 2:
+                self.stderr.write(message)
+
+        seeded = seed_database(
+            connection,
+            rows,
+            models.split(",") if models else None,
+            seed,
+            workers,
+            progress,
+        )
+        if verbosity >= 1:
+            self.stderr.write(
+                f"Seeded {rows:,} rows into each of {len(seeded)} tables."
+            )
+
+    def sample(
+        self,
+        connection: BaseDatabaseWrapper,
+        size: str,
+        models: str | None,
+        ttl: float,
+        verbosity: int,
+    ) -> BaseDatabaseWrapper:
+        """
+        Extract a sample of the database and return a connection to it.
+        """
+        from django_harlequin.sampling import extract_sample, parse_percent
+
+        def progress(message: str) -> None:
+            if verbosity >= 2:
+                self.stderr.write(message)
+
+        path, cached = extract_sample(
+            connection,
+            parse_percent(size),
+            models.split(",") if models else None,
+            ttl,
+            progress,
+        )
+        if verbosity >= 1:
+            if cached:
+                self.stderr.write(f"Reusing sample {path}.")
+            else:
+                self.stderr.write(f"Sample written to {path}.")
+        return ConnectionHandler(
+            {
+                connection.alias: {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": str(path),
+                }
+            }
+        )[connection.alias]
+
+    def fan_out(
+        self,
+        connection: BaseDatabaseWrapper,
+        sql: str,
+        pattern: str,
+        workers: int,
+        timeout: float,
+        verbosity: int,
+    ) -> BaseDatabaseWrapper:
+        """
+        Run a query against many databases and return a connection to a SQLite
+        file of the merged results.
+        """
+        from django_harlequin.fan_out import fan_out
+
+        if workers < 1:
+            raise CommandError("--fan-out-workers must be at least 1.")
+
+        def progress(message: str) -> None:
+            if verbosity >= 2:
+                self.stderr.write(message)
+
+        path, results = fan_out(
+            pattern, sql, workers, timeout, progress, self.guard_overrides
+        )
+        if verbosity >= 1:
+            for result in results:
+                if result.status != "ok":
+                    self.stderr.write(f"{result.alias}: {result.error}")
+            succeeded = [result for result in results if result.status == "ok"]
+            self.stderr.write(
+                f"Fetched {sum(result.rows for result in succeeded):,} rows from "
+                + f"{len(succeeded)} of {len(results)} databases into {path}."
+            )
+        return ConnectionHandler(
+            {
+                connection.alias: {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": str(path),
+                }
+            }
+        )[connection.alias]
+
+    def export_parquet(
+        self, connection: BaseDatabaseWrapper, labels: str, verbosity: int
+    ) -> str:
+        """
+        Export tables to Parquet and return the path of a DuckDB init script
+        that creates views of them.
+        """
+        from django_harlequin.parquet import export_parquet
+
+        def progress(message: str) -> None:
+            if verbosity >= 1:
+                self.stderr.write(message)
+
+        return str(export_parquet(connection, labels.split(","), progress))
+
+    def attach_databases(self) -> str:
+        """
+        Write a DuckDB init script that attaches every database DuckDB can,
+        with the settings resolved for Harlequin’s adapter for it, and return
+        its path.
+        """
+        from django_harlequin.attach import (
+            DUCKDB_TYPES,
+            attach_sql,
+            write_attach_script,
+        )
+
+        attachments = []
+        for alias in connections:
+            connection = connections[alias]
+            if connection.vendor not in DUCKDB_TYPES:
+                self.stderr.write(
+                    f"DuckDB cannot attach {connection.vendor} databases, so "
+                    + f"{alias!r} is skipped."
+                )
+                continue
+            command: list[str] = []
+            env: dict[str, str] = {}
+            self.extend_command_env(connection, command, env)
+            attachments.append(
+                (
+                    connection.vendor,
+                    attach_sql(
+                        alias,
+                        connection.vendor,
+                        command,
+                        env,
+                        str(connection.settings_dict["NAME"]),
+                    ),
+                )
+            )
+        if not attachments:
+            raise CommandError("No databases can be attached to DuckDB.")
+        return str(write_attach_script(attachments))
+
+    def extend_command_env(
+        self, connection: BaseDatabaseWrapper, command: list[str], env: dict[str, str]
+    ) -> None:
         if connection.vendor == "mysql":
             self.extend_command_env_mysql(connection, command, env)
         elif connection.vendor == "postgresql":
@@ -39,34 +924,77 @@ class Command(BaseCommand):
             self.extend_command_env_sqlite(connection, command, env)
         else:
             raise CommandError(
-                f"Connection {database!r} has unsupported vendor {connection.vendor!r}."
+                f"Connection {connection.alias!r} has unsupported vendor "
+                + f"{connection.vendor!r}."
             )
 
-        # Pass through extra options
-        command.extend(parameters)
-        env = {**os.environ, **env}
-        os.execvpe(command[0], command, env=env)
+    def warn_unsupported_guards(
+        self,
+        connection: BaseDatabaseWrapper,
+        guards: dict[str, Any],
+        supported: tuple[str, ...],
+    ) -> None:
+        unsupported = [name for name in guards if name not in supported]
+        if unsupported:
+            self.stderr.write(
+                f"Harlequin’s {connection.vendor} adapter cannot apply these "
+                + f"guards, so they are ignored: {', '.join(unsupported)}."
+            )
 
     def extend_command_env_mysql(
         self, connection: BaseDatabaseWrapper, command: list[str], env: dict[str, str]
     ) -> None:
         command.extend(["-a", "mysql"])
 
+        # Harlequin’s MySQL adapter has no way to set session variables such
+        # as max_execution_time, but enforces read-only sessions itself.
+        guards = get_guards(connection.alias, self.guard_overrides)
+        self.warn_unsupported_guards(connection, guards, ("read_only",))
+        if guards.get("read_only"):
+            command.append("--read-only")
+
         settings_dict = connection.settings_dict
-        database = settings_dict["OPTIONS"].get(
-            "database",
-            settings_dict["OPTIONS"].get("db", settings_dict["NAME"]),
-        )
-        user = settings_dict["OPTIONS"].get("user", settings_dict["USER"])
-        password = settings_dict["OPTIONS"].get(
-            "password",
-            settings_dict["OPTIONS"].get("passwd", settings_dict["PASSWORD"]),
+        options = settings_dict["OPTIONS"]
+        database = options.get("database", options.get("db", settings_dict["NAME"]))
+        user = options.get("user", settings_dict["USER"])
+        password = options.get(
+            "password", options.get("passwd", settings_dict["PASSWORD"])
         )
-        host = settings_dict["OPTIONS"].get("host", settings_dict["HOST"])
-        port = settings_dict["OPTIONS"].get("port", settings_dict["PORT"])
-        server_ca = settings_dict["OPTIONS"].get("ssl", {}).get("ca")
-        client_cert = settings_dict["OPTIONS"].get("ssl", {}).get("cert")
-        client_key = settings_dict["OPTIONS"].get("ssl", {}).get("key")
+        host = options.get("host", settings_dict["HOST"])
+        port = options.get("port", settings_dict["PORT"])
+        unix_socket = options.get("unix_socket")
+        connect_timeout = options.get("connect_timeout")
+        server_ca = options.get("ssl", {}).get("ca")
+        client_cert = options.get("ssl", {}).get("cert")
+        client_key = options.get("ssl", {}).get("key")
+
+        if options.get("read_default_file"):
+            from django_harlequin.mysql import read_option_file
+
+            # Settings take precedence over the option file, as they do for
+            # mysqlclient.
+            defaults = read_option_file(
+                str(options["read_default_file"]),
+                options.get("read_default_group"),
+            )
+            if not host:
+                # The option file’s socket would take over from a host in the
+                # settings.
+                unix_socket = unix_socket or defaults.get("socket")
+            database = database or defaults.get("database")
+            user = user or defaults.get("user")
+            password = password or defaults.get("password")
+            host = host or defaults.get("host")
+            port = port or defaults.get("port")
+
+        if not unix_socket and host and "/" in host:
+            # A path in HOST is a socket, as for Django’s dbshell.
+            unix_socket, host = host, None
+        if options.get("compress") and self.verbosity >= 1:
+            self.stderr.write(
+                "Harlequin’s mysql adapter cannot enable protocol compression, "
+                + "so the compress option is ignored."
+            )
 
         if database:  # pragma: no branch
             command += ["--database", database]
@@ -78,10 +1006,16 @@ class Command(BaseCommand):
             # uses mysql-connector-python which doesn’t seem to read this
             # variable. Thus we have to use --password.
             command += ["--password", password]
-        if host:  # pragma: no branch
-            command += ["--host", host]
-        if port:  # pragma: no branch
-            command += ["--port", port]
+        if unix_socket:
+            # Prefer the local socket, skipping TCP entirely.
+            command += ["--unix_socket", unix_socket]
+        else:
+            if host:  # pragma: no branch
+                command += ["--host", host]
+            if port:  # pragma: no branch
+                command += ["--port", str(port)]
+        if connect_timeout:
+            command += ["--connect_timeout", str(connect_timeout)]
         if server_ca:  # pragma: no cover
             command += ["--ssl-ca", server_ca]
         if client_cert:  # pragma: no cover
@@ -95,6 +1029,7 @@ class Command(BaseCommand):
         command.extend(["-a", "postgres"])
 
         options = connection.settings_dict["OPTIONS"]
+        guards = get_guards(connection.alias, self.guard_overrides)
 
         host = connection.settings_dict.get("HOST")
         port = connection.settings_dict.get("PORT")
@@ -107,18 +1042,40 @@ class Command(BaseCommand):
         sslrootcert = options.get("sslrootcert")
         sslcert = options.get("sslcert")
         sslkey = options.get("sslkey")
+        connect_timeout = options.get("connect_timeout")
+        application_name = options.get("application_name")
+        target_session_attrs = options.get("target_session_attrs")
+        load_balance_hosts = options.get("load_balance_hosts")
+        keepalives = {
+            name: options[name]
+            for name in POSTGRES_KEEPALIVE_OPTIONS
+            if name in options
+        }
 
         if not dbname and not service:  # pragma: no cover
             # Connect to the default 'postgres' db.
             dbname = "postgres"
         if user:  # pragma: no branch
             command += ["--user", user]
+        # Both may be comma-separated lists, for libpq to try each host in
+        # turn, with one port for all hosts or one per host.
         if host:  # pragma: no branch
-            command += ["--host", host]
+            command += ["--host", libpq_list(host)]
         if port:  # pragma: no branch
-            command += ["--port", str(port)]
+            command += ["--port", libpq_list(port)]
         if dbname:  # pragma: no branch
             command += ["--dbname", dbname]
+        if connect_timeout:
+            command += ["--connect_timeout", str(connect_timeout)]
+        if guards.get("read_only"):
+            command.append("--read-only")
+        if keepalives:
+            # Passed as a connection string, which Harlequin merges with the
+            # other options, and with one passed through, where its own
+            # settings win.
+            command.append(
+                " ".join(f"{name}={value}" for name, value in keepalives.items())
+            )
 
         if passwd:
             env["PGPASSWORD"] = str(passwd)
@@ -134,14 +1091,36 @@ class Command(BaseCommand):
             env["PGSSLKEY"] = str(sslkey)
         if passfile:  # pragma: no cover
             env["PGPASSFILE"] = str(passfile)
+        if application_name:
+            env["PGAPPNAME"] = str(application_name)
+        if target_session_attrs:
+            env["PGTARGETSESSIONATTRS"] = str(target_session_attrs)
+        if load_balance_hosts:
+            env["PGLOADBALANCEHOSTS"] = str(load_balance_hosts)
+        if guards or options.get("options"):
+            env["PGOPTIONS"] = postgres_options(guards, options.get("options"))
+
+    def extend_command_env_duckdb(
+        self, init_path: str, command: list[str], env: dict[str, str]
+    ) -> None:
+        command.extend(["-a", "duckdb", "--init-path", init_path, ":memory:"])
 
     def extend_command_env_sqlite(
         self, connection: BaseDatabaseWrapper, command: list[str], env: dict[str, str]
     ) -> None:
-        command.extend(
-            [
-                "-a",
-                "sqlite",
-                connection.settings_dict["NAME"],
-            ]
-        )
+        command.extend(["-a", "sqlite"])
+
+        guards = get_guards(connection.alias, self.guard_overrides)
+        self.warn_unsupported_guards(connection, guards, ("lock_timeout", "read_only"))
+        if "lock_timeout" in guards:
+            seconds = duration_seconds(guards["lock_timeout"])
+            command += ["--lock-timeout", f"{seconds:g}"]
+        name = str(connection.settings_dict["NAME"])
+        if guards.get("read_only"):
+            from django_harlequin.sqlite import mmap_init_script, read_only_uri
+
+            # Open the live file read-only, and memory-mapped for fast reads.
+            command += ["--read-only", "--init-path", str(mmap_init_script())]
+            name = read_only_uri(name)
+
+        command.append(name)
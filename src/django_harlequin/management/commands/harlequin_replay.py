@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import json
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from django_harlequin.guards import is_select
+from django_harlequin.replay import (
+    Replayer,
+    history_paths,
+    read_history,
+    read_sql_file,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay queries from a SQL file, or Harlequin’s query history, with "
+        "concurrent workers, and report throughput and latency as JSON."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "sql_file",
+            nargs="?",
+            metavar="SQL_FILE",
+            help="A file of SQL statements to replay.",
+        )
+        parser.add_argument(
+            "--history",
+            nargs="?",
+            const="",
+            metavar="PATH",
+            help=(
+                "Replay the most recent distinct queries that ran successfully "
+                "in Harlequin, from its query history at PATH, or where Harlequin "
+                "keeps it."
+            ),
+        )
+        parser.add_argument(
+            "--history-limit",
+            type=int,
+            default=100,
+            metavar="N",
+            help="Queries to take from the history. Defaults to 100.",
+        )
+        parser.add_argument(
+            "--history-writes",
+            action="store_true",
+            help=(
+                "Also replay queries from the history that aren’t SELECT "
+                "statements, which may write to the database."
+            ),
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            choices=tuple(connections),
+            help=(
+                'Nominates a database to replay against. Defaults to the "default" '
+                "database."
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            metavar="N",
+            help=(
+                "Threads replaying queries, each with its own connection. "
+                "Defaults to 4."
+            ),
+        )
+        stop = parser.add_mutually_exclusive_group()
+        stop.add_argument(
+            "--iterations",
+            type=int,
+            metavar="N",
+            help="Passes over the queries for each worker. Defaults to 1.",
+        )
+        stop.add_argument(
+            "--duration",
+            type=float,
+            metavar="SECONDS",
+            help="Replay for this long, rather than a number of passes.",
+        )
+        parser.add_argument(
+            "--output",
+            metavar="PATH",
+            help="Write the JSON report to PATH, rather than standard output.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        database: str = options["database"]
+        connection = connections[database]
+
+        if (options["sql_file"] is None) == (options["history"] is None):
+            raise CommandError("Pass either a SQL file or --history.")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1.")
+        if options["iterations"] is not None and options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        if options["sql_file"] is not None:
+            queries = read_sql_file(Path(options["sql_file"]))
+        else:
+            queries = read_history(
+                [Path(options["history"])] if options["history"] else history_paths(),
+                connection.vendor,
+                options["history_limit"],
+            )
+            if not options["history_writes"]:
+                selects = [sql for sql in queries if is_select(sql)]
+                if len(selects) < len(queries) and options["verbosity"] >= 1:
+                    self.stderr.write(
+                        f"Skipped {len(queries) - len(selects)} queries from the "
+                        + "history that aren’t SELECT statements. Pass "
+                        + "--history-writes to replay them."
+                    )
+                queries = selects
+        if not queries:
+            raise CommandError("No queries to replay.")
+
+        iterations = options["iterations"]
+        if iterations is None and options["duration"] is None:
+            iterations = 1
+        report = Replayer(
+            database, queries, options["workers"], iterations, options["duration"]
+        ).run()
+
+        content = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(content + "\n")
+        else:
+            self.stdout.write(content)
+        if options["verbosity"] >= 1:
+            latency = report["latency_ms"]
+            self.stderr.write(
+                f"Replayed {report['executions']:,} queries in "
+                + f"{report['elapsed_s']:,.1f}s: {report['throughput_qps']:,.1f}/s, "
+                + f"p95 {latency['p95']}ms, {report['errors']:,} errors."
+            )
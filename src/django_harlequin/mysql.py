@@ -0,0 +1,50 @@
+"""
+Read MySQL option files, which Harlequin’s MySQL adapter doesn’t support.
+"""
+
+from __future__ import annotations
+
+import configparser
+import os
+
+# Option file keys for the connection settings Harlequin’s adapter takes.
+OPTION_FILE_KEYS = ("host", "port", "socket", "user", "password", "database")
+
+
+class OptionFileParser(configparser.ConfigParser):
+    def optionxform(self, optionstr: str) -> str:
+        # MySQL treats dashes and underscores in option names the same.
+        return optionstr.lower().replace("-", "_")
+
+
+def read_option_file(path: str, group: str | None) -> dict[str, str]:
+    """
+    The connection settings from an option file, like my.cnf, in the
+    [client] group and then the given group, as mysqlclient reads them for
+    its read_default_file and read_default_group options. Missing or
+    unreadable files give no settings.
+    """
+    parser = OptionFileParser(
+        allow_no_value=True,
+        strict=False,
+        interpolation=None,
+        comment_prefixes=("#", ";", "!"),
+        inline_comment_prefixes=("#",),
+    )
+    try:
+        with open(os.path.expanduser(path), encoding="utf-8") as fp:
+            parser.read_file(fp)
+    except (OSError, configparser.Error):
+        return {}
+
+    options: dict[str, str] = {}
+    for section in ("client", group):
+        if section is None or not parser.has_section(section):
+            continue
+        for key in OPTION_FILE_KEYS:
+            value = parser.get(section, key, fallback=None)
+            if value is not None:
+                if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+                    value = value[1:-1]
+                options[key] = value
+    return options
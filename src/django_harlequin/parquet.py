@@ -0,0 +1,237 @@
+"""
+Export tables to Parquet files, for analysis with Harlequin’s DuckDB adapter.
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Field, Model
+
+from django_harlequin.cache import cache_dir, write_private
+from django_harlequin.catalog import row_estimates
+
+# Rows fetched from the database per chunk.
+CHUNK_SIZE = 2000
+
+# Rows per Parquet row group, which bounds the memory used to write a table.
+ROW_GROUP_SIZE = 128 * 1024
+
+# Tables with at least this many estimated rows are exported in parallel, in
+# separate processes.
+LARGE_TABLE_ROWS = 1_000_000
+
+INTEGER_BITS = {
+    "AutoField": 32,
+    "BigAutoField": 64,
+    "BigIntegerField": 64,
+    "IntegerField": 32,
+    "PositiveBigIntegerField": 64,
+    "PositiveIntegerField": 64,
+    "PositiveSmallIntegerField": 32,
+    "SmallAutoField": 16,
+    "SmallIntegerField": 16,
+}
+
+
+def import_pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise CommandError(
+            "--parquet requires pyarrow. Install it with: "
+            + "python -m pip install 'django-harlequin[parquet]'"
+        )
+    return pyarrow
+
+
+def arrow_type(field: Field[Any, Any], pa: Any) -> Any:
+    """
+    The Arrow type for a model field.
+    """
+    if field.remote_field is not None:
+        return arrow_type(field.target_field, pa)  # type: ignore[attr-defined]
+    internal_type = field.get_internal_type()
+    if internal_type in INTEGER_BITS:
+        return getattr(pa, f"int{INTEGER_BITS[internal_type]}")()
+    elif internal_type == "BooleanField":
+        return pa.bool_()
+    elif internal_type == "FloatField":
+        return pa.float64()
+    elif internal_type == "DecimalField":
+        return pa.decimal128(field.max_digits, field.decimal_places)  # type: ignore[attr-defined]
+    elif internal_type == "DateTimeField":
+        return pa.timestamp("us", tz="UTC" if settings.USE_TZ else None)
+    elif internal_type == "DateField":
+        return pa.date32()
+    elif internal_type == "TimeField":
+        return pa.time64("us")
+    elif internal_type == "DurationField":
+        return pa.duration("us")
+    elif internal_type == "BinaryField":
+        return pa.binary()
+    else:
+        # Text, and values like UUIDs and JSON, stored as text.
+        return pa.string()
+
+
+def arrow_converter(field: Field[Any, Any]) -> Callable[[Any], Any] | None:
+    """
+    A function to convert the field’s Python values for Arrow, if needed.
+    """
+    if field.remote_field is not None:
+        return arrow_converter(field.target_field)  # type: ignore[attr-defined]
+    internal_type = field.get_internal_type()
+    if internal_type == "UUIDField":
+        return lambda value: None if value is None else str(value)
+    elif internal_type == "JSONField":
+        return lambda value: None if value is None else json.dumps(value)
+    elif internal_type == "BinaryField":
+        return lambda value: None if value is None else bytes(value)
+    return None
+
+
+def export_model(alias: str, label: str, directory: str) -> tuple[str, int]:
+    """
+    Stream a model’s table into a Parquet file, one row group at a time,
+    returning the file’s path and the number of rows.
+    """
+    pa = import_pyarrow()
+    model = apps.get_model(label)
+    fields = model._meta.local_concrete_fields
+    schema = pa.schema(
+        [pa.field(field.column, arrow_type(field, pa)) for field in fields]
+    )
+    converters = [arrow_converter(field) for field in fields]
+    rows = (
+        model._base_manager.using(alias)
+        .order_by()
+        .values_list(*(field.attname for field in fields))
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    path = Path(directory) / f"{model._meta.db_table}.parquet"
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    count = 0
+    with pa.parquet.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        columns: list[list[Any]] = [[] for _ in fields]
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+            count += 1
+            if len(columns[0]) >= ROW_GROUP_SIZE:
+                write_row_group(pa, writer, schema, columns, converters)
+        if columns[0] or count == 0:
+            write_row_group(pa, writer, schema, columns, converters)
+    os.replace(tmp, path)
+    return str(path), count
+
+
+def write_row_group(
+    pa: Any,
+    writer: Any,
+    schema: Any,
+    columns: list[list[Any]],
+    converters: list[Callable[[Any], Any] | None],
+) -> None:
+    arrays = [
+        pa.array(
+            column if converter is None else [converter(value) for value in column],
+            type=schema.field(index).type,
+        )
+        for index, (column, converter) in enumerate(zip(columns, converters))
+    ]
+    writer.write_table(
+        pa.Table.from_arrays(arrays, schema=schema), row_group_size=ROW_GROUP_SIZE
+    )
+    for column in columns:
+        column.clear()
+
+
+def init_worker() -> None:  # pragma: no cover
+    import django
+
+    django.setup()
+
+
+def export_parquet(
+    connection: BaseDatabaseWrapper,
+    labels: list[str],
+    progress: Callable[[str], None],
+) -> Path:
+    """
+    Export the models’ tables to Parquet files, with large tables exported in
+    parallel processes, and write a DuckDB init script that creates a view
+    for each file. Return the init script’s path.
+    """
+    import_pyarrow()
+    models: list[type[Model]] = []
+    for label in labels:
+        try:
+            models.append(apps.get_model(label))
+        except (LookupError, ValueError):
+            raise CommandError(f"Unknown model {label!r}.")
+
+    directory = cache_dir() / "parquet" / connection.alias
+    directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    estimates = row_estimates(connection)
+    large = [
+        model
+        for model in models
+        if estimates.get(model._meta.db_table, 0) >= LARGE_TABLE_ROWS
+    ]
+    results: dict[type[Model], tuple[str, int]] = {}
+    if large:
+        # Connections can’t be shared with child processes.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=min(len(large), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        ) as executor:
+            futures = {
+                model: executor.submit(
+                    export_model,
+                    connection.alias,
+                    model._meta.label,
+                    str(directory),
+                )
+                for model in large
+            }
+            for model in models:
+                if model not in futures:
+                    results[model] = export_model(
+                        connection.alias, model._meta.label, str(directory)
+                    )
+            for model, future in futures.items():
+                results[model] = future.result()
+    else:
+        for model in models:
+            results[model] = export_model(
+                connection.alias, model._meta.label, str(directory)
+            )
+
+    lines = []
+    for model in models:
+        path, count = results[model]
+        progress(f"Exported {count:,} rows from {model._meta.db_table}.")
+        table = model._meta.db_table.replace('"', '""')
+        path = path.replace("'", "''")
+        lines.append(
+            f'CREATE OR REPLACE VIEW "{table}" AS '
+            + f"SELECT * FROM read_parquet('{path}');"
+        )
+    init_path = directory / "init.sql"
+    write_private(init_path, "\n".join(lines) + "\n")
+    return init_path
@@ -0,0 +1,181 @@
+"""
+Per-database Harlequin profiles, from the HARLEQUIN_PROFILES setting, written
+to a generated Harlequin config file.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from django_harlequin.cache import cache_dir, write_private
+
+PROFILE_OPTIONS = ("limit", "read_only", "theme")
+
+# Options that Harlequin reads from a config file profile. read_only is
+# applied as a session guard instead, since only some adapters support it.
+CONFIG_OPTIONS = ("limit", "theme")
+
+# Options that generated profiles take from the user’s default Harlequin
+# profile, since selecting another profile drops them. They change how
+# Harlequin looks and behaves, rather than what it connects to.
+INHERITED_OPTIONS = (
+    "keymap_name",
+    "limit",
+    "locale",
+    "show_files",
+    "show_s3",
+    "theme",
+)
+
+
+def get_profile(alias: str) -> dict[str, Any]:
+    """
+    The profile for a database alias, from the HARLEQUIN_PROFILES setting.
+    """
+    configured: dict[str, Any] = getattr(settings, "HARLEQUIN_PROFILES", {}).get(
+        alias, {}
+    )
+    unknown = sorted(set(configured) - set(PROFILE_OPTIONS))
+    if unknown:
+        raise CommandError(
+            f"Unknown HARLEQUIN_PROFILES option for {alias!r}: {', '.join(unknown)}."
+        )
+    return configured
+
+
+def profile_name(alias: str) -> str:
+    return f"django-{alias}"
+
+
+def toml_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, list):
+        return "[" + ", ".join(toml_value(item) for item in value) + "]"
+    # JSON strings are valid TOML basic strings.
+    return json.dumps(str(value))
+
+
+def harlequin_config_paths() -> list[Path]:
+    """
+    Where Harlequin looks for config files, nearest first, as it and
+    platformdirs locate them.
+    """
+    if sys.platform == "darwin":
+        config = Path.home() / "Library" / "Application Support" / "harlequin"
+    elif sys.platform == "win32":
+        config = Path(os.environ["LOCALAPPDATA"]) / "harlequin"
+    else:
+        config = (
+            Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config")
+            / "harlequin"
+        )
+    return [
+        *(
+            Path.cwd() / name
+            for name in ("harlequin.toml", ".harlequin.toml", "pyproject.toml")
+        ),
+        *(
+            config / name
+            for name in ("harlequin.toml", ".harlequin.toml", "config.toml")
+        ),
+        *(
+            Path.home() / name
+            for name in ("harlequin.toml", ".harlequin.toml", "pyproject.toml")
+        ),
+    ]
+
+
+def harlequin_config_key() -> list[list[Any]]:
+    """
+    Identify the current versions of the user’s Harlequin config files.
+    """
+    key = []
+    for path in harlequin_config_paths():
+        try:
+            key.append([str(path), path.stat().st_mtime_ns])
+        except OSError:
+            pass
+    return key
+
+
+def default_profile() -> dict[str, Any]:
+    """
+    The options that generated profiles inherit from the profile Harlequin
+    would use by default, merging the user’s config files as Harlequin does:
+    the nearest to set default_profile, or define a profile, wins. Reading
+    them needs tomllib, from Python 3.11. Files that can’t be read are left
+    for Harlequin to report.
+    """
+    if sys.version_info < (3, 11):  # pragma: no cover
+        return {}
+    import tomllib
+
+    name = None
+    profiles: dict[str, Any] = {}
+    for path in harlequin_config_paths():
+        try:
+            config = tomllib.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if path.name == "pyproject.toml":
+            config = config.get("tool", {}).get("harlequin", {})
+        if name is None and isinstance(config.get("default_profile"), str):
+            name = config["default_profile"]
+        for other, profile in config.get("profiles", {}).items():
+            profiles.setdefault(other, profile)
+    profile = profiles.get(name, {}) if name is not None else {}
+    return {
+        option: profile[option] for option in INHERITED_OPTIONS if option in profile
+    }
+
+
+def config_toml() -> str:
+    """
+    A Harlequin config file with a profile for each database alias in the
+    HARLEQUIN_PROFILES setting, based on the user’s default profile.
+    """
+    lines = ["# Generated by django-harlequin from HARLEQUIN_PROFILES."]
+    inherited = default_profile()
+    for alias in getattr(settings, "HARLEQUIN_PROFILES", {}):
+        profile = get_profile(alias)
+        options = {
+            **inherited,
+            **{name: profile[name] for name in CONFIG_OPTIONS if name in profile},
+        }
+        lines += ["", f"[profiles.{json.dumps(profile_name(alias))}]"]
+        for name in INHERITED_OPTIONS:
+            if name in options:
+                lines.append(f"{name} = {toml_value(options[name])}")
+    return "\n".join(lines) + "\n"
+
+
+def write_config() -> Path:
+    path = cache_dir() / "harlequin" / "config.toml"
+    write_private(path, config_toml())
+    return path
+
+
+def extend_command(alias: str, command: list[str]) -> None:
+    """
+    Select the alias’s profile from a freshly generated config file, if it
+    sets any options that Harlequin reads from one.
+    """
+    profile = get_profile(alias)
+    if not any(name in profile for name in CONFIG_OPTIONS):
+        return
+    command += [
+        "--config-path",
+        str(write_config()),
+        "--profile",
+        profile_name(alias),
+    ]
@@ -0,0 +1,112 @@
+"""
+Time the phases of a launch, for --profile, as a Chrome trace.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from django_harlequin.cache import write_private
+
+# Passed to Harlequin with the trace’s path. Harlequin keeps the process ID
+# through os.execvpe(), so its own timings can be joined to the trace by pid
+# and timestamp.
+TRACE_ENV = "DJANGO_HARLEQUIN_TRACE"
+
+
+def now_us() -> float:
+    """
+    Microseconds since the Unix epoch, the trace’s clock, so timestamps can be
+    compared with those from other processes.
+    """
+    return time.time_ns() / 1000
+
+
+def process_start_us() -> float | None:
+    """
+    When this process started, on Linux, to time everything before the
+    command ran, such as django.setup().
+    """
+    try:
+        with open("/proc/self/stat") as fp:
+            # Fields after the command name, which may contain spaces.
+            fields = fp.read().rpartition(")")[2].split()
+        with open("/proc/stat") as fp:
+            boot_time = next(
+                int(line.split()[1]) for line in fp if line.startswith("btime ")
+            )
+    except (OSError, StopIteration):  # pragma: no cover
+        return None
+    ticks = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    return (boot_time + ticks) * 1_000_000
+
+
+class Profiler:
+    """
+    Records complete ("X") events in the Chrome trace event format, viewable
+    in Perfetto or chrome://tracing.
+    """
+
+    def __init__(self) -> None:
+        self.events: list[dict[str, Any]] = []
+        self.pid = os.getpid()
+
+    def add(self, name: str, start: float, end: float, **args: Any) -> None:
+        self.events.append(
+            {
+                "name": name,
+                "cat": "django-harlequin",
+                "ph": "X",
+                "ts": start,
+                "dur": end - start,
+                "pid": self.pid,
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        start = now_us()
+        try:
+            yield
+        finally:
+            self.add(name, start, now_us(), **args)
+
+    def write(self, path: Path, command: str) -> None:
+        """
+        Write the trace, ending with an instant event for executing the
+        command, the last moment this process can record.
+        """
+        events = list(self.events)
+        events.append(
+            {
+                "name": "execvpe",
+                "cat": "django-harlequin",
+                "ph": "i",
+                "s": "p",
+                "ts": now_us(),
+                "pid": self.pid,
+                "tid": threading.get_ident(),
+                "args": {"command": command},
+            }
+        )
+        write_private(
+            path, json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+        )
+
+
+class NullProfiler(Profiler):
+    """
+    A profiler that records nothing, used when --profile is not passed.
+    """
+
+    def add(self, name: str, start: float, end: float, **args: Any) -> None:
+        pass
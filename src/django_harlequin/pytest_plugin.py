@@ -0,0 +1,79 @@
+"""
+A pytest plugin that captures the queries each test runs, for
+``harlequin --from-capture``. Enable it with:
+
+    pytest -p django_harlequin.pytest_plugin --harlequin-capture queries.json
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from django_harlequin.capture import QueryCapture, load_capture
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("django-harlequin")
+    group.addoption(
+        "--harlequin-capture",
+        metavar="PATH",
+        help=(
+            "Record the queries each test runs, fingerprinted, to PATH, for "
+            "harlequin --from-capture."
+        ),
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    path = config.getoption("harlequin_capture")
+    if path:
+        config.pluginmanager.register(CapturePlugin(Path(path)), "harlequin-capture")
+
+
+class CapturePlugin:
+    """
+    Captures queries to the path. Under pytest-xdist, each worker writes a
+    file of its own beside it, which the controller merges into the path
+    once the workers finish.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.capture = QueryCapture()
+        self.worker = os.environ.get("PYTEST_XDIST_WORKER")
+
+    def worker_paths(self) -> list[Path]:
+        return sorted(self.path.parent.glob(f"{glob.escape(self.path.name)}.gw*"))
+
+    def pytest_sessionstart(self, session: pytest.Session) -> None:
+        if self.worker is None:
+            # Left by an interrupted run.
+            for path in self.worker_paths():
+                path.unlink()
+        self.capture.install()
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_protocol(
+        self, item: pytest.Item, nextitem: pytest.Item | None
+    ) -> Generator[None, Any, Any]:
+        self.capture.test = item.nodeid
+        try:
+            return (yield)
+        finally:
+            self.capture.test = None
+
+    def pytest_sessionfinish(self, session: pytest.Session) -> None:
+        self.capture.uninstall()
+        if self.worker is not None:
+            self.capture.write(self.path.with_name(f"{self.path.name}.{self.worker}"))
+            return
+        for path in self.worker_paths():
+            self.capture.merge(load_capture(path))
+            path.unlink()
+        self.capture.write(self.path)
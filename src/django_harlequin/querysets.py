@@ -0,0 +1,75 @@
+"""
+Compile ORM querysets into SQL to open in Harlequin.
+"""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import sqlparse
+from django.apps import apps
+from django.core.exceptions import EmptyResultSet
+from django.core.management.base import CommandError
+from django.db import models
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from django_harlequin.sql import explain, interpolate
+
+
+def evaluate_queryset(expression: str) -> QuerySet[Any]:
+    """
+    Evaluate an expression like "app_label.Model.objects.filter(...)". Models
+    are available under their app labels, alongside the contents of
+    django.db.models and django.utils.timezone.
+    """
+    namespace: dict[str, Any] = {name: getattr(models, name) for name in models.__all__}
+    namespace["timezone"] = timezone
+    for app_config in apps.get_app_configs():
+        namespace[app_config.label] = SimpleNamespace(
+            **{model.__name__: model for model in app_config.get_models()}
+        )
+    try:
+        result = eval(expression, namespace)  # noqa: S307
+    except Exception as exc:
+        raise CommandError(f"Could not evaluate queryset {expression!r}: {exc}")
+    if not isinstance(result, QuerySet):
+        raise CommandError(
+            f"Expression {expression!r} evaluated to {type(result).__name__}, "
+            + "not a QuerySet."
+        )
+    return result
+
+
+def compile_queryset(queryset: QuerySet[Any], connection: BaseDatabaseWrapper) -> str:
+    """
+    Compile a queryset with the given connection’s compiler, with its
+    parameters filled in as literals.
+    """
+    compiler = queryset.query.get_compiler(connection=connection)
+    try:
+        sql, params = compiler.as_sql()
+    except EmptyResultSet:
+        raise CommandError("The queryset cannot match any rows, so has no SQL.")
+    return interpolate(sql, params, connection.vendor)
+
+
+def queryset_workspace_sql(expression: str, connection: BaseDatabaseWrapper) -> str:
+    sql = sqlparse.format(
+        compile_queryset(evaluate_queryset(expression), connection),
+        reindent=True,
+    )
+    explain_sql = explain(sql, connection.vendor)
+    lines = [
+        f"-- {expression}",
+        f"-- Compiled for database {connection.alias!r} ({connection.vendor}).",
+        "",
+        f"{sql};",
+        "",
+    ]
+    if connection.vendor == "postgresql":
+        lines.append("-- EXPLAIN ANALYZE runs the query to measure it.")
+    lines += [f"{explain_sql};", ""]
+    return "\n".join(lines)
@@ -0,0 +1,345 @@
+"""
+Replay queries against a database with concurrent workers, measuring their
+throughput and latency, to check how tuned queries behave under load.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import math
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import sqlparse
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from django_harlequin.guards import get_guards, session_statements
+from django_harlequin.slow_queries import percentile
+
+# Harlequin’s adapter names, as recorded in its query history.
+HISTORY_ADAPTERS = {
+    "postgresql": "postgres",
+    "mysql": "mysql",
+    "sqlite": "sqlite",
+}
+
+# The start of every SQLite file.
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def read_sql_file(path: Path) -> list[str]:
+    """
+    The statements in a SQL file, skipping those that are only comments.
+    """
+    try:
+        text = path.read_text()
+    except OSError as exc:
+        raise CommandError(f"Cannot read {str(path)!r}: {exc.strerror}.")
+    return [
+        statement.strip().rstrip(";")
+        for statement in sqlparse.split(text)
+        if sqlparse.format(statement, strip_comments=True).strip()
+    ]
+
+
+def history_paths() -> list[Path]:
+    """
+    Where Harlequin keeps its query history, as platformdirs locates its
+    directories: a SQLite store in its state directory, since Harlequin 2.14,
+    and before then, its pickled catalog cache.
+    """
+    if sys.platform == "darwin":
+        state = Path.home() / "Library" / "Application Support" / "harlequin"
+        cache = Path.home() / "Library" / "Caches" / "harlequin"
+    elif sys.platform == "win32":
+        state = Path(os.environ["LOCALAPPDATA"]) / "harlequin" / "harlequin"
+        cache = state / "Cache"
+    else:
+        state = (
+            Path(os.environ.get("XDG_STATE_HOME") or Path.home() / ".local/state")
+            / "harlequin"
+        )
+        cache = (
+            Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+            / "harlequin"
+        )
+    return [state / "history.db", cache / "catalog-cache-2.pickle"]
+
+
+def read_history(paths: list[Path], vendor: str, limit: int) -> list[str]:
+    """
+    The most recent distinct queries that ran successfully in Harlequin,
+    oldest first, from the first of the paths that exists.
+    """
+    path = next((path for path in paths if path.exists()), None)
+    if path is None:
+        raise CommandError(
+            "No Harlequin query history found at "
+            + " or ".join(repr(str(path)) for path in paths)
+            + "."
+        )
+    with path.open("rb") as fp:
+        header = fp.read(len(SQLITE_HEADER))
+    if header == SQLITE_HEADER:
+        recent = read_history_store(path, vendor, limit)
+    else:
+        recent = read_history_cache(path)
+    queries: list[str] = []
+    for sql in recent:
+        sql = sql.strip().rstrip(";")
+        if sql not in queries:
+            queries.append(sql)
+            if len(queries) == limit:
+                break
+    return queries[::-1]
+
+
+def read_history_store(path: Path, vendor: str, limit: int) -> list[str]:
+    """
+    Queries from Harlequin’s SQLite store, newest first, limited to those run
+    with the vendor’s adapter.
+    """
+    try:
+        db = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True)
+        try:
+            (version,) = db.execute("PRAGMA user_version").fetchone()
+            if version < 1:
+                # Created, but not yet migrated.
+                return []
+            rows = db.execute(
+                """
+                SELECT sql FROM queries
+                WHERE status = 'ok' AND adapter = ?
+                GROUP BY sql
+                ORDER BY max(id) DESC
+                LIMIT ?
+                """,
+                [HISTORY_ADAPTERS.get(vendor, vendor), limit],
+            ).fetchall()
+        finally:
+            db.close()
+    except sqlite3.Error as exc:
+        raise CommandError(f"Cannot read Harlequin query history: {exc}.")
+    return [sql for (sql,) in rows]
+
+
+class Pickled:
+    """
+    Stands in for the classes in Harlequin’s catalog cache, keeping their
+    attributes.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+class CacheUnpickler(pickle.Unpickler):
+    """
+    Loads Harlequin’s catalog cache without importing Harlequin, or running
+    any code the file names: every class but a few safe ones from the
+    standard library loads as a Pickled.
+    """
+
+    SAFE_CLASSES: dict[tuple[str, str], Any] = {
+        ("collections", "OrderedDict"): OrderedDict,
+        ("collections", "defaultdict"): defaultdict,
+        ("collections", "deque"): deque,
+        ("datetime", "date"): dt.date,
+        ("datetime", "datetime"): dt.datetime,
+        ("datetime", "timedelta"): dt.timedelta,
+        ("datetime", "timezone"): dt.timezone,
+    }
+
+    def find_class(self, module: str, name: str) -> Any:
+        return self.SAFE_CLASSES.get((module, name), Pickled)
+
+
+def read_history_cache(path: Path) -> list[str]:
+    """
+    Queries from Harlequin’s pickled catalog cache, newest first. It keeps a
+    history per connection, without the adapter, so this takes every
+    connection’s. Failed queries have negative row counts.
+    """
+    try:
+        with path.open("rb") as fp:
+            cache = CacheUnpickler(fp).load()
+        executions = [
+            execution
+            for history in getattr(cache, "history", {}).values()
+            for execution in history.queries
+        ]
+        executions.sort(key=lambda execution: execution.executed_at, reverse=True)
+        return [
+            execution.query_text
+            for execution in executions
+            if execution.result_row_count >= 0
+        ]
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError) as exc:
+        raise CommandError(f"Cannot read Harlequin query history: {exc}.")
+    except (AttributeError, TypeError):
+        raise CommandError(
+            "Cannot read Harlequin query history: unexpected catalog cache format."
+        )
+
+
+@dataclass
+class QueryStats:
+    sql: str
+    latencies: list[float] = field(default_factory=list)
+    errors: Counter[str] = field(default_factory=Counter)
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float | None]:
+    """
+    Percentiles, mean, and maximum of latencies, in milliseconds.
+    """
+    if not latencies:
+        return dict.fromkeys(("p50", "p95", "p99", "mean", "max"))
+    return {
+        "p50": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+        "max": round(max(latencies) * 1000, 3),
+    }
+
+
+class Replayer:
+    """
+    Runs the queries in a loop in each of several threads, each with its own
+    connection, configured from the database’s settings and guards as for a
+    Harlequin session. Workers start at different queries, so they don’t run
+    the same query in lockstep, and stop after a number of passes over the
+    queries or when the duration is up.
+    """
+
+    def __init__(
+        self,
+        alias: str,
+        queries: list[str],
+        workers: int,
+        iterations: int | None,
+        duration: float | None,
+    ) -> None:
+        self.alias = alias
+        self.queries = queries
+        self.workers = workers
+        self.iterations = iterations
+        self.duration = duration
+        self.guards = get_guards(alias, {})
+        self.stats = [QueryStats(sql) for sql in queries]
+        self.lock = threading.Lock()
+        # Workers connect before the clock starts.
+        self.ready = threading.Barrier(workers + 1, action=self.start_clock)
+        self.started = 0.0
+        self.deadline = math.inf
+        self.failure: Exception | None = None
+
+    def run(self) -> dict[str, Any]:
+        threads = [
+            threading.Thread(target=self.worker, args=(number,))
+            for number in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self.ready.wait()
+        except threading.BrokenBarrierError:
+            for thread in threads:
+                thread.join()
+            raise CommandError(
+                f"Cannot connect to database {self.alias!r}: {self.failure}"
+            )
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - self.started)
+
+    def start_clock(self) -> None:
+        self.started = time.perf_counter()
+        if self.duration is not None:
+            self.deadline = self.started + self.duration
+
+    def worker(self, number: int) -> None:
+        connection = connections[self.alias]
+        try:
+            try:
+                with connection.cursor() as cursor:
+                    for sql in session_statements(connection.vendor, self.guards):
+                        cursor.execute(sql)
+            except Exception as exc:
+                self.failure = exc
+                self.ready.abort()
+                return
+            try:
+                self.ready.wait()
+            except threading.BrokenBarrierError:
+                # Another worker failed to connect.
+                return
+            self.replay(connection, number)
+        finally:
+            connection.close()
+
+    def replay(self, connection: BaseDatabaseWrapper, number: int) -> None:
+        latencies: list[list[float]] = [[] for _ in self.queries]
+        errors: list[Counter[str]] = [Counter() for _ in self.queries]
+        count = len(self.queries)
+        executed = 0
+        while True:
+            if self.iterations is not None and executed == self.iterations * count:
+                break
+            if time.perf_counter() >= self.deadline:
+                break
+            index = (number + executed) % count
+            started = time.perf_counter()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(self.queries[index])
+                    if cursor.description is not None:
+                        cursor.fetchall()
+            except DatabaseError as exc:
+                # The first line, without context such as PostgreSQL’s LINE 1.
+                lines = str(exc).strip().splitlines()
+                errors[index][": ".join([type(exc).__name__, *lines[:1]])] += 1
+            else:
+                latencies[index].append(time.perf_counter() - started)
+            executed += 1
+        with self.lock:
+            for stats, query_latencies, query_errors in zip(
+                self.stats, latencies, errors
+            ):
+                stats.latencies.extend(query_latencies)
+                stats.errors.update(query_errors)
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        latencies = [latency for stats in self.stats for latency in stats.latencies]
+        errors = sum(sum(stats.errors.values()) for stats in self.stats)
+        executions = len(latencies) + errors
+        return {
+            "database": self.alias,
+            "vendor": connections[self.alias].vendor,
+            "workers": self.workers,
+            "elapsed_s": round(elapsed, 3),
+            "executions": executions,
+            "errors": errors,
+            "throughput_qps": round(executions / elapsed, 2),
+            "latency_ms": latency_summary(latencies),
+            "queries": [
+                {
+                    "sql": stats.sql,
+                    "executions": len(stats.latencies) + sum(stats.errors.values()),
+                    "errors": dict(stats.errors),
+                    "latency_ms": latency_summary(stats.latencies),
+                }
+                for stats in self.stats
+            ],
+        }
@@ -0,0 +1,183 @@
+"""
+Latency-aware selection between database aliases.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.db import router
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.utils import CursorWrapper
+from django.db.utils import ConnectionHandler
+
+
+@dataclass
+class Probe:
+    alias: str
+    connect_time: float | None = None
+    latency: float | None = None
+    lag: float | None = None
+    error: str | None = None
+
+    def describe(self) -> str:
+        if self.error is not None:
+            return f"{self.alias}: {self.error}"
+        assert self.connect_time is not None and self.latency is not None
+        lag = "unknown" if self.lag is None else f"{self.lag:.1f}s"
+        return (
+            f"{self.alias}: connect {self.connect_time * 1000:.1f}ms, "
+            + f"latency {self.latency * 1000:.1f}ms, lag {lag}"
+        )
+
+
+def read_aliases() -> set[str]:
+    """
+    The aliases the database routers choose for reading any model, other than
+    the primaries they write to.
+    """
+    models = apps.get_models()
+    return {router.db_for_read(model) for model in models} - {
+        router.db_for_write(model) for model in models
+    }
+
+
+def candidate_aliases(connections: ConnectionHandler, database: str) -> list[str]:
+    """
+    The database, and the other aliases for the same vendor and database NAME,
+    such as its replicas on other hosts.
+    """
+    vendor = connections[database].vendor
+    name = connections.settings[database]["NAME"]
+    return [
+        alias
+        for alias in connections
+        if alias == database
+        # NAME first, so unrelated aliases’ backends aren’t loaded.
+        or (
+            connections.settings[alias]["NAME"] == name
+            and connections[alias].vendor == vendor
+        )
+    ]
+
+
+def replication_lag(
+    connection: BaseDatabaseWrapper, cursor: CursorWrapper
+) -> float | None:
+    """
+    Seconds the database is behind its primary, zero for a primary, or None if
+    unknown.
+    """
+    if connection.vendor == "postgresql":  # pragma: no cover
+        cursor.execute(
+            """
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+            END
+            """
+        )
+        lag = cursor.fetchone()[0]
+        return None if lag is None else float(lag)
+    elif connection.vendor == "mysql":  # pragma: no cover
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Exception:
+            # MySQL < 8.0.22 and MariaDB < 10.5.1
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        if row is None:
+            return 0.0
+        columns = [column[0] for column in cursor.description]
+        status = dict(zip(columns, row))
+        lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)
+    return 0.0
+
+
+def probe(connections: ConnectionHandler, alias: str, timeout: float) -> Probe:
+    """
+    Open a fresh connection to the alias, and measure it, with timeouts for
+    connecting and queries, so the probe gives up by itself.
+    """
+    result = Probe(alias)
+    settings_dict = {**connections.settings[alias]}
+    settings_dict["OPTIONS"] = options = {**settings_dict["OPTIONS"]}
+    connection = type(connections[alias])(settings_dict, alias)
+    if connection.vendor in ("postgresql", "mysql"):  # pragma: no cover
+        options.setdefault("connect_timeout", max(1, math.ceil(timeout)))
+        if connection.vendor == "mysql":
+            options.setdefault("read_timeout", max(1, math.ceil(timeout)))
+    elif connection.vendor == "sqlite":  # pragma: no branch
+        options.setdefault("timeout", timeout)
+    try:
+        start = time.perf_counter()
+        connection.ensure_connection()
+        result.connect_time = time.perf_counter() - start
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":  # pragma: no cover
+                cursor.execute(
+                    "SELECT set_config('statement_timeout', %s, false)",
+                    [f"{max(1, round(timeout * 1000))}ms"],
+                )
+            start = time.perf_counter()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            result.latency = time.perf_counter() - start
+            result.lag = replication_lag(connection, cursor)
+    except Exception as exc:
+        result.error = str(exc) or exc.__class__.__name__
+    finally:
+        connection.close()
+    return result
+
+
+def probe_all(
+    connections: ConnectionHandler, aliases: list[str], timeout: float
+) -> list[Probe]:
+    """
+    Probe the aliases in parallel. Any still running after the timeout are
+    reported as timed out. They give up by themselves soon after, and are
+    waited for, so no probe thread is left running to hold up exiting, or
+    while Harlequin is spawned.
+    """
+    with ThreadPoolExecutor(
+        max_workers=len(aliases), thread_name_prefix="harlequin-probe"
+    ) as executor:
+        futures = {
+            alias: executor.submit(probe, connections, alias, timeout)
+            for alias in aliases
+        }
+        done, _ = wait(futures.values(), timeout=timeout)
+
+    results = []
+    for alias, future in futures.items():
+        if future in done:
+            results.append(future.result())
+        else:
+            results.append(Probe(alias, error=f"timed out after {timeout:g}s"))
+    return results
+
+
+def rank(probes: list[Probe], preferred: set[str], max_lag: float) -> list[Probe]:
+    """
+    Order reachable aliases best first: those within the lag limit, then those
+    the routers read from, then by connect time plus round-trip latency.
+    """
+    reachable = [probe for probe in probes if probe.error is None]
+
+    def key(probe: Probe) -> tuple[bool, bool, float]:
+        assert probe.connect_time is not None and probe.latency is not None
+        lagging = probe.lag is None or probe.lag > max_lag
+        return (
+            lagging,
+            probe.alias not in preferred,
+            probe.connect_time + probe.latency,
+        )
+
+    return sorted(reachable, key=key)
@@ -0,0 +1,358 @@
+"""
+Extract a sample of a database’s tables into a local SQLite file.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from collections.abc import Callable, Iterable
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+from django.apps import apps
+from django.core.management.base import CommandError
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import IntegerField, Model
+from django.db.utils import ConnectionHandler
+
+from django_harlequin.cache import cache_dir
+from django_harlequin.catalog import database_models, migration_key
+
+# Rows read from the source database per fetchmany() call.
+BATCH_SIZE = 2000
+
+# Values per IN (...) clause when fetching referenced rows.
+IN_BATCH_SIZE = 500
+
+# Primary key values per range sampled on MySQL.
+PK_RANGE_SIZE = 1000
+
+
+def parse_percent(value: str) -> float:
+    """
+    Parse a sample size like "1%" or "0.5".
+    """
+    try:
+        percent = float(value.strip().removesuffix("%"))
+    except ValueError:
+        percent = math.nan
+    if not 0 < percent <= 100:
+        raise CommandError(
+            f"Invalid sample size {value!r}, it should be a percentage between "
+            + "0 and 100, such as 1%."
+        )
+    return percent
+
+
+def select_models(
+    connection: BaseDatabaseWrapper, labels: Iterable[str] | None
+) -> list[type[Model]]:
+    """
+    The models to sample, from "app_label.Model" labels, or all models in the
+    database.
+    """
+    if labels is None:
+        return database_models(connection)
+    models = []
+    for label in labels:
+        try:
+            models.append(apps.get_model(label))
+        except (LookupError, ValueError):
+            raise CommandError(f"Unknown model {label!r}.")
+    return models
+
+
+def foreign_key_closure(selected: list[type[Model]]) -> list[type[Model]]:
+    """
+    The given models, plus all those their foreign keys reach.
+    """
+    models: list[type[Model]] = []
+    pending = list(selected)
+    while pending:
+        model = pending.pop(0)
+        if model in models:
+            continue
+        models.append(model)
+        for field in model._meta.local_concrete_fields:
+            if field.remote_field is not None:
+                pending.append(field.remote_field.model)
+    return sorted(models, key=lambda model: model._meta.db_table)
+
+
+def column_names(model: type[Model]) -> list[str]:
+    return [str(field.column) for field in model._meta.local_concrete_fields]
+
+
+def sample_queries(
+    connection: BaseDatabaseWrapper,
+    model: type[Model],
+    percent: float,
+    rng: random.Random,
+) -> list[tuple[str, list[Any]]]:
+    """
+    Queries that select a sample of the model’s table, using the vendor’s
+    cheapest sampling method.
+    """
+    qn = connection.ops.quote_name
+    opts = model._meta
+    columns = ", ".join(qn(column) for column in column_names(model))
+    select = f"SELECT {columns} FROM {qn(opts.db_table)}"
+    if connection.vendor == "postgresql":
+        # Samples whole pages, so it avoids reading the rest of the table.
+        return [(f"{select} TABLESAMPLE SYSTEM (%s)", [percent])]
+    elif connection.vendor == "mysql":
+        pk = opts.pk
+        if not isinstance(pk, IntegerField):
+            return [(f"{select} WHERE RAND() < %s", [percent / 100])]
+        pk_column = qn(str(pk.column))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT MIN({pk_column}), MAX({pk_column}) FROM {qn(opts.db_table)}"
+            )
+            low, high = cursor.fetchone()
+        if low is None:
+            return []
+        return [
+            (f"{select} WHERE {pk_column} BETWEEN %s AND %s", [start, end])
+            for start, end in pk_ranges(low, high, percent, rng)
+        ]
+    else:
+        return [(f"{select} WHERE abs(random()) %% 1000000 < %s", [percent * 10000])]
+
+
+def pk_ranges(
+    low: int, high: int, percent: float, rng: random.Random
+) -> list[tuple[int, int]]:
+    """
+    Randomly chosen ranges of primary key values, covering the percentage of
+    the span between the lowest and highest values. Reading ranges uses the
+    primary key index, rather than scanning the whole table.
+    """
+    blocks = math.ceil((high - low + 1) / PK_RANGE_SIZE)
+    count = max(1, round(blocks * percent / 100))
+    chosen = sorted(rng.sample(range(blocks), count))
+    return [
+        (
+            low + block * PK_RANGE_SIZE,
+            min(high, low + (block + 1) * PK_RANGE_SIZE - 1),
+        )
+        for block in chosen
+    ]
+
+
+def to_sqlite(value: Any) -> Any:
+    """
+    Convert a value read from any database to one SQLite stores like Django
+    does.
+    """
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, dt.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, (dt.date, dt.time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return value.hex
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+class Sampler:
+    """
+    Copies a sample of the selected models’ tables from a source connection
+    into a local SQLite database, then copies the rows their foreign keys
+    reference, from the tables of all the models, until the extract has
+    referential closure.
+    """
+
+    def __init__(
+        self,
+        source: BaseDatabaseWrapper,
+        target: BaseDatabaseWrapper,
+        selected: list[type[Model]],
+        models: list[type[Model]],
+        percent: float,
+        progress: Callable[[str], None],
+        rng: random.Random,
+    ) -> None:
+        self.source = source
+        self.target = target
+        self.selected = selected
+        self.models = models
+        self.percent = percent
+        self.progress = progress
+        self.rng = rng
+
+    def run(self) -> None:
+        self.create_tables()
+        for model in self.selected:
+            count = sum(
+                self.copy(model, sql, params)
+                for sql, params in sample_queries(
+                    self.source, model, self.percent, self.rng
+                )
+            )
+            self.progress(f"Sampled {count:,} rows from {model._meta.db_table}.")
+        self.close_references()
+        self.target.connection.commit()
+
+    def create_tables(self) -> None:
+        created: set[str] = set()
+        with self.target.schema_editor() as editor:
+            # Models before the many-to-many tables they create.
+            for model in sorted(self.models, key=lambda m: bool(m._meta.auto_created)):
+                if model._meta.db_table in created:
+                    continue
+                editor.create_model(model)
+                created.add(model._meta.db_table)
+                created.update(
+                    field.remote_field.through._meta.db_table  # type: ignore[union-attr]
+                    for field in model._meta.local_many_to_many
+                    if field.remote_field.through._meta.auto_created  # type: ignore[union-attr]
+                )
+        # Rows arrive before the rows they reference, and some references may
+        # never be found.
+        self.target.connection.execute("PRAGMA foreign_keys = OFF")
+
+    def copy(self, model: type[Model], sql: str, params: list[Any]) -> int:
+        """
+        Stream the rows of a query on the source into the model’s table in the
+        target, with a server-side cursor where the database has them.
+        """
+        qn = self.target.ops.quote_name
+        opts = model._meta
+        columns = column_names(model)
+        insert = (
+            f"INSERT OR IGNORE INTO {qn(opts.db_table)} "
+            + f"({', '.join(qn(column) for column in columns)}) "
+            + f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        count = 0
+        with self.source.chunked_cursor() as cursor:
+            cursor.execute(sql, params)
+            while rows := cursor.fetchmany(BATCH_SIZE):
+                self.target.connection.executemany(
+                    insert, [[to_sqlite(value) for value in row] for row in rows]
+                )
+                count += len(rows)
+        return count
+
+    def close_references(self) -> None:
+        """
+        Copy rows referenced by foreign keys but missing from the sample,
+        repeating until none are missing, or all missing rows have been
+        looked for.
+        """
+        qn = self.target.ops.quote_name
+        tried: dict[tuple[str, str], set[Any]] = {}
+        while True:
+            copied = 0
+            for model in self.models:
+                for field in model._meta.local_concrete_fields:
+                    if field.remote_field is None:
+                        continue
+                    related = field.remote_field.model._meta
+                    target_column = str(field.target_field.column)  # type: ignore[attr-defined]
+                    column = qn(str(field.column))
+                    rows = self.target.connection.execute(
+                        f"SELECT DISTINCT {column} "
+                        + f"FROM {qn(model._meta.db_table)} "
+                        + f"WHERE {column} IS NOT NULL AND {column} NOT IN "
+                        + f"(SELECT {qn(target_column)} FROM {qn(related.db_table)})"
+                    ).fetchall()
+                    seen = tried.setdefault((related.db_table, target_column), set())
+                    missing = [row[0] for row in rows if row[0] not in seen]
+                    seen.update(missing)
+                    copied += self.copy_referenced(
+                        related.model, target_column, missing
+                    )
+            if not copied:
+                break
+
+    def copy_referenced(
+        self, model: type[Model], column: str, values: list[Any]
+    ) -> int:
+        qn = self.source.ops.quote_name
+        opts = model._meta
+        columns = ", ".join(qn(column) for column in column_names(model))
+        count = 0
+        for start in range(0, len(values), IN_BATCH_SIZE):
+            batch = values[start : start + IN_BATCH_SIZE]
+            count += self.copy(
+                model,
+                f"SELECT {columns} FROM {qn(opts.db_table)} "
+                + f"WHERE {qn(column)} IN ({', '.join('%s' for _ in batch)})",
+                batch,
+            )
+        if count:
+            self.progress(f"Copied {count:,} referenced rows into {opts.db_table}.")
+        return count
+
+
+def sample_path(
+    connection: BaseDatabaseWrapper, models: list[type[Model]], percent: float
+) -> Path:
+    key = "\0".join(
+        [
+            connection.alias,
+            repr(percent),
+            migration_key(connection),
+            *(model._meta.label for model in models),
+        ]
+    )
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return cache_dir() / "samples" / f"{connection.alias}-{digest}.sqlite3"
+
+
+def extract_sample(
+    connection: BaseDatabaseWrapper,
+    percent: float,
+    labels: list[str] | None,
+    ttl: float,
+    progress: Callable[[str], None],
+) -> tuple[Path, bool]:
+    """
+    Return the path of a sample of the database, and whether it was reused
+    from the cache, which happens until it is older than ttl seconds.
+    """
+    selected = select_models(connection, labels)
+    models = foreign_key_closure(selected)
+    path = sample_path(connection, selected, percent)
+    try:
+        age = time.time() - path.stat().st_mtime
+    except FileNotFoundError:
+        age = math.inf
+    if age < ttl:
+        return path, True
+
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.")
+    os.close(fd)
+    target = ConnectionHandler(
+        {connection.alias: {"ENGINE": "django.db.backends.sqlite3", "NAME": tmp}}
+    )[connection.alias]
+    try:
+        Sampler(
+            connection, target, selected, models, percent, progress, random.Random()
+        ).run()
+        target.close()
+        os.replace(tmp, path)
+    except BaseException:
+        target.close()
+        os.unlink(tmp)
+        raise
+    return path, False
@@ -0,0 +1,431 @@
+"""
+Seed a database with synthetic rows, generated from the models’ fields,
+foreign keys, and unique constraints, so query plans can be explored at
+production scale without production data.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import multiprocessing
+import random
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.core.management.color import no_style
+from django.db import transaction
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import (
+    EmailField,
+    Field,
+    IntegerField,
+    Max,
+    Model,
+    UniqueConstraint,
+    URLField,
+)
+
+from django_harlequin.sampling import foreign_key_closure, select_models
+
+# Rows generated per task. Each task’s rows come from their own random number
+# generator, so the rows are the same however many workers generate them.
+CHUNK_SIZE = 10_000
+
+# Rows per multi-row INSERT, within the backend’s limit on parameters.
+INSERT_BATCH_SIZE = 1000
+
+# The fraction of values in nullable columns generated as NULL.
+NULL_FRACTION = 0.1
+
+# Upper bounds for generated integers, which fit each integer type.
+SMALL_INTEGER_TYPES = ("SmallIntegerField", "PositiveSmallIntegerField")
+INTEGER_TYPES = (
+    "AutoField",
+    "BigAutoField",
+    "BigIntegerField",
+    "IntegerField",
+    "PositiveBigIntegerField",
+    "PositiveIntegerField",
+    "SmallAutoField",
+    *SMALL_INTEGER_TYPES,
+)
+TEXT_TYPES = ("CharField", "SlugField", "TextField")
+
+WORDS = (
+    "alpha",
+    "bravo",
+    "charlie",
+    "delta",
+    "echo",
+    "foxtrot",
+    "golf",
+    "hotel",
+    "india",
+    "juliett",
+    "kilo",
+    "lima",
+    "mike",
+    "november",
+    "oscar",
+    "papa",
+)
+
+EPOCH = dt.datetime(2000, 1, 1)
+
+# Generated dates and times fall within this many days of EPOCH.
+SPAN_DAYS = 25 * 365
+
+
+@dataclass
+class Plan:
+    """
+    What every worker needs to generate rows: the rows per model, the random
+    seed, and each model’s row number offset, which is its current highest
+    integer primary key, or its row count, so seeding a populated database
+    doesn’t collide with existing rows.
+    """
+
+    rows: int
+    seed: int
+    offsets: dict[str, int]
+
+
+def dependency_order(models: list[type[Model]]) -> list[type[Model]]:
+    """
+    The models ordered so that those referenced by foreign keys come before
+    the models referencing them, where there are no cycles.
+    """
+    ordered: list[type[Model]] = []
+    visiting: set[type[Model]] = set()
+
+    def visit(model: type[Model]) -> None:
+        if model in ordered or model in visiting:
+            return
+        visiting.add(model)
+        for field in model._meta.local_concrete_fields:
+            if field.remote_field is not None and field.remote_field.model in models:
+                visit(field.remote_field.model)
+        ordered.append(model)
+
+    for model in models:
+        visit(model)
+    return ordered
+
+
+def unique_field_names(model: type[Model]) -> set[str]:
+    """
+    The names of the fields whose values must be unique per row, alone or
+    together with others.
+    """
+    opts = model._meta
+    names = {field.name for field in opts.local_concrete_fields if field.unique}
+    for field_names in opts.unique_together:
+        names.update(field_names)
+    for constraint in opts.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            names.update(constraint.fields)
+    return names
+
+
+def table_offset(connection: BaseDatabaseWrapper, model: type[Model]) -> int:
+    manager = model._base_manager.using(connection.alias)
+    if isinstance(model._meta.pk, IntegerField):
+        return manager.aggregate(offset=Max("pk"))["offset"] or 0
+    return manager.count()
+
+
+def unique_value(
+    plan: Plan, model: type[Model], field: Field[Any, Any], index: int
+) -> Any:
+    """
+    The value of a unique field for a row, derived from its row number. A
+    foreign key takes the value of the row with the same index in the table
+    it references, so foreign keys in unique constraints are unique too.
+    """
+    if field.remote_field is not None:
+        return unique_value(
+            plan,
+            field.remote_field.model,
+            field.target_field,  # type: ignore[attr-defined]
+            index,
+        )
+    number = plan.offsets[model._meta.label] + index + 1
+    internal_type = field.get_internal_type()
+    if internal_type in INTEGER_TYPES:
+        return number
+    elif internal_type == "UUIDField":
+        digest = hashlib.sha256(f"{plan.seed}:{model._meta.label}:{number}".encode())
+        return UUID(bytes=digest.digest()[:16], version=4)
+    elif isinstance(field, EmailField):
+        return f"{field.name}{number}@example.com"
+    elif internal_type in TEXT_TYPES:
+        # Truncated from the left, keeping the number.
+        value = f"{field.name}-{number}"
+        return value[-field.max_length :] if field.max_length else value
+    elif internal_type == "DateField":
+        return EPOCH.date() + dt.timedelta(days=number)
+    elif internal_type == "DateTimeField":
+        return aware(EPOCH + dt.timedelta(seconds=number))
+    raise CommandError(
+        f"Cannot generate unique values for {model._meta.label}.{field.name}, "
+        + f"a {internal_type}."
+    )
+
+
+def aware(value: dt.datetime) -> dt.datetime:
+    return value.replace(tzinfo=dt.timezone.utc) if settings.USE_TZ else value
+
+
+def random_value(model: type[Model], field: Field[Any, Any], rng: random.Random) -> Any:
+    """
+    A random value for a field, from its choices, or its type.
+    """
+    if field.choices:
+        return rng.choice([value for value, _ in field.flatchoices])
+    internal_type = field.get_internal_type()
+    if internal_type == "BooleanField":
+        return rng.random() < 0.5
+    elif internal_type in INTEGER_TYPES:
+        return rng.randint(
+            0, 32_767 if internal_type in SMALL_INTEGER_TYPES else 1_000_000
+        )
+    elif internal_type == "FloatField":
+        return round(rng.uniform(0, 1000), 2)
+    elif internal_type == "DecimalField":
+        digits = rng.randrange(10**field.max_digits)  # type: ignore[attr-defined]
+        return Decimal(digits).scaleb(-field.decimal_places)  # type: ignore[attr-defined]
+    elif isinstance(field, EmailField):
+        return f"{rng.choice(WORDS)}{rng.randrange(1_000_000)}@example.com"
+    elif isinstance(field, URLField):
+        return f"https://example.com/{rng.choice(WORDS)}"
+    elif internal_type in TEXT_TYPES:
+        separator = "-" if internal_type == "SlugField" else " "
+        value = separator.join(rng.choices(WORDS, k=rng.randint(1, 4)))
+        return value[: field.max_length] if field.max_length else value
+    elif internal_type == "DateField":
+        return EPOCH.date() + dt.timedelta(days=rng.randrange(SPAN_DAYS))
+    elif internal_type == "DateTimeField":
+        return aware(EPOCH + dt.timedelta(seconds=rng.randrange(SPAN_DAYS * 86_400)))
+    elif internal_type == "TimeField":
+        return dt.time(rng.randrange(24), rng.randrange(60), rng.randrange(60))
+    elif internal_type == "DurationField":
+        return dt.timedelta(seconds=rng.randrange(86_400))
+    elif internal_type == "UUIDField":
+        return UUID(int=rng.getrandbits(128), version=4)
+    elif internal_type == "JSONField":
+        return {"word": rng.choice(WORDS), "number": rng.randrange(1000)}
+    elif internal_type == "BinaryField":
+        return rng.randbytes(16)
+    elif internal_type == "GenericIPAddressField":
+        return f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+    elif field.has_default():
+        return field.get_default()
+    elif field.null:
+        return None
+    raise CommandError(
+        f"Cannot generate values for {model._meta.label}.{field.name}, a "
+        + f"{internal_type}."
+    )
+
+
+def model_rows(
+    plan: Plan, model: type[Model], start: int, stop: int
+) -> list[list[Any]]:
+    """
+    Generate rows start to stop of a model, as values for its concrete
+    fields, from a random number generator seeded for these rows.
+    """
+    rng = random.Random(f"{plan.seed}:{model._meta.label}:{start}")
+    fields = model._meta.local_concrete_fields
+    unique = unique_field_names(model)
+    rows = []
+    for index in range(start, stop):
+        row = []
+        for field in fields:
+            if field.name in unique:
+                value = unique_value(plan, model, field, index)
+            elif field.null and rng.random() < NULL_FRACTION:
+                value = None
+            elif field.remote_field is not None:
+                related = field.remote_field.model
+                # A row can only reference rows of its own table that are
+                # inserted before it, or itself.
+                limit = index + 1 if related is model else plan.rows
+                value = unique_value(
+                    plan,
+                    related,
+                    field.target_field,  # type: ignore[attr-defined]
+                    rng.randrange(limit),
+                )
+            else:
+                value = random_value(model, field, rng)
+            row.append(value)
+        rows.append(row)
+    return rows
+
+
+def generate_rows(plan: Plan, label: str, start: int, stop: int) -> list[list[Any]]:
+    return model_rows(plan, apps.get_model(label), start, stop)
+
+
+def init_worker() -> None:  # pragma: no cover
+    import django
+
+    django.setup()
+
+
+def generate(
+    tasks: list[tuple[Plan, str, int, int]], workers: int
+) -> Iterator[list[list[Any]]]:
+    """
+    Generate the rows for each task, in order, in parallel processes when
+    there are several workers. Only a few tasks run ahead of the rows being
+    written, which bounds memory use.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield generate_rows(*task)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+    ) as executor:
+        pending: deque[Future[list[list[Any]]]] = deque()
+        for task in tasks:
+            pending.append(executor.submit(generate_rows, *task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def can_copy(connection: BaseDatabaseWrapper) -> bool:
+    """
+    Whether the connection can COPY Python values: PostgreSQL with psycopg 3.
+    """
+    if connection.vendor != "postgresql":
+        return False
+    # Only importable with psycopg or psycopg2 installed.
+    from django.db.backends.postgresql.psycopg_any import (  # pragma: no cover
+        is_psycopg3,
+    )
+
+    return is_psycopg3  # pragma: no cover
+
+
+def write_rows(
+    connection: BaseDatabaseWrapper, model: type[Model], rows: Iterable[list[Any]]
+) -> None:
+    """
+    Insert rows with the vendor’s fastest bulk method: COPY on PostgreSQL,
+    executemany() on SQLite, and multi-row INSERTs otherwise.
+    """
+    qn = connection.ops.quote_name
+    fields = model._meta.local_concrete_fields
+    values = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+        for row in rows
+    ]
+    table = qn(model._meta.db_table)
+    columns = ", ".join(qn(str(field.column)) for field in fields)
+    placeholders = f"({', '.join('%s' for _ in fields)})"
+    with connection.cursor() as cursor:
+        if can_copy(connection):  # pragma: no cover
+            with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                for row in values:
+                    copy.write_row(row)
+        elif connection.vendor == "sqlite":
+            cursor.executemany(
+                f"INSERT INTO {table} ({columns}) VALUES {placeholders}", values
+            )
+        else:
+            # MySQL, and PostgreSQL with psycopg2, which has no COPY of Python
+            # values.
+            batch_size = max(
+                1,
+                min(INSERT_BATCH_SIZE, connection.ops.bulk_batch_size(fields, values)),
+            )
+            for start in range(0, len(values), batch_size):
+                batch = values[start : start + batch_size]
+                cursor.execute(
+                    f"INSERT INTO {table} ({columns}) VALUES "
+                    + ", ".join(placeholders for _ in batch),
+                    [value for row in batch for value in row],
+                )
+
+
+def analyze(connection: BaseDatabaseWrapper, models: list[type[Model]]) -> None:
+    """
+    Update the planner’s statistics, so query plans reflect the new rows.
+    """
+    qn = connection.ops.quote_name
+    tables = [qn(model._meta.db_table) for model in models]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":  # pragma: no cover
+            cursor.execute(f"ANALYZE {', '.join(tables)}")
+        elif connection.vendor == "mysql":  # pragma: no cover
+            cursor.execute(f"ANALYZE TABLE {', '.join(tables)}")
+        else:
+            cursor.execute("ANALYZE")
+
+
+def seed_database(
+    connection: BaseDatabaseWrapper,
+    rows: int,
+    labels: list[str] | None,
+    seed: int,
+    workers: int,
+    progress: Callable[[str], None],
+) -> list[type[Model]]:
+    """
+    Insert rows into the tables of the given models, and those their foreign
+    keys reach, or all models in the database, in one transaction. Return the
+    seeded models.
+    """
+    if rows < 1:
+        raise CommandError("--seed must be at least 1.")
+    models = dependency_order(foreign_key_closure(select_models(connection, labels)))
+    plan = Plan(
+        rows=rows,
+        seed=seed,
+        offsets={
+            model._meta.label: table_offset(connection, model) for model in models
+        },
+    )
+    # Fail on fields that can’t be generated before inserting anything.
+    for model in models:
+        model_rows(plan, model, 0, 1)
+
+    tasks = [
+        (plan, model._meta.label, start, min(start + CHUNK_SIZE, rows))
+        for model in models
+        for start in range(0, rows, CHUNK_SIZE)
+    ]
+    with (
+        connection.constraint_checks_disabled(),
+        transaction.atomic(using=connection.alias),
+    ):
+        for (_, label, _, stop), chunk in zip(
+            tasks, generate(tasks, workers), strict=True
+        ):
+            model = apps.get_model(label)
+            write_rows(connection, model, chunk)
+            if stop == rows:
+                progress(f"Seeded {rows:,} rows into {model._meta.db_table}.")
+        # Explicit primary keys leave sequences behind on PostgreSQL.
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:  # pragma: no cover
+                cursor.execute(sql)
+    analyze(connection, models)
+    return models
@@ -0,0 +1,324 @@
+"""
+Record slow queries run by the application, for --slow-queries to open.
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+
+from django_harlequin.cache import cache_dir, write_private
+from django_harlequin.sql import fingerprint, interpolate, quote_literal
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "THRESHOLD": 0.5,
+    "MAX_QUERIES": 100,
+    "SAMPLES": 100,
+    "FLUSH_INTERVAL": 60.0,
+    "PATH": None,
+}
+
+
+def get_config() -> dict[str, Any]:
+    return {**DEFAULTS, **getattr(settings, "HARLEQUIN_SLOW_QUERIES", {})}
+
+
+def slow_queries_dir(config: dict[str, Any]) -> Path:
+    if config["PATH"]:
+        return Path(config["PATH"])
+    return cache_dir() / "slow-queries"
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of a non-empty list.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+@dataclass
+class Entry:
+    fingerprint: str
+    sql: str
+    count: int = 0
+    total: float = 0.0
+    samples: deque[float] = field(default_factory=deque)
+
+    def as_dict(self) -> dict[str, Any]:
+        samples = list(self.samples)
+        return {
+            "fingerprint": self.fingerprint,
+            "sql": self.sql,
+            "count": self.count,
+            "total": self.total,
+            "p50": percentile(samples, 0.5),
+            "p95": percentile(samples, 0.95),
+            "samples": samples,
+        }
+
+
+class SlowQueryRecorder:
+    """
+    An execute wrapper that keeps, per database alias, a bounded buffer of
+    queries that took longer than the threshold, deduplicated by fingerprint.
+    When full, the least recently seen fingerprint is dropped. A background
+    thread, started by the first recorded query, merges the buffer into a
+    JSON file per alias every flush interval, and it is merged again at exit,
+    so queries never wait on file I/O.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_queries: int,
+        samples: int,
+        flush_interval: float,
+        directory: Path,
+    ) -> None:
+        self.threshold = threshold
+        self.max_queries = max_queries
+        self.samples = samples
+        self.flush_interval = flush_interval
+        self.directory = directory
+        self.entries: dict[str, OrderedDict[str, Entry]] = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def __call__(
+        self,
+        execute: Callable[..., Any],
+        sql: str,
+        params: Any,
+        many: bool,
+        context: dict[str, Any],
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        except Exception:
+            self.observe(context["connection"], sql, params, many, start)
+            raise
+        self.observe(context["connection"], sql, params, many, start)
+        return result
+
+    def observe(
+        self,
+        connection: BaseDatabaseWrapper,
+        sql: str,
+        params: Any,
+        many: bool,
+        start: float,
+    ) -> None:
+        duration = time.perf_counter() - start
+        if duration < self.threshold:
+            return
+        # A failure to record must not affect the application’s query.
+        try:
+            self.record(connection, sql, params, many, duration)
+        except Exception:
+            logger.exception("Failed to record slow query.")
+
+    def record(
+        self,
+        connection: BaseDatabaseWrapper,
+        sql: str,
+        params: Any,
+        many: bool,
+        duration: float,
+    ) -> None:
+        key = fingerprint(sql)
+        with self.lock:
+            if self.thread is None:
+                self.start()
+            entries = self.entries.setdefault(connection.alias, OrderedDict())
+            entry = entries.get(key)
+            if entry is None:
+                entry = Entry(
+                    key,
+                    example_sql(connection, sql, params, many),
+                    samples=deque(maxlen=self.samples),
+                )
+                entries[key] = entry
+                if len(entries) > self.max_queries:
+                    entries.popitem(last=False)
+            else:
+                entries.move_to_end(key)
+            entry.count += 1
+            entry.total += duration
+            entry.samples.append(duration)
+
+    def start(self) -> None:
+        """
+        Flush every flush interval, from a daemon thread.
+        """
+        self.thread = threading.Thread(
+            target=self.flush_periodically, name="slow-queries", daemon=True
+        )
+        self.thread.start()
+
+    def after_fork(self) -> None:
+        """
+        Reset a forked child, such as a worker of a preforking server. Only
+        the forking thread survives, so the lock may be held by a thread that
+        no longer exists, and the flush thread must be started again. The
+        parent’s entries are left for the parent to write.
+        """
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.entries = {}
+
+    def flush_periodically(self) -> None:
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to write slow queries.")
+
+    def flush(self) -> None:
+        with self.lock:
+            taken, self.entries = self.entries, {}
+        for alias, entries in taken.items():
+            self.merge(alias, entries)
+
+    def merge(self, alias: str, entries: OrderedDict[str, Entry]) -> None:
+        """
+        Merge the entries into the alias’s JSON file, holding a lock on it so
+        other processes, such as other workers of a server, don’t lose theirs.
+        """
+        path = self.directory / f"{alias}.json"
+        with file_lock(path.with_name(f".{path.name}.lock")):
+            merged = {e["fingerprint"]: e for e in load_slow_queries(path)}
+            for entry in entries.values():
+                previous = merged.get(entry.fingerprint)
+                if previous is not None:
+                    entry.count += previous["count"]
+                    entry.total += previous["total"]
+                    entry.samples = deque(
+                        [*previous["samples"], *entry.samples], maxlen=self.samples
+                    )
+                merged[entry.fingerprint] = entry.as_dict()
+            ranked = sorted(merged.values(), key=lambda e: e["total"], reverse=True)
+            write_private(path, json.dumps(ranked[: self.max_queries], indent=2))
+
+    def connection_created(
+        self, sender: Any, connection: BaseDatabaseWrapper, **kwargs: Any
+    ) -> None:
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive lock on the file, where the platform supports it.
+    """
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if sys.platform != "win32":  # pragma: no branch
+            import fcntl
+
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing releases the lock.
+        os.close(fd)
+
+
+def example_sql(
+    connection: BaseDatabaseWrapper, sql: str, params: Any, many: bool
+) -> str:
+    """
+    The query with its first set of parameters filled in, falling back to the
+    bare query if they can’t be.
+    """
+    if many:
+        params = next(iter(params), None)
+    if params is None:
+        return sql
+    try:
+        if isinstance(params, dict):
+            return sql % {
+                name: quote_literal(value, connection.vendor)
+                for name, value in params.items()
+            }
+        return interpolate(sql, params, connection.vendor)
+    except (TypeError, ValueError, KeyError):
+        return sql
+
+
+def install() -> SlowQueryRecorder:
+    """
+    Record slow queries on every database connection, configured by the
+    HARLEQUIN_SLOW_QUERIES setting.
+    """
+    config = get_config()
+    recorder = SlowQueryRecorder(
+        threshold=config["THRESHOLD"],
+        max_queries=config["MAX_QUERIES"],
+        samples=config["SAMPLES"],
+        flush_interval=config["FLUSH_INTERVAL"],
+        directory=slow_queries_dir(config),
+    )
+    connection_created.connect(recorder.connection_created, weak=False)
+    # Connections opened before installation.
+    for connection in connections.all(initialized_only=True):
+        recorder.connection_created(sender=None, connection=connection)
+    # The flush thread starts with the first recorded query, so it runs in the
+    # process that records it, even when installed before forking workers.
+    if sys.platform != "win32":  # pragma: no branch
+        os.register_at_fork(after_in_child=recorder.after_fork)
+    atexit.register(recorder.flush)
+    return recorder
+
+
+def load_slow_queries(path: Path) -> list[dict[str, Any]]:
+    try:
+        data: list[dict[str, Any]] = json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return []
+    return data
+
+
+def write_slow_queries(
+    entries: list[dict[str, Any]], directory: Path, connection: BaseDatabaseWrapper
+) -> None:
+    """
+    Write one SQL file per query, named so the file tree lists them by total
+    time, highest first.
+    """
+    for number, entry in enumerate(entries, start=1):
+        lines = [
+            f"-- Recorded on database {connection.alias!r}.",
+            f"-- Count: {entry['count']:,}",
+            f"-- Total: {entry['total'] * 1000:,.1f}ms",
+            f"-- p50: {entry['p50'] * 1000:,.1f}ms",
+            f"-- p95: {entry['p95'] * 1000:,.1f}ms",
+            f"-- Fingerprint: {entry['fingerprint']}",
+            "",
+            f"{entry['sql']};",
+            "",
+        ]
+        (directory / f"{number:02d}.sql").write_text("\n".join(lines))
@@ -0,0 +1,252 @@
+"""
+Query snippets for each model that page and look up rows through indexes,
+so browsing a large table doesn’t mean OFFSET scans.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Field, ForeignKey, Model
+
+from django_harlequin.catalog import database_models, model_indexes
+from django_harlequin.sql import quote_literal
+
+PAGE_SIZE = 100
+
+# Placeholder values, by internal field type, for the values to replace in
+# snippets. Other types use an empty string.
+EXAMPLE_VALUES: dict[str, Any] = {
+    "AutoField": 0,
+    "BigAutoField": 0,
+    "BigIntegerField": 0,
+    "BooleanField": False,
+    "DateField": dt.date(2000, 1, 1),
+    "DateTimeField": dt.datetime(2000, 1, 1),
+    "DecimalField": Decimal(0),
+    "DurationField": dt.timedelta(0),
+    "FloatField": 0.0,
+    "IntegerField": 0,
+    "PositiveBigIntegerField": 0,
+    "PositiveIntegerField": 0,
+    "PositiveSmallIntegerField": 0,
+    "SmallAutoField": 0,
+    "SmallIntegerField": 0,
+    "TimeField": dt.time(0),
+    "UUIDField": UUID(int=0),
+}
+
+
+def example_value(field: Field[Any, Any], connection: BaseDatabaseWrapper) -> str:
+    """
+    An SQL literal of the field’s type, in the form the database stores it,
+    such as a hex string for UUIDs on SQLite.
+    """
+    while isinstance(field, ForeignKey):
+        field = field.target_field
+    value = EXAMPLE_VALUES.get(field.get_internal_type(), "")
+    if isinstance(value, dt.datetime) and settings.USE_TZ:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return quote_literal(field.get_db_prep_value(value, connection), connection.vendor)
+
+
+def column_indexes(model: type[Model]) -> list[dict[str, Any]]:
+    """
+    The model’s indexes on columns. Expression indexes, such as on
+    Lower("name"), can’t be looked up through by column values.
+    """
+    return [index for index in model_indexes(model) if not index["expressions"]]
+
+
+def ordering_fields(model: type[Model]) -> list[tuple[Field[Any, Any], bool]] | None:
+    """
+    The fields of the model’s Meta.ordering, with whether each is descending,
+    then the primary key to make the order unique. None if the ordering
+    isn’t plain non-null local fields that an index starts with.
+    """
+    opts = model._meta
+    fields: list[tuple[Field[Any, Any], bool]] = []
+    for name in opts.ordering or ():
+        if not isinstance(name, str) or name == "?" or "__" in name:
+            return None
+        field_name = name.removeprefix("-")
+        field = opts.pk if field_name == "pk" else opts.get_field(field_name)
+        # Ordering by a relation follows the related model’s ordering, unless
+        # it names the column.
+        if (
+            not isinstance(field, Field)
+            or field.null
+            or (field.is_relation and field_name != field.attname)
+        ):
+            return None
+        fields.append((field, name.startswith("-")))
+    if not fields:
+        return None
+    columns = [str(field.column) for field, _ in fields]
+    if not any(
+        index["columns"][: len(columns)] == columns for index in column_indexes(model)
+    ):
+        return None
+    descending = fields[-1][1]
+    ordered = [field for field, _ in fields]
+    for field in opts.pk_fields:
+        if field not in ordered:
+            fields.append((field, descending))
+    return fields
+
+
+def keyset_sql(
+    connection: BaseDatabaseWrapper,
+    table: str,
+    fields: list[tuple[Field[Any, Any], bool]],
+) -> tuple[str, str]:
+    """
+    SQL for the first page of rows in the given order, and for the page after
+    a row, comparing the order’s columns to that row’s values so an index
+    seeks straight to it.
+    """
+    qn = connection.ops.quote_name
+    columns = [qn(str(field.column)) for field, _ in fields]
+    values = [example_value(field, connection) for field, _ in fields]
+    operators = ["<" if descending else ">" for _, descending in fields]
+    order_by = ", ".join(
+        f"{column} DESC" if descending else column
+        for column, (_, descending) in zip(columns, fields)
+    )
+
+    if len(set(operators)) == 1:
+        if len(columns) == 1:
+            condition = f"{columns[0]} {operators[0]} {values[0]}"
+        else:
+            condition = f"({', '.join(columns)}) {operators[0]} ({', '.join(values)})"
+    else:
+        # Row value comparisons can’t mix directions, so expand them.
+        terms = []
+        for number in range(len(columns)):
+            parts = [f"{columns[i]} = {values[i]}" for i in range(number)]
+            parts.append(f"{columns[number]} {operators[number]} {values[number]}")
+            terms.append("(" + " AND ".join(parts) + ")")
+        condition = " OR ".join(terms)
+
+    first = f"SELECT * FROM {qn(table)}\nORDER BY {order_by}\nLIMIT {PAGE_SIZE};"
+    after = (
+        f"SELECT * FROM {qn(table)}\nWHERE {condition}\n"
+        + f"ORDER BY {order_by}\nLIMIT {PAGE_SIZE};"
+    )
+    return first, after
+
+
+def model_snippets(model: type[Model], connection: BaseDatabaseWrapper) -> str:
+    qn = connection.ops.quote_name
+    opts = model._meta
+    table = opts.db_table
+    indexes = column_indexes(model)
+    lines = [f"-- {opts.label}", f"-- Table: {table}"]
+
+    def keyset(title: str, fields: list[tuple[Field[Any, Any], bool]]) -> None:
+        first, after = keyset_sql(connection, table, fields)
+        lines.extend(
+            [
+                "",
+                f"-- {title}: first page.",
+                first,
+                "",
+                f"-- {title}: next page, after the last row of the previous "
+                + "page. Replace the values with that row’s.",
+                after,
+            ]
+        )
+
+    keyset("Keyset pagination by primary key", [(f, False) for f in opts.pk_fields])
+    ordering = ordering_fields(model)
+    if ordering is not None:
+        keyset("Keyset pagination by Meta.ordering", ordering)
+
+    seen = set()
+    for index in indexes:
+        columns = index["columns"]
+        if tuple(columns) in seen:
+            continue
+        seen.add(tuple(columns))
+        condition = " AND ".join(
+            f"{qn(column)} = {example_value(field, connection)}"
+            for column in columns
+            for field in opts.local_concrete_fields
+            if field.column == column
+        )
+        lines += ["", f"-- Lookup through the index on ({', '.join(columns)})"]
+        if index["unique"]:
+            lines[-1] += ", which is unique."
+            lines.append(f"SELECT * FROM {qn(table)}\nWHERE {condition};")
+        else:
+            lines[-1] += "."
+            lines.append(
+                f"SELECT * FROM {qn(table)}\nWHERE {condition}\nLIMIT {PAGE_SIZE};"
+            )
+
+    pk_order = ", ".join(
+        f"{qn(table)}.{qn(str(field.column))}" for field in opts.pk_fields
+    )
+    for field in opts.local_concrete_fields:
+        if not isinstance(field, ForeignKey):
+            continue
+        related = field.related_model._meta
+        target = field.target_field
+        on = (
+            f"{qn(related.db_table)}.{qn(str(target.column))} = "
+            + f"{qn(table)}.{qn(str(field.column))}"
+        )
+        lines += [
+            "",
+            f"-- Join {related.label} through {field.name}, on its indexed "
+            + f"{target.column} column.",
+            f"SELECT * FROM {qn(table)}\nJOIN {qn(related.db_table)} ON {on}\n"
+            + f"ORDER BY {pk_order}\nLIMIT {PAGE_SIZE};",
+        ]
+
+    # Joins to the rows referencing one row seek through the referencing
+    # table’s index on its foreign key, if it has one.
+    for relation in opts.related_objects:
+        remote = relation.field
+        if not isinstance(remote, ForeignKey):
+            continue
+        child = remote.model._meta
+        column = str(remote.column)
+        if not any(
+            index["columns"][0] == column for index in column_indexes(remote.model)
+        ):
+            continue
+        target_column = str(remote.target_field.column)
+        child_order = ", ".join(
+            f"{qn(child.db_table)}.{qn(str(field.column))}" for field in child.pk_fields
+        )
+        lines += [
+            "",
+            f"-- {child.label} rows referencing one row, joined through the "
+            + f"index on {child.db_table}.{column}.",
+            f"SELECT {qn(child.db_table)}.* FROM {qn(table)}\n"
+            + f"JOIN {qn(child.db_table)} ON "
+            + f"{qn(child.db_table)}.{qn(column)} = "
+            + f"{qn(table)}.{qn(target_column)}\n"
+            + f"WHERE {qn(table)}.{qn(target_column)} = "
+            + f"{example_value(remote.target_field, connection)}\n"
+            + f"ORDER BY {child_order}\nLIMIT {PAGE_SIZE};",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def write_snippets(directory: Path, connection: BaseDatabaseWrapper) -> None:
+    """
+    Write the snippets for each model in the database, one SQL file per
+    table, grouped by app like the catalog.
+    """
+    for model in database_models(connection):
+        path = directory / model._meta.app_label / f"{model._meta.db_table}.sql"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(model_snippets(model, connection))
@@ -0,0 +1,138 @@
+"""
+Run Harlequin as a resource-limited child process, for shared hosts where a
+large result set mustn’t starve other processes.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+from django.core.management.base import CommandError
+
+SIZE_RE = re.compile(r"^\s*(\d+)\s*(B|kB|MB|GB|TB)?\s*$")
+SIZE_UNITS = {
+    "B": 1,
+    "kB": 1024,
+    "MB": 1024**2,
+    "GB": 1024**3,
+    "TB": 1024**4,
+}
+
+
+@dataclass
+class Limits:
+    memory: int | None = None
+    cpu: int | None = None
+    nice: int | None = None
+    ionice: int | None = None
+    cgroup_memory: int | None = None
+
+    def __bool__(self) -> bool:
+        return any(value is not None for value in vars(self).values())
+
+
+@dataclass
+class Usage:
+    returncode: int
+    peak_rss: int
+    wall_time: float
+
+
+def parse_size(value: str) -> int:
+    """
+    Parse a size in bytes, in PostgreSQL’s format, where numbers without a
+    unit are bytes.
+    """
+    match = SIZE_RE.match(value)
+    if match is None:
+        raise CommandError(f"Invalid size {value!r}.")
+    number, unit = match.groups()
+    return int(number) * SIZE_UNITS[unit or "B"]
+
+
+def format_size(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "kB", "MB", "GB"):
+        if value < 1024:
+            return f"{value:,.1f}{unit}"
+        value /= 1024
+    return f"{value:,.1f}TB"
+
+
+def wrap_command(command: list[str], limits: Limits) -> list[str]:
+    """
+    Prefix the command with the tools that apply the limits to it: systemd-run
+    for a cgroup memory cap, ionice for an I/O priority, prlimit for resource
+    limits, and nice for a CPU priority. Each applies its limit in a process
+    of its own, before executing the next, rather than in a preexec_fn, which
+    isn’t safe in the forked child of a process with threads.
+    """
+    prefix: list[str] = []
+    if limits.cgroup_memory is not None:
+        if shutil.which("systemd-run") is None:
+            raise CommandError("--cgroup-memory-max requires systemd-run.")
+        prefix += [
+            "systemd-run",
+            "--user",
+            "--scope",
+            "--quiet",
+            "--property",
+            f"MemoryMax={limits.cgroup_memory}",
+            "--property",
+            "MemorySwapMax=0",
+            "--",
+        ]
+    if limits.ionice is not None:
+        if shutil.which("ionice") is None:
+            raise CommandError("--ionice requires ionice.")
+        # The best-effort class, with priority levels from 0 (highest) to 7.
+        prefix += ["ionice", "--class", "2", "--classdata", str(limits.ionice)]
+    if limits.memory is not None or limits.cpu is not None:
+        if shutil.which("prlimit") is None:
+            raise CommandError("--memory-limit and --cpu-limit require prlimit.")
+        # Setting both the soft and hard limits.
+        prefix.append("prlimit")
+        if limits.memory is not None:
+            prefix.append(f"--as={limits.memory}")
+        if limits.cpu is not None:
+            prefix.append(f"--cpu={limits.cpu}")
+        prefix.append("--")
+    if limits.nice is not None:
+        if shutil.which("nice") is None:
+            raise CommandError("--nice requires nice.")
+        prefix += ["nice", "-n", str(limits.nice)]
+    return prefix + command
+
+
+def run(command: list[str], env: dict[str, str], limits: Limits) -> Usage:
+    """
+    Run the command as a child process with the limits, and wait for it,
+    measuring its peak resident set size and wall time.
+    """
+    start = time.monotonic()
+    try:
+        process = subprocess.Popen(wrap_command(command, limits), env=env)
+    except OSError as exc:
+        raise CommandError(f"Cannot run {command[0]!r}: {exc}")
+    # Keystrokes reach Harlequin, not this process, but a Ctrl-C sent to the
+    # process group shouldn’t leave Harlequin running without its parent.
+    previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+    wall_time = time.monotonic() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS.
+    peak_rss = rusage.ru_maxrss
+    if sys.platform != "darwin":  # pragma: no branch
+        peak_rss *= 1024
+    return Usage(process.returncode, peak_rss, wall_time)
@@ -0,0 +1,87 @@
+"""
+SQL text helpers shared by the options that write SQL for Harlequin.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import re
+from collections.abc import Sequence
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+VALUE_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def quote_literal(value: Any, vendor: str) -> str:
+    """
+    Render a query parameter as an SQL literal for the given vendor.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        if vendor == "sqlite":
+            return "1" if value else "0"
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        hex_value = bytes(value).hex()
+        if vendor == "postgresql":
+            return f"'\\x{hex_value}'::bytea"
+        return f"X'{hex_value}'"
+    if isinstance(value, (list, tuple)):
+        items = ", ".join(quote_literal(item, vendor) for item in value)
+        if vendor == "postgresql":
+            return f"ARRAY[{items}]"
+        return f"({items})"
+    if isinstance(value, dt.datetime):
+        value = value.isoformat(sep=" ")
+    elif isinstance(value, (dt.date, dt.time)):
+        value = value.isoformat()
+    elif isinstance(value, UUID):
+        value = str(value)
+    elif isinstance(value, dict) or hasattr(value, "obj"):
+        # JSON, or a database driver’s JSON adapter wrapping it.
+        value = json.dumps(getattr(value, "obj", value))
+    value = str(value).replace("'", "''")
+    if vendor == "mysql":
+        # MySQL treats backslashes as escape characters by default.
+        value = value.replace("\\", "\\\\")
+    return f"'{value}'"
+
+
+def interpolate(sql: str, params: Sequence[Any], vendor: str) -> str:
+    """
+    Fill the %s placeholders of a Django-compiled query with literals.
+    """
+    return sql % tuple(quote_literal(param, vendor) for param in params)
+
+
+def explain(sql: str, vendor: str) -> str:
+    """
+    Wrap a query in the vendor’s most informative EXPLAIN.
+    """
+    if vendor == "postgresql":
+        return f"EXPLAIN (ANALYZE, BUFFERS) {sql}"
+    elif vendor == "mysql":
+        return f"EXPLAIN FORMAT=JSON {sql}"
+    else:
+        return f"EXPLAIN QUERY PLAN {sql}"
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Normalize a query so executions that differ only in their values compare
+    equal: literals and placeholders become ?, lists of them (...), and
+    whitespace is collapsed.
+    """
+    sql = STRING_RE.sub("?", sql)
+    sql = NUMBER_RE.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = VALUE_LIST_RE.sub("(...)", sql)
+    return " ".join(sql.split())
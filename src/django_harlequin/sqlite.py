@@ -0,0 +1,89 @@
+"""
+Ways to open a busy SQLite database without competing with its writers.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from django_harlequin.cache import cache_dir, write_private
+
+# Pages copied per step of a snapshot, between which writers can proceed.
+SNAPSHOT_PAGES = 1024
+
+# Large enough to map most databases whole. SQLite caps it at its compile-time
+# SQLITE_MAX_MMAP_SIZE, 2GB by default.
+MMAP_SIZE = 2**30
+
+
+def snapshot(
+    connection: BaseDatabaseWrapper,
+    progress: Callable[[int, int], None] | None = None,
+) -> Path:
+    """
+    Copy the database with SQLite’s online backup API, a few pages at a time,
+    and return the path of the copy. progress is called after each step with
+    the number of pages remaining and the total.
+    """
+    directory = cache_dir() / "snapshots"
+    directory.mkdir(mode=0o700, exist_ok=True)
+    path = directory / f"{connection.alias}.sqlite3"
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{connection.alias}.")
+    os.close(fd)
+    try:
+        connection.ensure_connection()
+        target = sqlite3.connect(tmp)
+        try:
+            connection.connection.backup(
+                target,
+                pages=SNAPSHOT_PAGES,
+                # Without pausing between steps, so writes from other
+                # connections, which restart the copy, have less time to.
+                sleep=0,
+                progress=(
+                    None
+                    if progress is None
+                    else lambda status, remaining, total: progress(remaining, total)
+                ),
+            )
+        finally:
+            target.close()
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def read_only_uri(name: str) -> str:
+    """
+    A URI to open a database file read-only. In-memory databases and URIs
+    are returned unchanged.
+    """
+    if name == ":memory:" or name.startswith("file:"):
+        return name
+    return f"{Path(name).resolve().as_uri()}?mode=ro"
+
+
+def mmap_init_script() -> Path:
+    """
+    An init script for Harlequin that memory-maps the database, so reads avoid
+    copying pages through SQLite’s cache. It replaces Harlequin’s default of
+    ~/.sqliterc, so includes that file’s statements after its own.
+    """
+    script = f"PRAGMA mmap_size = {MMAP_SIZE};\n"
+    try:
+        rc = (Path.home() / ".sqliterc").read_text()
+    except OSError:
+        rc = ""
+    if rc:
+        script += "\n" + rc.rstrip("\n") + "\n"
+    path = cache_dir() / "sqlite" / "mmap.sql"
+    write_private(path, script)
+    return path
@@ -0,0 +1,160 @@
+"""
+The heaviest statements from the database’s own statistics, pg_stat_statements
+on PostgreSQL or performance_schema on MySQL, attributed to Django models.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.core.management.base import CommandError
+from django.db import DatabaseError
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from django_harlequin.catalog import database_models
+
+# Statement statistics queries, normalized to the same columns, with
+# placeholders for the ORDER BY column and limit.
+STATEMENT_QUERIES = {
+    "postgresql": """
+        SELECT
+            query,
+            calls,
+            total_exec_time AS total_ms,
+            mean_exec_time AS mean_ms,
+            rows AS row_count,
+            shared_blks_read + shared_blks_written
+                + temp_blks_read + temp_blks_written AS io
+        FROM pg_stat_statements
+        WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+        ORDER BY {order} DESC
+        LIMIT %s
+    """,
+    "mysql": """
+        SELECT
+            digest_text AS query,
+            count_star AS calls,
+            sum_timer_wait / 1000000000 AS total_ms,
+            avg_timer_wait / 1000000000 AS mean_ms,
+            sum_rows_sent + sum_rows_affected AS row_count,
+            sum_rows_examined AS io
+        FROM performance_schema.events_statements_summary_by_digest
+        WHERE schema_name = DATABASE() AND digest_text IS NOT NULL
+        ORDER BY {order} DESC
+        LIMIT %s
+    """,
+}
+
+# Rankings, with their directory, description, and ORDER BY column.
+RANKINGS = {
+    "time": ("by-time", "total time", "total_ms"),
+    "io": ("by-io", "I/O", "io"),
+    "rows": ("by-rows", "rows", "row_count"),
+}
+
+# What the io column counts, per vendor.
+IO_LABELS = {
+    "postgresql": "Blocks read or written",
+    "mysql": "Rows examined",
+}
+
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][\w$]*")
+
+
+@dataclass
+class Statement:
+    query: str
+    calls: int
+    total_ms: float
+    mean_ms: float
+    rows: int
+    io: int
+
+
+def top_statements(
+    connection: BaseDatabaseWrapper, limit: int
+) -> dict[str, list[Statement]]:
+    """
+    The top statements for each ranking, heaviest first.
+    """
+    if connection.vendor not in STATEMENT_QUERIES:
+        raise CommandError(
+            "--top-statements requires PostgreSQL or MySQL, not "
+            + f"{connection.display_name}."
+        )
+    result = {}
+    try:
+        with connection.cursor() as cursor:
+            for ranking, (_, _, order) in RANKINGS.items():
+                cursor.execute(
+                    STATEMENT_QUERIES[connection.vendor].format(order=order), [limit]
+                )
+                result[ranking] = [
+                    Statement(
+                        str(query),
+                        int(calls),
+                        float(total_ms),
+                        float(mean_ms),
+                        int(rows),
+                        int(io),
+                    )
+                    for query, calls, total_ms, mean_ms, rows, io in cursor.fetchall()
+                ]
+    except DatabaseError as exc:
+        # pg_stat_statements must be installed and preloaded, and
+        # performance_schema enabled, with privileges to read them.
+        raise CommandError(
+            "Cannot read statement statistics for database "
+            + f"{connection.alias!r}: {exc}"
+        )
+    return result
+
+
+def statement_models(query: str, tables: dict[str, str]) -> list[str]:
+    """
+    The labels of the models whose tables a statement mentions, in order of
+    first mention. Unquoted identifiers are case-insensitive, so tables are
+    keyed in lowercase.
+    """
+    labels: list[str] = []
+    for identifier in IDENTIFIER_RE.findall(query):
+        label = tables.get(identifier.lower())
+        if label is not None and label not in labels:
+            labels.append(label)
+    return labels
+
+
+def write_top_statements(
+    statements: dict[str, list[Statement]],
+    directory: Path,
+    connection: BaseDatabaseWrapper,
+) -> None:
+    """
+    Write one directory per ranking, with one SQL file per statement named so
+    the file tree lists them in rank order.
+    """
+    tables = {
+        str(model._meta.db_table).lower(): model._meta.label
+        for model in database_models(connection)
+    }
+    for ranking, (name, description, _) in RANKINGS.items():
+        ranking_dir = directory / name
+        ranking_dir.mkdir()
+        for number, statement in enumerate(statements[ranking], start=1):
+            models = statement_models(statement.query, tables)
+            lines = [
+                f"-- Rank {number} by {description} on database "
+                + f"{connection.alias!r}.",
+                f"-- Models: {', '.join(models) if models else 'none found'}",
+                f"-- Calls: {statement.calls:,}",
+                f"-- Total time: {statement.total_ms:,.1f}ms",
+                f"-- Mean time: {statement.mean_ms:,.1f}ms",
+                f"-- Rows: {statement.rows:,}",
+                f"-- {IO_LABELS[connection.vendor]}: {statement.io:,}",
+                "",
+                f"{statement.query.strip().rstrip(';')};",
+                "",
+            ]
+            (ranking_dir / f"{number:02d}.sql").write_text("\n".join(lines))
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+from django_harlequin.cache import cache_dir
+
+
+class Workspace:
+    """
+    A directory of generated files for one database alias, shown in
+    Harlequin’s file tree with --show-files.
+    """
+
+    def __init__(self, database: str) -> None:
+        self.root = cache_dir() / "workspaces" / database
+        self.used = False
+
+    def section(self, name: str) -> Path:
+        """
+        Return an empty directory for one kind of generated file. The whole
+        workspace is cleared the first time it is used in a launch, so files
+        from previous launches don’t linger.
+        """
+        if not self.used:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root.mkdir(mode=0o700, parents=True)
+            self.used = True
+        path = self.root / name
+        shutil.rmtree(path, ignore_errors=True)
+        path.mkdir(mode=0o700, parents=True)
+        return path
+
+    def extend_command(self, command: list[str]) -> None:
+        if self.used:
+            command += ["--show-files", str(self.root)]
@@ -10,10 +10,13 @@ DATABASES = {
     },
 }
 
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+
 TIME_ZONE = "UTC"
 
 INSTALLED_APPS = [
     "django_harlequin",
+    "tests.testapp",
 ]
 
 USE_TZ = True
@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from django.db import connection, models
+from django.db.models.functions import Lower, Upper
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import isolate_apps
+
+from django_harlequin import advisor
+from django_harlequin.advisor import Finding
+from tests.testapp.models import Author, Book, Tag
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+BookTags = Book.tags.through
+
+
+def index(
+    *columns: str | None,
+    unique: bool = False,
+    primary_key: bool = False,
+    type: str = "idx",
+) -> dict[str, Any]:
+    return {
+        "columns": list(columns),
+        "unique": unique,
+        "primary_key": primary_key,
+        "index": not (unique or primary_key),
+        "type": type,
+    }
+
+
+class LiveIndexesTests(TestCase):
+    def test_indexes(self):
+        indexes = advisor.live_indexes(connection, ["testapp_author", "missing"])
+
+        assert list(indexes) == ["testapp_author"]
+        assert sorted(
+            info["columns"] for info in indexes["testapp_author"].values()
+        ) == [
+            ["email"],
+            ["id"],
+            ["name"],
+        ]
+
+    def test_statistics_unsupported(self):
+        assert advisor.index_scans(connection) is None
+        assert advisor.seq_scan_rows(connection) == {}
+
+
+class AdviseTests(TestCase):
+    def test_advise(self):
+        assert advisor.advise(connection) == []
+
+    def test_advise_with_scans(self):
+        indexes = advisor.live_indexes(connection, ["testapp_author"])
+        (email_index,) = [
+            name
+            for name, info in indexes["testapp_author"].items()
+            if info["columns"] == ["email"]
+        ]
+
+        with mock.patch.object(
+            advisor,
+            "index_scans",
+            return_value={("testapp_author", email_index): 0},
+        ):
+            findings = advisor.advise(connection)
+
+        assert [finding.kind for finding in findings] == ["unused"]
+
+
+class DropIndexSqlTests(SimpleTestCase):
+    def test_postgresql(self):
+        with mock.patch.object(connection, "vendor", "postgresql"):
+            sql = advisor.drop_index_sql(connection, "t", "i")
+
+        assert sql == 'DROP INDEX CONCURRENTLY "i";'
+
+    def test_mysql(self):
+        with mock.patch.object(connection, "vendor", "mysql"):
+            sql = advisor.drop_index_sql(connection, "t", "i")
+
+        assert sql == 'DROP INDEX "i" ON "t";'
+
+    def test_sqlite(self):
+        assert advisor.drop_index_sql(connection, "t", "i") == 'DROP INDEX "i";'
+
+
+class FindUnusedTests(SimpleTestCase):
+    def test_unused(self):
+        indexes = {
+            "testapp_author": {
+                "pk": index("id", primary_key=True),
+                "name_uniq": index("name", unique=True),
+                "email_idx": index("email"),
+                "uuid_idx": index("uuid"),
+                "used_idx": index("name", "email"),
+            },
+            "testapp_book_tags": {"tag_idx": index("tag_id")},
+        }
+        scans = {
+            ("testapp_author", "pk"): 0,
+            ("testapp_author", "name_uniq"): 0,
+            ("testapp_author", "email_idx"): 0,
+            ("testapp_author", "uuid_idx"): 0,
+            ("testapp_author", "used_idx"): 5,
+            ("testapp_book_tags", "tag_idx"): 0,
+        }
+
+        findings = advisor.find_unused(
+            connection,
+            {"testapp_author": Author, "testapp_book_tags": BookTags},
+            indexes,
+            scans,
+        )
+
+        assert findings == [
+            Finding(
+                "unused",
+                "testapp_author",
+                "testapp.Author",
+                "email_idx (email) has no scans. Declared by testapp.Author.",
+                "Remove it from testapp.Author and make a migration.",
+            ),
+            Finding(
+                "unused",
+                "testapp_author",
+                "testapp.Author",
+                "uuid_idx (uuid) has no scans.",
+                'DROP INDEX "uuid_idx";',
+            ),
+            Finding(
+                "unused",
+                "testapp_book_tags",
+                "testapp.Book_tags",
+                "tag_idx (tag_id) has no scans. Created for the many-to-many "
+                + "table testapp.Book_tags.",
+                "Use a custom through model to control its indexes.",
+            ),
+        ]
+
+
+class FindDuplicatesTests(SimpleTestCase):
+    def test_duplicates(self):
+        indexes = {
+            "testapp_author": {
+                "name_uniq": index("name", unique=True),
+                "name_idx": index("name"),
+                "email_a": index("email"),
+                "email_b": index("email"),
+                "email_gin": index("email", "uuid", type="gin"),
+                "uuid_idx": index("uuid"),
+                "lower_name": index(None),
+                "lower_name_email": index(None, "email"),
+            },
+            "testapp_book_tags": {
+                "book_idx": index("book_id"),
+                "pair_uniq": index("book_id", "tag_id", unique=True),
+            },
+        }
+
+        findings = advisor.find_duplicates(
+            connection,
+            {"testapp_author": Author, "testapp_book_tags": BookTags},
+            indexes,
+        )
+
+        assert findings == [
+            Finding(
+                "duplicate",
+                "testapp_author",
+                "testapp.Author",
+                "email_b (email) is covered by email_a (email). "
+                + "Declared by testapp.Author.",
+                "Remove it from testapp.Author and make a migration.",
+            ),
+            Finding(
+                "duplicate",
+                "testapp_author",
+                "testapp.Author",
+                "name_idx (name) is covered by name_uniq (name).",
+                'DROP INDEX "name_idx";',
+            ),
+        ]
+
+
+class FindUnindexedForeignKeysTests(SimpleTestCase):
+    @isolate_apps("tests.testapp")
+    def test_unindexed(self):
+        class Review(models.Model):
+            book: models.ForeignKey[Book] = models.ForeignKey(
+                Book, on_delete=models.CASCADE, db_index=False
+            )
+            author: models.ForeignKey[Author] = models.ForeignKey(
+                Author, on_delete=models.CASCADE
+            )
+            tag: models.ForeignKey[Tag] = models.ForeignKey(
+                Tag, on_delete=models.CASCADE, db_index=False
+            )
+
+            class Meta:
+                app_label = "testapp"
+
+        findings = advisor.find_unindexed_foreign_keys(
+            connection,
+            {"testapp_review": Review, "testapp_book": Book},
+            {"testapp_review": {"tag_book": index("tag_id", "book_id")}},
+        )
+
+        assert findings == [
+            Finding(
+                "unindexed-foreign-key",
+                "testapp_review",
+                "testapp.Review",
+                "testapp.Review.book (book_id) is not indexed.",
+                "Add db_index=True to testapp.Review.book, or an index on "
+                + '("book_id").',
+            ),
+        ]
+
+
+class FindSeqScansTests(SimpleTestCase):
+    def test_seq_scans(self):
+        findings = advisor.find_seq_scans(
+            {"testapp_book": Book},
+            {"testapp_book": 2_000_000, "legacy": 3_000_000, "testapp_tag": 10},
+        )
+
+        assert findings == [
+            Finding(
+                "seq-scan",
+                "legacy",
+                None,
+                "legacy had 3,000,000 rows read by sequential scans.",
+            ),
+            Finding(
+                "seq-scan",
+                "testapp_book",
+                "testapp.Book",
+                "testapp_book had 2,000,000 rows read by sequential scans.",
+            ),
+        ]
+
+
+class FindMissingTests(SimpleTestCase):
+    @isolate_apps("tests.testapp")
+    def test_expressions(self):
+        class Thing(models.Model):
+            name: models.CharField[str, str] = models.CharField(max_length=50)
+
+            class Meta:
+                app_label = "testapp"
+                indexes = [
+                    models.Index(Lower("name"), name="thing_lower_name"),
+                    models.Index(Upper("name"), name="thing_upper_name"),
+                ]
+
+        findings = advisor.find_missing(
+            {"testapp_thing": Thing},
+            {
+                "testapp_thing": {
+                    "pk": index("id", primary_key=True),
+                    "thing_lower_name": index(None),
+                }
+            },
+        )
+
+        assert findings == [
+            Finding(
+                "missing",
+                "testapp_thing",
+                "testapp.Thing",
+                "thing_upper_name (expressions) is missing.",
+                "Check for unapplied migrations with: ./manage.py showmigrations",
+            )
+        ]
+
+    def test_missing(self):
+        findings = advisor.find_missing(
+            {"testapp_author": Author, "testapp_tag": Tag},
+            {
+                "testapp_author": {
+                    "pk": index("id", primary_key=True),
+                    "name_uniq": index("name", unique=True),
+                }
+            },
+        )
+
+        fix = "Check for unapplied migrations with: ./manage.py showmigrations"
+        assert findings == [
+            Finding(
+                "missing",
+                "testapp_author",
+                "testapp.Author",
+                "index (email) is missing.",
+                fix,
+            ),
+            Finding(
+                "missing",
+                "testapp_tag",
+                "testapp.Tag",
+                "index (id) is missing, as is the table.",
+                fix,
+            ),
+        ]
+
+
+class WriteAdviceTests(SimpleTestCase):
+    def test_write(self):
+        findings = [
+            Finding("unused", "t", "app.Model", "i (a) has no scans.", "DROP;"),
+            Finding("seq-scan", "legacy", None, "legacy had 1 rows."),
+        ]
+
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            mock.patch.object(connection, "vendor", "postgresql"),
+        ):
+            advisor.write_advice(findings, Path(tmpdir), connection)
+            unused = (Path(tmpdir) / "unused-indexes.sql").read_text()
+            scans = (Path(tmpdir) / "sequential-scans.sql").read_text()
+            missing = (Path(tmpdir) / "missing-indexes.sql").read_text()
+
+        assert unused.startswith(
+            "-- Indexes never scanned since statistics were last reset."
+        )
+        assert "-- app.Model: i (a) has no scans.\n--   Fix: DROP;\n" in unused
+        assert "FROM pg_stat_user_indexes" in unused
+        assert "-- legacy: legacy had 1 rows.\n" in scans
+        assert "FROM pg_stat_user_tables" in scans
+        assert missing == (
+            "-- Indexes declared by models but missing from the database, from "
+            + "unapplied migrations or schema drift.\n"
+            + "-- Database: 'default'.\n"
+            + "\n"
+            + "-- Nothing found.\n"
+        )
+
+
+class IndexAdvisorCommandTests(TestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_index_advisor(self):
+        _, err, _ = call_command("--index-advisor")
+
+        assert err == "Index advisor found 0 issues.\n"
+        root = self.cache_dir / "workspaces" / "default"
+        assert sorted(path.name for path in (root / "advisor").iterdir()) == [
+            "duplicate-indexes.sql",
+            "missing-indexes.sql",
+            "sequential-scans.sql",
+            "unindexed-foreign-keys.sql",
+            "unused-indexes.sql",
+        ]
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[-2:] == ["--show-files", str(root)]
+
+    def test_index_advisor_one_issue(self):
+        with mock.patch.object(
+            advisor,
+            "advise",
+            return_value=[Finding("seq-scan", "t", None, "t had 1 rows.")],
+        ):
+            _, err, _ = call_command("--index-advisor")
+
+        assert err == "Index advisor found 1 issue.\n"
+
+    def test_index_advisor_quiet(self):
+        _, err, _ = call_command("--index-advisor", "--verbosity", "0")
+
+        assert err == ""
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import os
+from functools import partial
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from django_harlequin.attach import (
+    attach_sql,
+    conninfo_value,
+    parse_command,
+    write_attach_script,
+)
+from django_harlequin.management.commands import harlequin as harlequin_command
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class CacheDirMixin(SimpleTestCase):
+    def setUp(self) -> None:
+        self.cache_dir = use_cache_dir(self)
+
+
+class ParseCommandTests(SimpleTestCase):
+    def test_parse(self):
+        assert parse_command(
+            [
+                "-a",
+                "mysql",
+                "--ssl-ca",
+                "ca.pem",
+                "--read-only",
+                "--user",
+                "user",
+                "keepalives=1",
+            ]
+        ) == ({"ssl_ca": "ca.pem", "user": "user"}, True, ["keepalives=1"])
+
+
+class ConninfoValueTests(SimpleTestCase):
+    def test_plain(self):
+        assert conninfo_value("localhost") == "localhost"
+
+    def test_empty(self):
+        assert conninfo_value("") == "''"
+
+    def test_quoted(self):
+        assert conninfo_value("it's a \\secret") == "'it\\'s a \\\\secret'"
+
+
+class AttachSqlTests(SimpleTestCase):
+    def test_postgres(self):
+        sql = attach_sql(
+            "default",
+            "postgresql",
+            [
+                "-a",
+                "postgres",
+                "--host",
+                "db",
+                "--dbname",
+                "app",
+                "--read-only",
+                "keepalives=1",
+            ],
+            {"PGPASSWORD": "it's", "PGOPTIONS": "-c work_mem=4MB", "OTHER": "x"},
+            "app",
+        )
+
+        assert sql == (
+            "ATTACH 'host=db dbname=app password=''it\\''s'' "
+            + "options=''-c work_mem=4MB'' keepalives=1' "
+            + 'AS "default" (TYPE postgres, READ_ONLY);'
+        )
+
+    def test_mysql(self):
+        sql = attach_sql(
+            "shard",
+            "mysql",
+            ["-a", "mysql", "--database", "app", "--password", "secret"],
+            {},
+            "app",
+        )
+
+        assert sql == (
+            "ATTACH 'database=app password=secret' AS \"shard\" (TYPE mysql);"
+        )
+
+    def test_mysql_socket(self):
+        sql = attach_sql(
+            "shard",
+            "mysql",
+            [
+                "-a",
+                "mysql",
+                "--unix_socket",
+                "/run/mysqld/mysqld.sock",
+                "--connect_timeout",
+                "5",
+            ],
+            {},
+            "app",
+        )
+
+        assert sql == (
+            "ATTACH 'socket=/run/mysqld/mysqld.sock' AS \"shard\" (TYPE mysql);"
+        )
+
+    def test_sqlite(self):
+        sql = attach_sql(
+            'lo"cal',
+            "sqlite",
+            ["-a", "sqlite", "--read-only", "file:///tmp/db.sqlite3?mode=ro"],
+            {},
+            "/tmp/db.sqlite3",
+        )
+
+        assert sql == (
+            'ATTACH \'/tmp/db.sqlite3\' AS "lo""cal" (TYPE sqlite, READ_ONLY);'
+        )
+
+
+class WriteAttachScriptTests(CacheDirMixin, SimpleTestCase):
+    def test_write(self):
+        path = write_attach_script(
+            [
+                ("sqlite", "ATTACH 'a' AS \"a\" (TYPE sqlite);"),
+                ("postgresql", "ATTACH 'b' AS \"b\" (TYPE postgres);"),
+                ("sqlite", "ATTACH 'c' AS \"c\" (TYPE sqlite);"),
+            ]
+        )
+
+        assert path == self.cache_dir / "duckdb" / "attach.sql"
+        assert path.read_text() == (
+            "INSTALL postgres;\n"
+            + "LOAD postgres;\n"
+            + "INSTALL sqlite;\n"
+            + "LOAD sqlite;\n"
+            + "ATTACH 'a' AS \"a\" (TYPE sqlite);\n"
+            + "ATTACH 'b' AS \"b\" (TYPE postgres);\n"
+            + "ATTACH 'c' AS \"c\" (TYPE sqlite);\n"
+        )
+        assert path.stat().st_mode & 0o777 == 0o600
+
+
+class AllDatabasesCommandTests(CacheDirMixin, SimpleTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": "example.db",
+                },
+                "orders": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "HOST": "localhost",
+                    "NAME": "orders",
+                    "PASSWORD": "password123",
+                    "PORT": "5433",
+                    "USER": "user",
+                },
+                "legacy": {
+                    "ENGINE": "django.db.backends.mysql",
+                    "HOST": "localhost",
+                    "NAME": "legacy",
+                    "USER": "user",
+                },
+            }
+        ),
+    )
+    @mock.patch.object(
+        settings,
+        "HARLEQUIN_GUARDS",
+        {"orders": {"statement_timeout": "30s"}},
+        create=True,
+    )
+    def test_all_databases(self):
+        call_command("--all-databases", "--read-only")
+
+        init_path = self.cache_dir / "duckdb" / "attach.sql"
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                [
+                    "harlequin",
+                    "-a",
+                    "duckdb",
+                    "--init-path",
+                    str(init_path),
+                    ":memory:",
+                ],
+                env=mock.ANY,
+            ),
+        ]
+        assert init_path.read_text() == (
+            "INSTALL mysql;\n"
+            + "LOAD mysql;\n"
+            + "INSTALL postgres;\n"
+            + "LOAD postgres;\n"
+            + "INSTALL sqlite;\n"
+            + "LOAD sqlite;\n"
+            + "ATTACH 'example.db' AS \"default\" (TYPE sqlite, READ_ONLY);\n"
+            + "ATTACH 'user=user host=localhost port=5433 dbname=orders "
+            + "password=password123 options=''-c statement_timeout=30s "
+            + "-c default_transaction_read_only=on''' "
+            + 'AS "orders" (TYPE postgres, READ_ONLY);\n'
+            + "ATTACH 'database=legacy user=user host=localhost' "
+            + 'AS "legacy" (TYPE mysql, READ_ONLY);\n'
+        )
+        assert not (self.cache_dir / "launch").exists()
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": "example.db",
+                },
+                "other": {"ENGINE": "django.db.backends.dummy"},
+            }
+        ),
+    )
+    def test_unsupported_vendor(self):
+        _, err, _ = call_command("--all-databases")
+
+        assert err == "DuckDB cannot attach unknown databases, so 'other' is skipped.\n"
+        assert (self.cache_dir / "duckdb" / "attach.sql").read_text() == (
+            "INSTALL sqlite;\n"
+            + "LOAD sqlite;\n"
+            + "ATTACH 'example.db' AS \"default\" (TYPE sqlite);\n"
+        )
+        assert len(self.execvpe_mock.mock_calls) == 1
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler({"default": {"ENGINE": "django.db.backends.dummy"}}),
+    )
+    def test_no_supported_vendors(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("--all-databases")
+
+        assert excinfo.value.args[0] == "No databases can be attached to DuckDB."
+
+    def test_with_parquet(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("--all-databases", "--parquet", "testapp.Tag")
+
+        assert excinfo.value.args[0] == (
+            "--all-databases cannot be combined with --snapshot, --sample, or "
+            + "--parquet."
+        )
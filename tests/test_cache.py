@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from django_harlequin.cache import cache_dir, write_private
+
+
+class CacheDirTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def test_override(self):
+        with mock.patch.dict(
+            os.environ, {"DJANGO_HARLEQUIN_CACHE_DIR": str(self.tmp / "cache")}
+        ):
+            path = cache_dir()
+
+        assert path == self.tmp / "cache"
+        assert path.is_dir()
+
+    def test_xdg_cache_home(self):
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": str(self.tmp)}):
+            os.environ.pop("DJANGO_HARLEQUIN_CACHE_DIR", None)
+            path = cache_dir()
+
+        assert path == self.tmp / "django-harlequin"
+        assert path.stat().st_mode & 0o777 == 0o700
+
+
+class WritePrivateTests(SimpleTestCase):
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "sub" / "file.txt"
+
+            write_private(path, "content")
+
+            assert path.read_text() == "content"
+            assert path.stat().st_mode & 0o777 == 0o600
+            assert [p.name for p in path.parent.iterdir()] == ["file.txt"]
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase
+
+from django_harlequin import pytest_plugin
+from django_harlequin.capture import (
+    QueryCapture,
+    load_capture,
+    n_plus_one,
+    write_captured_queries,
+)
+from tests.testapp.models import Author
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+def entry(
+    fingerprint: str, tests: dict[str, list[Any]], alias: str = "default"
+) -> dict[str, Any]:
+    return {
+        "alias": alias,
+        "fingerprint": fingerprint,
+        "sql": fingerprint.replace("?", "1"),
+        "count": sum(count for count, _ in tests.values()),
+        "total": sum(total for _, total in tests.values()),
+        "tests": tests,
+    }
+
+
+class QueryCaptureTests(TestCase):
+    def test_capture(self):
+        capture = QueryCapture()
+        capture.install()
+        self.addCleanup(capture.uninstall)
+
+        Author.objects.filter(name="outside").exists()
+        capture.test = "tests/test_x.py::test_a"
+        for name in ["a", "b", "c"]:
+            Author.objects.filter(name=name).exists()
+        capture.test = "tests/test_x.py::test_b"
+        Author.objects.filter(name="d").exists()
+
+        (captured,) = capture.entries.values()
+        assert captured["alias"] == "default"
+        assert captured["fingerprint"].startswith("SELECT ? AS")
+        assert captured["sql"].endswith('WHERE "testapp_author"."name" = \'a\' LIMIT 1')
+        assert captured["count"] == 4
+        assert {test: count for test, (count, _) in captured["tests"].items()} == {
+            "tests/test_x.py::test_a": 3,
+            "tests/test_x.py::test_b": 1,
+        }
+
+    def test_new_connections(self):
+        capture = QueryCapture()
+        capture.install()
+        self.addCleanup(capture.uninstall)
+        other = connections.create_connection("default")
+
+        capture.connection_created(sender=None, connection=other)
+        capture.connection_created(sender=None, connection=other)
+
+        assert other.execute_wrappers == [capture]
+
+    def test_uninstall(self):
+        capture = QueryCapture()
+        capture.install()
+
+        capture.uninstall()
+
+        assert capture not in connection.execute_wrappers
+
+    def test_uninstall_not_installed(self):
+        capture = QueryCapture()
+        capture.install()
+        connection.execute_wrappers.remove(capture)
+
+        capture.uninstall()
+
+        assert capture not in connection.execute_wrappers
+
+
+class MergeTests(SimpleTestCase):
+    def test_merge(self):
+        capture = QueryCapture()
+        capture.entries = {
+            ("default", "SELECT a"): entry("SELECT a", {"t1": [1, 0.5], "t2": [2, 1.0]})
+        }
+
+        capture.merge(
+            [
+                entry("SELECT a", {"t2": [3, 0.25], "t3": [1, 0.125]}),
+                entry("SELECT b", {"t1": [1, 0.0]}),
+            ]
+        )
+
+        assert capture.entries == {
+            ("default", "SELECT a"): entry(
+                "SELECT a", {"t1": [1, 0.5], "t2": [5, 1.25], "t3": [1, 0.125]}
+            ),
+            ("default", "SELECT b"): entry("SELECT b", {"t1": [1, 0.0]}),
+        }
+
+
+class LoadCaptureTests(SimpleTestCase):
+    def test_round_trip(self):
+        capture = QueryCapture()
+        capture.entries = {
+            ("default", "a"): entry("SELECT a", {"t": [1, 0.1]}),
+            ("default", "b"): entry("SELECT b", {"t": [1, 0.2]}),
+        }
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "capture.json"
+            capture.write(path)
+            queries = load_capture(path)
+
+        assert [query["fingerprint"] for query in queries] == ["SELECT b", "SELECT a"]
+
+    def test_missing(self):
+        with pytest.raises(CommandError) as excinfo:
+            load_capture(Path("/nonexistent/capture.json"))
+
+        assert excinfo.value.args[0].startswith(
+            "Cannot read query capture '/nonexistent/capture.json': "
+        )
+
+    def test_unsupported(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "capture.json"
+            path.write_text(json.dumps({"version": 0}))
+
+            with pytest.raises(CommandError) as excinfo:
+                load_capture(path)
+
+        assert excinfo.value.args[0] == f"Unsupported query capture {str(path)!r}."
+
+
+class NPlusOneTests(SimpleTestCase):
+    def test_flagged(self):
+        assert n_plus_one(entry("SELECT ?", {"a": [1, 0.0], "b": [10, 0.0]})) == (
+            "b",
+            10,
+        )
+
+    def test_below_threshold(self):
+        assert n_plus_one(entry("SELECT ?", {"a": [9, 0.0]})) is None
+
+    def test_threshold(self):
+        assert n_plus_one(entry("SELECT ?", {"a": [3, 0.0]}), threshold=3) == ("a", 3)
+
+    def test_not_select(self):
+        assert n_plus_one(entry("SAVEPOINT ?", {"a": [10, 0.0]})) is None
+
+
+class WriteCapturedQueriesTests(SimpleTestCase):
+    def test_write(self):
+        entries = [
+            entry("SELECT slow", {"test_a": [1, 2.0]}),
+            entry("SELECT ? loop", {"test_a": [3, 0.5], "test_b": [4, 0.25]}),
+            entry("SELECT ? more", {"test_c": [10, 0.125]}),
+            entry("SELECT other", {"test_a": [1, 5.0]}, alias="other"),
+        ]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            directory = Path(tmpdir)
+            write_captured_queries(entries, directory, connection, top=2, threshold=3)
+            files = sorted(
+                str(path.relative_to(directory)) for path in directory.rglob("*.sql")
+            )
+            first = (directory / "01.sql").read_text()
+            second = (directory / "02.sql").read_text()
+            repeated = (directory / "n-plus-one" / "01.sql").read_text()
+
+        assert files == [
+            "01.sql",
+            "02.sql",
+            "n-plus-one/01.sql",
+            "n-plus-one/02.sql",
+        ]
+        assert first == (
+            "-- Captured on database 'default'.\n"
+            + "-- Count: 1\n"
+            + "-- Total: 2,000.0ms\n"
+            + "-- Tests: 1\n"
+            + "-- Slowest test: test_a\n"
+            + "-- Fingerprint: SELECT slow\n"
+            + "\n"
+            + "SELECT slow;\n"
+        )
+        assert "-- Slowest test: test_a\n-- N+1: run 4 times in test_b\n" in second
+        assert "-- N+1: run 10 times in test_c\n" in repeated
+
+    def test_no_repeats(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            directory = Path(tmpdir)
+            write_captured_queries(
+                [entry("SELECT ?", {"test_a": [1, 0.0]})], directory, connection, 20
+            )
+
+            assert not (directory / "n-plus-one").exists()
+
+
+class PytestPluginTests(SimpleTestCase):
+    def test_addoption(self):
+        parser = mock.Mock()
+
+        pytest_plugin.pytest_addoption(parser)
+
+        parser.getgroup.assert_called_once_with("django-harlequin")
+        assert parser.getgroup.return_value.addoption.call_args.args == (
+            "--harlequin-capture",
+        )
+
+    def test_configure(self):
+        config = mock.Mock()
+        config.getoption.return_value = "capture.json"
+
+        pytest_plugin.pytest_configure(config)
+
+        ((plugin, name), _) = config.pluginmanager.register.call_args
+        assert isinstance(plugin, pytest_plugin.CapturePlugin)
+        assert plugin.path == Path("capture.json")
+        assert name == "harlequin-capture"
+
+    def test_configure_disabled(self):
+        config = mock.Mock()
+        config.getoption.return_value = None
+
+        pytest_plugin.pytest_configure(config)
+
+        config.pluginmanager.register.assert_not_called()
+
+
+class CapturePluginTests(TestCase):
+    def test_session(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "capture.json"
+            with mock.patch.dict(os.environ):
+                os.environ.pop("PYTEST_XDIST_WORKER", None)
+                plugin = pytest_plugin.CapturePlugin(path)
+            item = mock.Mock(nodeid="tests/test_x.py::test_a")
+
+            plugin.pytest_sessionstart(mock.Mock())
+            protocol = plugin.pytest_runtest_protocol(item, None)
+            next(protocol)
+            Author.objects.count()
+            with pytest.raises(StopIteration) as excinfo:
+                protocol.send(True)
+            Author.objects.count()
+            plugin.pytest_sessionfinish(mock.Mock())
+
+            (query,) = load_capture(path)
+
+        assert excinfo.value.value is True
+        assert query["tests"].keys() == {"tests/test_x.py::test_a"}
+        assert plugin.capture not in connection.execute_wrappers
+
+    def test_xdist(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "capture.json"
+            stale = Path(tmpdir) / "capture.json.gw7"
+            stale.write_text("{")
+            with mock.patch.dict(os.environ):
+                os.environ.pop("PYTEST_XDIST_WORKER", None)
+                controller = pytest_plugin.CapturePlugin(path)
+            controller.pytest_sessionstart(mock.Mock())
+            assert not stale.exists()
+
+            for worker, test in (("gw0", "test_a"), ("gw1", "test_b")):
+                with mock.patch.dict(os.environ, {"PYTEST_XDIST_WORKER": worker}):
+                    plugin = pytest_plugin.CapturePlugin(path)
+                plugin.pytest_sessionstart(mock.Mock())
+                plugin.capture.entries = {
+                    ("default", "SELECT a"): entry("SELECT a", {test: [1, 0.5]})
+                }
+                plugin.pytest_sessionfinish(mock.Mock())
+            assert not path.exists()
+            assert [p.name for p in controller.worker_paths()] == [
+                "capture.json.gw0",
+                "capture.json.gw1",
+            ]
+
+            controller.pytest_sessionfinish(mock.Mock())
+
+            (query,) = load_capture(path)
+            assert controller.worker_paths() == []
+
+        assert query == entry("SELECT a", {"test_a": [1, 0.5], "test_b": [1, 0.5]})
+
+
+class FromCaptureCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_from_capture(self):
+        path = self.cache_dir / "capture.json"
+        capture = QueryCapture()
+        capture.entries = {("default", "a"): entry("SELECT a", {"t": [1, 0.1]})}
+        capture.write(path)
+
+        call_command("--from-capture", str(path))
+
+        root = self.cache_dir / "workspaces" / "default"
+        assert (root / "capture" / "01.sql").exists()
+        assert not (root / "capture" / "n-plus-one").exists()
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[-2:] == ["--show-files", str(root)]
+
+    def test_n_plus_one_threshold(self):
+        path = self.cache_dir / "capture.json"
+        capture = QueryCapture()
+        capture.entries = {("default", "SELECT a"): entry("SELECT a", {"t": [2, 0.1]})}
+        capture.write(path)
+
+        call_command("--from-capture", str(path), "--n-plus-one-threshold", "2")
+
+        root = self.cache_dir / "workspaces" / "default"
+        assert (root / "capture" / "n-plus-one" / "01.sql").exists()
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+from django.apps import apps
+from django.db import connection, models
+from django.db.models.functions import Lower
+from django.db.utils import ConnectionRouter
+from django.test import TestCase
+from django.test.utils import isolate_apps
+
+from django_harlequin import catalog
+from tests.testapp.models import Author, Book
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_database_models(self):
+        tables = [model._meta.db_table for model in catalog.database_models(connection)]
+
+        assert tables == [
+            "testapp_author",
+            "testapp_book",
+            "testapp_book_tags",
+            "testapp_tag",
+        ]
+
+    @isolate_apps("tests.testapp")
+    def test_database_models_skips_proxies_and_unrouted(self):
+        class AuthorProxy(Author):
+            class Meta:
+                app_label = "testapp"
+                proxy = True
+
+        class Elsewhere(models.Model):
+            class Meta:
+                app_label = "testapp"
+
+        class Router:
+            def allow_migrate(self, db, app_label, model_name=None, **hints):
+                return model_name != "elsewhere"
+
+        with (
+            mock.patch.object(
+                apps,
+                "get_models",
+                lambda **kwargs: [
+                    Author,
+                    AuthorProxy,
+                    Elsewhere,
+                ],
+            ),
+            mock.patch.object(catalog, "router", ConnectionRouter([Router()])),
+        ):
+            result = catalog.database_models(connection)
+
+        assert result == [Author]
+
+    def test_model_indexes_author(self):
+        assert catalog.model_indexes(Author) == [
+            {"name": None, "columns": ["id"], "expressions": False, "unique": True},
+            {"name": None, "columns": ["name"], "expressions": False, "unique": True},
+            {"name": None, "columns": ["email"], "expressions": False, "unique": False},
+        ]
+
+    def test_model_indexes_book(self):
+        assert catalog.model_indexes(Book) == [
+            {"name": None, "columns": ["id"], "expressions": False, "unique": True},
+            {
+                "name": None,
+                "columns": ["author_id"],
+                "expressions": False,
+                "unique": False,
+            },
+            {
+                "name": "book_title_idx",
+                "columns": ["title", "published"],
+                "expressions": False,
+                "unique": False,
+            },
+        ]
+
+    @isolate_apps("tests.testapp")
+    def test_model_indexes_unique_together_and_constraints(self):
+        class Edition(models.Model):
+            book: models.IntegerField[int, int] = models.IntegerField()
+            number: models.IntegerField[int, int] = models.IntegerField()
+            isbn: models.CharField[str, str] = models.CharField(max_length=13)
+
+            class Meta:
+                app_label = "testapp"
+                unique_together = [("book", "number")]
+                indexes = [models.Index(Lower("isbn"), name="isbn_lower")]
+                constraints = [
+                    models.UniqueConstraint(fields=["isbn"], name="isbn_unique"),
+                    models.UniqueConstraint(Lower("isbn"), name="isbn_lower_unique"),
+                    models.CheckConstraint(
+                        condition=models.Q(number__gte=1), name="number_positive"
+                    ),
+                ]
+
+        assert catalog.model_indexes(Edition) == [
+            {"name": None, "columns": ["id"], "expressions": False, "unique": True},
+            {
+                "name": None,
+                "columns": ["book", "number"],
+                "expressions": False,
+                "unique": True,
+            },
+            {
+                "name": "isbn_lower",
+                "columns": None,
+                "expressions": True,
+                "unique": False,
+            },
+            {
+                "name": "isbn_unique",
+                "columns": ["isbn"],
+                "expressions": False,
+                "unique": True,
+            },
+            {
+                "name": "isbn_lower_unique",
+                "columns": None,
+                "expressions": True,
+                "unique": True,
+            },
+        ]
+
+    def test_row_estimates_no_statistics(self):
+        assert catalog.row_estimates(connection) == {}
+
+    def test_row_estimates_sqlite_stat1(self):
+        author = Author.objects.create(name="Ada", email="ada@example.com")
+        Book.objects.create(author=author, title="Notes")
+        Book.objects.create(author=author, title="More Notes")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+            cursor.execute(
+                "INSERT INTO sqlite_stat1 VALUES ('testapp_tag', NULL, '-1')"
+            )
+
+        estimates = catalog.row_estimates(connection)
+
+        assert "testapp_tag" not in estimates
+        assert estimates["testapp_author"] == 1
+        assert estimates["testapp_book"] == 2
+
+    def test_migration_key_stable(self):
+        key = catalog.migration_key(connection)
+
+        assert key == catalog.migration_key(connection)
+        assert len(key) == 64
+
+    def test_build_catalog(self):
+        result = catalog.build_catalog(connection)
+
+        assert result["alias"] == "default"
+        assert result["vendor"] == "sqlite"
+        book = next(t for t in result["tables"] if t["table"] == "testapp_book")
+        assert book["model"] == "testapp.Book"
+        assert book["rows"] is None
+        assert book["columns"][0] == {
+            "name": "id",
+            "type": "integer",
+            "null": False,
+            "primary_key": True,
+        }
+        assert book["foreign_keys"] == [
+            {
+                "column": "author_id",
+                "references_table": "testapp_author",
+                "references_column": "id",
+            }
+        ]
+
+    def test_load_catalog_cached(self):
+        first = catalog.load_catalog(connection)
+
+        with mock.patch.object(catalog, "build_catalog") as build_mock:
+            second = catalog.load_catalog(connection)
+
+        assert build_mock.mock_calls == []
+        assert first == second
+
+    def test_write_catalog(self):
+        result = catalog.build_catalog(connection)
+        result["tables"][0]["rows"] = 1234
+        result["tables"][-1]["indexes"] = []
+        book_table = next(t for t in result["tables"] if t["table"] == "testapp_book")
+        book_table["indexes"].append(
+            {
+                "name": "book_lower_title",
+                "columns": None,
+                "expressions": True,
+                "unique": False,
+            }
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            catalog.write_catalog(result, directory, connection)
+
+            assert json.loads((directory / "catalog.json").read_text()) == result
+            author = (directory / "testapp" / "testapp_author.sql").read_text()
+            book = (directory / "testapp" / "testapp_book.sql").read_text()
+            tag = (directory / "testapp" / "testapp_tag.sql").read_text()
+
+        assert "-- Estimated rows: 1,234\n" in author
+        assert "--   name varchar(100) NOT NULL\n" in author
+        assert "--   UNIQUE (name)\n" in author
+        assert (
+            "--   author_id integer NOT NULL REFERENCES testapp_author (id)\n" in book
+        )
+        assert "--   book_title_idx (title, published)\n" in book
+        assert "--   book_lower_title (expressions)\n" in book
+        assert book.endswith('SELECT * FROM "testapp_book" LIMIT 100;\n')
+        assert "-- Indexes:" not in tag
+
+    def test_command(self):
+        call_command("--catalog")
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        workspace = self.cache_dir / "workspaces" / "default"
+        assert command[-2:] == ["--show-files", str(workspace)]
+        assert (workspace / "catalog" / "testapp" / "testapp_book.sql").exists()
+
+    def test_command_without_catalog(self):
+        call_command()
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert "--show-files" not in command
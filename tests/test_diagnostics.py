@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from django_harlequin import diagnostics
+from django_harlequin.diagnostics import (
+    DIAGNOSTICS,
+    SQLITE_DIAGNOSTICS,
+    models_cte,
+    write_diagnostics,
+)
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class ModelsCteTests(SimpleTestCase):
+    def test_models(self):
+        cte = models_cte(connection)
+
+        assert cte.startswith(
+            "django_models (table_name, model) AS (\n"
+            + "    SELECT 'testapp_author', 'testapp.Author'\n"
+            + "    UNION ALL SELECT 'testapp_book', 'testapp.Book'\n"
+        )
+
+    def test_no_models(self):
+        with mock.patch.object(diagnostics, "database_models", return_value=[]):
+            cte = models_cte(connection)
+
+        assert cte == "django_models (table_name, model) AS (\n    SELECT NULL, NULL\n)"
+
+
+class SqliteDiagnosticsTests(TestCase):
+    def test_queries_run(self):
+        models = models_cte(connection)
+        statements = [
+            statement
+            for _, sql in SQLITE_DIAGNOSTICS.values()
+            for statement in sql.format(models=models).split(";")
+            # Checkpoints can’t run inside the test’s transaction.
+            if statement.strip() and "wal_checkpoint" not in statement
+        ]
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def test_bloat_annotated(self):
+        _, sql = SQLITE_DIAGNOSTICS["bloat.sql"]
+        statement = sql.format(models=models_cte(connection)).split(";")[1]
+
+        with connection.cursor() as cursor:
+            cursor.execute(statement)
+            models = {row[0]: row[1] for row in cursor.fetchall()}
+
+        assert models["testapp_book"] == "testapp.Book"
+
+
+class WriteDiagnosticsTests(SimpleTestCase):
+    def test_vendors(self):
+        for vendor in DIAGNOSTICS:
+            with (
+                tempfile.TemporaryDirectory() as tmpdir,
+                mock.patch.object(connection, "vendor", vendor),
+            ):
+                write_diagnostics(Path(tmpdir), connection)
+                files = sorted(path.name for path in Path(tmpdir).iterdir())
+                locks = (Path(tmpdir) / "blocking-locks.sql").read_text()
+
+            assert files == [
+                "bloat.sql",
+                "blocking-locks.sql",
+                "cache-hit-ratio.sql",
+                "long-transactions.sql",
+                "replication-lag.sql",
+            ]
+            assert "{models}" not in locks
+            assert "-- Database: 'default'.\n" in locks
+
+    def test_no_query(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_diagnostics(Path(tmpdir), connection)
+            content = (Path(tmpdir) / "replication-lag.sql").read_text()
+
+        assert content == (
+            "-- SQLite has no built-in replication.\n-- Database: 'default'.\n"
+        )
+
+    def test_unsupported(self):
+        with (
+            mock.patch.object(connection, "vendor", "oracle"),
+            mock.patch.object(connection, "display_name", "Oracle"),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            write_diagnostics(Path("/nonexistent"), connection)
+
+        assert excinfo.value.args[0] == (
+            "--diagnostics doesn’t support Oracle databases."
+        )
+
+
+class DiagnosticsCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_diagnostics(self):
+        call_command("--diagnostics")
+
+        root = self.cache_dir / "workspaces" / "default"
+        assert (root / "diagnostics" / "blocking-locks.sql").exists()
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[-2:] == ["--show-files", str(root)]
@@ -0,0 +1,443 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase
+
+from django_harlequin import fan_out as fan_out_module
+from django_harlequin.fan_out import (
+    AliasResult,
+    connect_options,
+    fan_out,
+    interrupt,
+    match_aliases,
+    timeout_statements,
+)
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+# Counts for long enough to time out.
+SLOW_VIEW = """
+    CREATE VIEW items AS
+    WITH RECURSIVE counter (n) AS (
+        SELECT 1 UNION ALL SELECT n + 1 FROM counter WHERE n < 1000000000
+    )
+    SELECT max(n) AS n, 'slow' AS name FROM counter
+"""
+
+
+class FanOutTestCase(TestCase):
+    """
+    Databases as SQLite files, with a table of items, a slow view of them, or
+    a table with other columns.
+    """
+
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = Path(tmpdir.name)
+        self.cache_dir = use_cache_dir(self)
+
+        databases = {}
+        for alias, setup in [
+            ("slow", SLOW_VIEW),
+            (
+                "shard1",
+                "CREATE TABLE items (n INTEGER, name TEXT);"
+                + "INSERT INTO items VALUES (1, 'a'), (2, 'b');",
+            ),
+            (
+                "shard2",
+                "CREATE TABLE items (n INTEGER, name TEXT);"
+                + "INSERT INTO items VALUES (3, 'c');",
+            ),
+            ("default", "CREATE TABLE items (id INTEGER);"),
+        ]:
+            path = self.tmpdir / f"{alias}.sqlite3"
+            db = sqlite3.connect(path)
+            db.executescript(setup)
+            db.close()
+            databases[alias] = {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": str(path),
+            }
+        self.connections = ConnectionHandler(databases)
+        connections_mocker = mock.patch.object(
+            fan_out_module, "connections", self.connections
+        )
+        connections_mocker.start()
+        self.addCleanup(connections_mocker.stop)
+
+    def results(self, path: Path, sql: str) -> list[tuple[object, ...]]:
+        db = sqlite3.connect(path)
+        try:
+            return db.execute(sql).fetchall()
+        finally:
+            db.close()
+
+
+class MatchAliasesTests(FanOutTestCase):
+    def test_match(self):
+        assert match_aliases("shard*") == ["shard1", "shard2"]
+
+    def test_none(self):
+        with pytest.raises(CommandError) as excinfo:
+            match_aliases("replica*")
+
+        assert excinfo.value.args[0] == "No databases match 'replica*'."
+
+
+class TimeoutStatementsTests(SimpleTestCase):
+    def test_vendors(self):
+        assert timeout_statements("postgresql", 2.5) == [
+            "SELECT set_config('statement_timeout', '2500ms', false)"
+        ]
+        assert timeout_statements("mysql", 0.0001) == [
+            "SET SESSION max_execution_time = 1"
+        ]
+        assert timeout_statements("sqlite", 2.5) == []
+
+
+class ConnectOptionsTests(SimpleTestCase):
+    def test_vendors(self):
+        assert connect_options("postgresql", 2.5) == {"connect_timeout": 3}
+        assert connect_options("mysql", 0.1) == {"connect_timeout": 1}
+        assert connect_options("sqlite", 2.5) == {}
+
+
+class InterruptTests(SimpleTestCase):
+    def test_closed(self):
+        connection = ConnectionHandler(
+            {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+        )["default"]
+
+        interrupt(connection)
+
+        assert connection.connection is None
+
+    def test_none(self):
+        interrupt(None)
+
+
+class FanOutTests(FanOutTestCase):
+    def test_merge(self):
+        messages: list[str] = []
+
+        with (
+            mock.patch.object(fan_out_module, "BATCH_SIZE", 1),
+            mock.patch.object(
+                fan_out_module, "timeout_statements", return_value=["SELECT 1"]
+            ),
+        ):
+            path, results = fan_out(
+                "shard*", "SELECT n, name FROM items", 2, 10, messages.append, {}
+            )
+
+        assert path == self.cache_dir / "fan-out" / "results.sqlite3"
+        assert self.results(path, "SELECT * FROM results ORDER BY n") == [
+            ("shard1", 1, "a"),
+            ("shard1", 2, "b"),
+            ("shard2", 3, "c"),
+        ]
+        assert [(result.alias, result.status, result.rows) for result in results] == [
+            ("shard1", "ok", 2),
+            ("shard2", "ok", 1),
+        ]
+        assert sorted(message.split(" in ")[0] for message in messages) == [
+            "shard1: 2 rows",
+            "shard2: 1 rows",
+        ]
+        assert self.results(
+            path, "SELECT alias, status, rows, error FROM fan_out_aliases"
+        ) == [("shard1", "ok", 2, ""), ("shard2", "ok", 1, "")]
+        assert os.listdir(path.parent) == ["results.sqlite3"]
+
+    def test_errors(self):
+        path, results = fan_out(
+            "*", "SELECT n, name FROM items", 4, 0.5, lambda message: None, {}
+        )
+
+        by_alias = {result.alias: result for result in results}
+        assert by_alias["default"].status == "error"
+        assert by_alias["default"].error == ("OperationalError: no such column: n")
+        assert by_alias["slow"].status == "timeout"
+        assert sorted(self.results(path, "SELECT source_alias FROM results")) == [
+            ("shard1",),
+            ("shard1",),
+            ("shard2",),
+        ]
+
+    def test_different_columns(self):
+        _, results = fan_out(
+            "*[12t]", "SELECT * FROM items", 1, 10, lambda message: None, {}
+        )
+
+        assert [(result.alias, result.status) for result in results] == [
+            ("shard1", "ok"),
+            ("shard2", "ok"),
+            ("default", "error"),
+        ]
+        assert results[2].error == (
+            "Columns (id) differ from those of other databases (n, name)."
+        )
+
+    def test_not_select(self):
+        for sql in [
+            "UPDATE items SET name = 'x'",
+            "SELECT 1; DELETE FROM items",
+            "WITH gone AS (DELETE FROM items RETURNING *) SELECT * FROM gone",
+            "CREATE TEMP TABLE scratch (id INTEGER)",
+        ]:
+            with (
+                self.subTest(sql=sql),
+                mock.patch.object(fan_out_module, "FanOut") as fan_out_mock,
+                pytest.raises(CommandError) as excinfo,
+            ):
+                fan_out("shard1", sql, 1, 10, lambda message: None, {})
+
+            assert excinfo.value.args == (
+                "The fan-out query must be a single SELECT statement.",
+            )
+            fan_out_mock.assert_not_called()
+
+    def test_guards(self):
+        sql = "SELECT query_only FROM pragma_query_only"
+
+        with self.settings(HARLEQUIN_GUARDS={"shard1": {"read_only": True}}):
+            path, _ = fan_out("shard*", sql, 1, 10, lambda message: None, {})
+            guarded = self.results(path, "SELECT * FROM results")
+            path, _ = fan_out(
+                "shard1", sql, 1, 10, lambda message: None, {"read_only": False}
+            )
+            overridden = self.results(path, "SELECT * FROM results")
+
+        assert guarded == [("shard1", 1), ("shard2", 0)]
+        assert overridden == [("shard1", 0)]
+
+    def test_no_rows(self):
+        runner = fan_out_module.FanOut(
+            ["shard1"],
+            "CREATE TEMP TABLE scratch (id INTEGER)",
+            1,
+            10,
+            lambda message: None,
+            {"shard1": {}},
+        )
+
+        runner.worker("shard1")
+
+        assert list(runner.messages.queue)[-1] == (
+            "error",
+            "shard1",
+            "ValueError: The statement returned no rows.",
+        )
+
+    def test_timeout(self):
+        messages: list[str] = []
+
+        # With one worker, shard1 only starts after the slow query has been
+        # interrupted, so its error arrives while shard1 is pending.
+        _, results = fan_out(
+            "s[lh]*[w1]", "SELECT n, name FROM items", 1, 0.2, messages.append, {}
+        )
+
+        assert [(result.alias, result.status) for result in results] == [
+            ("slow", "timeout"),
+            ("shard1", "ok"),
+        ]
+        assert results[0].error == "Timed out after 0.2s."
+        assert results[0].seconds < 5
+        assert [message.split(" in ")[0] for message in messages] == ["shard1: 2 rows"]
+
+    def test_connect_timeout(self):
+        release = threading.Event()
+
+        def finish_abandoned() -> None:
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == "fan-out-shard1":
+                    thread.join()
+
+        # Before the database files are removed.
+        self.addCleanup(finish_abandoned)
+        ensure_connection = SQLiteDatabaseWrapper.ensure_connection
+
+        def hang(self: SQLiteDatabaseWrapper) -> None:
+            if self.alias == "shard1":
+                release.wait(10)
+            ensure_connection(self)
+
+        # With one worker, shard2 only starts once shard1, stuck connecting,
+        # has timed out and its worker been abandoned.
+        with mock.patch.object(SQLiteDatabaseWrapper, "ensure_connection", hang):
+            _, results = fan_out(
+                "shard*", "SELECT n, name FROM items", 1, 0.2, lambda message: None, {}
+            )
+
+        assert [(result.alias, result.status) for result in results] == [
+            ("shard1", "timeout"),
+            ("shard2", "ok"),
+        ]
+
+    def test_late_messages(self):
+        runner = fan_out_module.FanOut(
+            ["shard1", "shard2"],
+            "SELECT 1",
+            1,
+            0.1,
+            lambda message: None,
+            {"shard1": {}, "shard2": {}},
+        )
+        sent = threading.Event()
+
+        def worker(alias: str) -> None:
+            if alias == "shard1":
+                # Finishes after timing out, while shard2 runs.
+                while alias not in runner.cancelled:
+                    time.sleep(0.01)
+                runner.messages.put(("done", alias, None))
+                sent.set()
+            else:
+                sent.wait(5)
+                runner.messages.put(("done", alias, None))
+
+        writer = fan_out_module.ResultWriter(":memory:")
+        self.addCleanup(writer.db.close)
+
+        with mock.patch.object(runner, "worker", worker):
+            results = runner.run(writer)
+
+        assert [(result.alias, result.status) for result in results] == [
+            ("shard1", "timeout"),
+            ("shard2", "ok"),
+        ]
+
+    def test_worker_connect_options(self):
+        self.connections.settings["shard2"]["OPTIONS"] = {"timeout": 7}
+        runner = fan_out_module.FanOut(
+            ["shard1", "shard2"],
+            "SELECT 1",
+            1,
+            10,
+            lambda message: None,
+            {"shard1": {}, "shard2": {}},
+        )
+
+        with mock.patch.object(
+            fan_out_module, "connect_options", return_value={"timeout": 3}
+        ):
+            runner.worker("shard1")
+            runner.worker("shard2")
+
+        messages = list(runner.messages.queue)
+        options = [
+            value.settings_dict["OPTIONS"]
+            for kind, _, value in messages
+            if kind == "connection"
+        ]
+        assert options == [{"timeout": 3}, {"timeout": 7}]
+        assert [kind for kind, _, _ in messages].count("done") == 2
+
+    def test_only_timeout(self):
+        path, results = fan_out(
+            "slow", "SELECT n, name FROM items", 1, 0.1, lambda message: None, {}
+        )
+
+        assert results == [
+            AliasResult("slow", "timeout", 0, results[0].seconds, results[0].error)
+        ]
+        assert self.results(path, "SELECT * FROM results") == []
+
+    def test_failure_removes_file(self):
+        with (
+            mock.patch.object(
+                fan_out_module.FanOut, "run", side_effect=KeyboardInterrupt
+            ),
+            pytest.raises(KeyboardInterrupt),
+        ):
+            fan_out("shard1", "SELECT 1", 1, 10, lambda message: None, {})
+
+        assert os.listdir(self.cache_dir / "fan-out") == []
+
+
+class FanOutCommandTests(FanOutTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+    def test_fan_out(self):
+        _, err, returncode = call_command(
+            "--fan-out",
+            "SELECT n, name FROM items",
+            "--fan-out-aliases",
+            "*[12t]",
+        )
+
+        assert returncode == 0
+        path = self.cache_dir / "fan-out" / "results.sqlite3"
+        assert err == (
+            "default: OperationalError: no such column: n\n"
+            + f"Fetched 3 rows from 2 of 3 databases into {path}.\n"
+        )
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command == ["harlequin", "-a", "sqlite", str(path)]
+        assert not (self.cache_dir / "launcher").exists()
+
+    def test_verbose(self):
+        _, err, _ = call_command(
+            "--fan-out",
+            "SELECT n FROM items",
+            "--fan-out-aliases",
+            "*[1t]",
+            "--verbosity",
+            "2",
+        )
+
+        lines = err.splitlines()
+        assert lines[0].startswith("shard1: 2 rows in ")
+        assert lines[1:] == [
+            "default: OperationalError: no such column: n",
+            "Fetched 2 rows from 1 of 2 databases into "
+            + f"{self.cache_dir / 'fan-out' / 'results.sqlite3'}.",
+        ]
+
+    def test_quiet(self):
+        _, err, _ = call_command(
+            "--fan-out",
+            "SELECT n FROM items",
+            "--fan-out-aliases",
+            "shard1",
+            "--verbosity",
+            "0",
+        )
+
+        assert err == ""
+
+    def test_no_workers(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("--fan-out", "SELECT 1", "--fan-out-workers", "0")
+
+        assert excinfo.value.args[0] == "--fan-out-workers must be at least 1."
+
+    def test_incompatible(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("--fan-out", "SELECT 1", "--all-databases")
+
+        assert excinfo.value.args[0] == (
+            "--fan-out cannot be combined with --snapshot, --sample, "
+            + "--parquet, or --all-databases."
+        )
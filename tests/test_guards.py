@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import os
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, override_settings
+
+from django_harlequin import launcher
+from django_harlequin.guards import (
+    duration_seconds,
+    get_guards,
+    is_select,
+    postgres_options,
+    session_statements,
+)
+from django_harlequin.management.commands import harlequin as harlequin_command
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class GetGuardsTests(SimpleTestCase):
+    def test_none(self):
+        assert get_guards("default", {}) == {}
+
+    @override_settings(
+        HARLEQUIN_GUARDS={
+            "default": {"statement_timeout": "30s", "read_only": True},
+            "other": {"work_mem": "4MB"},
+        }
+    )
+    def test_settings(self):
+        assert get_guards("default", {}) == {
+            "statement_timeout": "30s",
+            "read_only": True,
+        }
+
+    @override_settings(
+        HARLEQUIN_GUARDS={"default": {"statement_timeout": "30s", "read_only": True}}
+    )
+    def test_overrides(self):
+        assert get_guards(
+            "default", {"statement_timeout": "5s", "read_only": False}
+        ) == {
+            "statement_timeout": "5s",
+        }
+
+    @override_settings(
+        HARLEQUIN_GUARDS={"default": {"statement_timeout": "30s", "lock_timeout": 0}}
+    )
+    def test_zero(self):
+        assert get_guards("default", {"statement_timeout": 0}) == {
+            "statement_timeout": 0,
+            "lock_timeout": 0,
+        }
+
+    @override_settings(
+        HARLEQUIN_GUARDS={"default": {"statement_timeout": "30s"}},
+        HARLEQUIN_PROFILES={"default": {"read_only": True}, "other": {"limit": 5}},
+    )
+    def test_profile_read_only(self):
+        assert get_guards("default", {}) == {
+            "read_only": True,
+            "statement_timeout": "30s",
+        }
+        assert get_guards("default", {"read_only": False}) == {
+            "statement_timeout": "30s",
+        }
+        assert get_guards("other", {}) == {}
+
+    @override_settings(HARLEQUIN_GUARDS={"default": {"statment_timeout": "30s"}})
+    def test_unknown(self):
+        with pytest.raises(CommandError) as excinfo:
+            get_guards("default", {})
+
+        assert excinfo.value.args[0] == (
+            "Unknown HARLEQUIN_GUARDS option for 'default': statment_timeout."
+        )
+
+
+class DurationSecondsTests(SimpleTestCase):
+    def test_number(self):
+        assert duration_seconds(1500) == 1.5
+
+    def test_default_unit(self):
+        assert duration_seconds("250") == 0.25
+
+    def test_units(self):
+        assert duration_seconds("500us") == 0.0005
+        assert duration_seconds("2.5 s") == 2.5
+        assert duration_seconds("1min") == 60.0
+        assert duration_seconds("1h") == 3600.0
+        assert duration_seconds("1d") == 86400.0
+
+    def test_invalid(self):
+        with pytest.raises(CommandError) as excinfo:
+            duration_seconds("soon")
+
+        assert excinfo.value.args[0] == "Invalid duration 'soon'."
+
+
+class PostgresOptionsTests(SimpleTestCase):
+    def test_guards(self):
+        assert postgres_options(
+            {"statement_timeout": "30s", "work_mem": "64MB", "read_only": True},
+            None,
+        ) == (
+            "-c statement_timeout=30s -c work_mem=64MB "
+            + "-c default_transaction_read_only=on"
+        )
+
+    def test_base_and_escaping(self):
+        assert postgres_options({"lock_timeout": "1 s"}, "-c search_path=app") == (
+            "-c search_path=app -c lock_timeout=1\\ s"
+        )
+
+
+class SessionStatementsTests(SimpleTestCase):
+    guards = {"statement_timeout": "30s", "lock_timeout": "2s", "read_only": True}
+
+    def test_postgres(self):
+        statements = session_statements(
+            "postgresql", {**self.guards, "work_mem": "4'MB"}
+        )
+
+        assert statements == [
+            "SELECT set_config('statement_timeout', '30s', false)",
+            "SELECT set_config('lock_timeout', '2s', false)",
+            "SELECT set_config('default_transaction_read_only', 'on', false)",
+            "SELECT set_config('work_mem', '4''MB', false)",
+        ]
+
+    def test_mysql(self):
+        assert session_statements("mysql", self.guards) == [
+            "SET SESSION TRANSACTION READ ONLY"
+        ]
+
+    def test_sqlite(self):
+        assert session_statements("sqlite", self.guards) == [
+            "PRAGMA busy_timeout = 2000",
+            "PRAGMA query_only = ON",
+        ]
+
+    def test_other(self):
+        assert session_statements("oracle", self.guards) == []
+
+
+class IsSelectTests(SimpleTestCase):
+    def test_select(self):
+        assert is_select("SELECT 1")
+        assert is_select("-- Users\nSELECT * FROM users;")
+        assert is_select("WITH recent AS (SELECT 1) SELECT * FROM recent")
+        assert is_select("SELECT deleted_at FROM users")
+
+    def test_not_select(self):
+        assert not is_select("")
+        assert not is_select("UPDATE users SET name = ''")
+        assert not is_select("SELECT 1; SELECT 2")
+        assert not is_select("WITH gone AS (DELETE FROM users RETURNING *) SELECT 1")
+        assert not is_select("SELECT * FROM users FOR UPDATE")
+        assert not is_select("EXPLAIN ANALYZE DELETE FROM users")
+
+
+class GuardsCommandTests(SimpleTestCase):
+    def setUp(self):
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "NAME": "exampledb",
+                    "OPTIONS": {"options": "-c search_path=app"},
+                }
+            }
+        ),
+    )
+    @override_settings(
+        HARLEQUIN_GUARDS={
+            "default": {
+                "statement_timeout": "30s",
+                "lock_timeout": "2s",
+                "idle_in_transaction_session_timeout": "1min",
+                "work_mem": "16MB",
+            }
+        }
+    )
+    def test_postgres(self):
+        call_command("--statement-timeout", "10s", "--read-only")
+
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                ["harlequin", "-a", "postgres", "--dbname", "exampledb", "--read-only"],
+                env=mock.ANY,
+            ),
+        ]
+        assert self.execvpe_mock.mock_calls[0].kwargs["env"]["PGOPTIONS"] == (
+            "-c search_path=app -c statement_timeout=10s -c lock_timeout=2s "
+            + "-c idle_in_transaction_session_timeout=1min -c work_mem=16MB "
+            + "-c default_transaction_read_only=on"
+        )
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "NAME": "exampledb",
+                }
+            }
+        ),
+    )
+    @override_settings(
+        HARLEQUIN_GUARDS={"default": {"statement_timeout": "30s", "read_only": True}},
+        HARLEQUIN_PROFILES={"default": {"read_only": True}},
+    )
+    def test_no_read_only(self):
+        call_command("--no-read-only")
+
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                ["harlequin", "-a", "postgres", "--dbname", "exampledb"],
+                env=mock.ANY,
+            ),
+        ]
+        assert self.execvpe_mock.mock_calls[0].kwargs["env"]["PGOPTIONS"] == (
+            "-c statement_timeout=30s"
+        )
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.mysql",
+                    "NAME": "exampledb",
+                }
+            }
+        ),
+    )
+    def test_mysql(self):
+        _, err, _ = call_command("--read-only", "--statement-timeout", "10s")
+
+        assert err == (
+            "Harlequin’s mysql adapter cannot apply these guards, so they are "
+            + "ignored: statement_timeout.\n"
+        )
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                ["harlequin", "-a", "mysql", "--read-only", "--database", "exampledb"],
+                env=mock.ANY,
+            ),
+        ]
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": "example.db",
+                }
+            }
+        ),
+    )
+    def test_sqlite(self):
+        _, err, _ = call_command(
+            "--lock-timeout", "1500", "--read-only", "--work-mem", "64MB"
+        )
+
+        assert err == (
+            "Harlequin’s sqlite adapter cannot apply these guards, so they are "
+            + "ignored: work_mem.\n"
+        )
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                [
+                    "harlequin",
+                    "-a",
+                    "sqlite",
+                    "--lock-timeout",
+                    "1.5",
+                    "--read-only",
+                    "--init-path",
+                    str(self.cache_dir / "sqlite" / "mmap.sql"),
+                    Path("example.db").resolve().as_uri() + "?mode=ro",
+                ],
+                env=mock.ANY,
+            ),
+        ]
+
+    @mock.patch.object(harlequin_command.Command, "write_launcher_spec", True)
+    def test_options_skip_launcher_spec(self):
+        call_command("--read-only")
+
+        assert launcher.read_spec("tests.settings", "default") is None
+
+    @mock.patch.object(harlequin_command.Command, "write_launcher_spec", True)
+    def test_settings_cached_in_launcher_spec(self):
+        # override_settings() would hide settings.SETTINGS_MODULE.
+        with mock.patch.object(
+            settings, "HARLEQUIN_GUARDS", {"default": {"read_only": True}}, create=True
+        ):
+            call_command()
+
+        spec = launcher.read_spec("tests.settings", "default")
+        assert spec is not None
+        assert "--read-only" in spec["command"]
@@ -15,7 +15,7 @@ from django.db.utils import ConnectionHandler
 from django.test import SimpleTestCase
 
 from django_harlequin.management.commands import harlequin as harlequin_command
-from tests.utils import run_command
+from tests.utils import run_command, use_cache_dir
 
 call_command = partial(run_command, "harlequin")
 
@@ -26,6 +26,8 @@ class HarlequinTests(SimpleTestCase):
         self.execvpe_mock = execvpe_mocker.start()
         self.addCleanup(execvpe_mocker.stop)
 
+        use_cache_dir(self)
+
     def test_non_existent_database(self):
         with pytest.raises(CommandError) as excinfo:
             call_command("--database", "nonexistent")
@@ -336,6 +338,175 @@ class HarlequinTests(SimpleTestCase):
             self.execvpe_mock.mock_calls[0].kwargs["env"]["PGPASSWORD"] == "password123"
         )
 
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "HOST": "localhost",
+                    "NAME": "exampledb",
+                    "OPTIONS": {
+                        "application_name": "myapp",
+                        "connect_timeout": 5,
+                        "keepalives": 1,
+                        "keepalives_idle": 30,
+                        "keepalives_count": 3,
+                    },
+                    "PORT": "5433",
+                    "USER": "user",
+                }
+            }
+        ),
+    )
+    def test_postgres_connection_options(self):
+        call_command()
+
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                [
+                    "harlequin",
+                    "-a",
+                    "postgres",
+                    "--user",
+                    "user",
+                    "--host",
+                    "localhost",
+                    "--port",
+                    "5433",
+                    "--dbname",
+                    "exampledb",
+                    "--connect_timeout",
+                    "5",
+                    "keepalives=1 keepalives_idle=30 keepalives_count=3",
+                ],
+                env=mock.ANY,
+            ),
+        ]
+        assert self.execvpe_mock.mock_calls[0].kwargs["env"]["PGAPPNAME"] == "myapp"
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "HOST": "localhost",
+                    "NAME": "exampledb",
+                    "OPTIONS": {
+                        "application_name": "myapp",
+                        "connect_timeout": 5,
+                        "keepalives": 1,
+                        "keepalives_idle": 30,
+                        "keepalives_count": 3,
+                    },
+                    "PORT": "5433",
+                    "USER": "user",
+                }
+            }
+        ),
+    )
+    def test_postgres_connection_options_conninfo(self):
+        call_command("--", "keepalives_idle=60 sslmode=require", "--theme", "monokai")
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[-3:] == [
+            "keepalives_idle=60 sslmode=require keepalives=1 keepalives_count=3",
+            "--theme",
+            "monokai",
+        ]
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "HOST": "primary.example.com, replica.example.com",
+                    "NAME": "exampledb",
+                    "OPTIONS": {
+                        "target_session_attrs": "prefer-standby",
+                        "load_balance_hosts": "random",
+                    },
+                    "PORT": "5432, 5433",
+                }
+            }
+        ),
+    )
+    def test_postgres_multiple_hosts(self):
+        call_command()
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[3:7] == [
+            "--host",
+            "primary.example.com,replica.example.com",
+            "--port",
+            "5432,5433",
+        ]
+        env = self.execvpe_mock.mock_calls[0].kwargs["env"]
+        assert env["PGTARGETSESSIONATTRS"] == "prefer-standby"
+        assert env["PGLOADBALANCEHOSTS"] == "random"
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "NAME": "exampledb",
+                    "OPTIONS": {
+                        "pool": {"min_size": 2, "max_size": 4, "timeout": 7.5},
+                    },
+                }
+            }
+        ),
+    )
+    def test_postgres_pool_timeout_ignored(self):
+        call_command()
+
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                [
+                    "harlequin",
+                    "-a",
+                    "postgres",
+                    "--dbname",
+                    "exampledb",
+                ],
+                env=mock.ANY,
+            ),
+        ]
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "NAME": "exampledb",
+                    "OPTIONS": {"pool": True},
+                }
+            }
+        ),
+    )
+    def test_postgres_pool_default(self):
+        call_command()
+
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                ["harlequin", "-a", "postgres", "--dbname", "exampledb"],
+                env=mock.ANY,
+            ),
+        ]
+
     def test_upstream_postgres_client_expected_source(self):
         """
         Monitor this upstream module for relevant changes.
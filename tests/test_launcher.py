@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import json
+import os
+import runpy
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, override_settings
+
+from django_harlequin import launcher, profiles
+from django_harlequin.management.commands import harlequin as harlequin_command
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+POSTGRES_DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.postgresql",
+        "HOST": "localhost",
+        "NAME": "exampledb",
+        "PASSWORD": "password123",
+        "PORT": "5433",
+        "USER": "user",
+    }
+}
+
+
+class LauncherTests(SimpleTestCase):
+    def setUp(self):
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        use_cache_dir(self)
+        env_mocker = mock.patch.dict(
+            os.environ, {"DJANGO_SETTINGS_MODULE": "tests.settings"}
+        )
+        env_mocker.start()
+        self.addCleanup(env_mocker.stop)
+
+    def test_cache_miss_runs_command(self):
+        launcher.main([])
+
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                ["harlequin", "-a", "sqlite", connection.settings_dict["NAME"]],
+                env=mock.ANY,
+            ),
+        ]
+        assert launcher.read_spec("tests.settings", "default") is not None
+
+    def test_cache_hit_skips_setup(self):
+        launcher.main([])
+        self.execvpe_mock.reset_mock()
+
+        with (
+            mock.patch("django.setup") as setup_mock,
+            mock.patch("django.core.management.call_command") as call_command_mock,
+        ):
+            launcher.main(["--", "--theme", "monokai"])
+
+        assert setup_mock.mock_calls == []
+        assert call_command_mock.mock_calls == []
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                [
+                    "harlequin",
+                    "-a",
+                    "sqlite",
+                    connection.settings_dict["NAME"],
+                    "--theme",
+                    "monokai",
+                ],
+                env=mock.ANY,
+            ),
+        ]
+
+    def test_command_skips_spec(self):
+        call_command()
+
+        assert launcher.read_spec("tests.settings", "default") is None
+
+    def test_main_module(self):
+        with (
+            mock.patch.object(launcher, "main", return_value=0) as main_mock,
+            pytest.raises(SystemExit) as excinfo,
+        ):
+            runpy.run_module("django_harlequin", run_name="__main__")
+
+        assert main_mock.mock_calls == [mock.call()]
+        assert excinfo.value.code == 0
+
+    def test_settings_option(self):
+        del os.environ["DJANGO_SETTINGS_MODULE"]
+
+        launcher.main(["--settings", "tests.settings"])
+
+        assert os.environ["DJANGO_SETTINGS_MODULE"] == "tests.settings"
+        assert len(self.execvpe_mock.mock_calls) == 1
+
+    def test_no_settings_module(self):
+        del os.environ["DJANGO_SETTINGS_MODULE"]
+
+        with (
+            mock.patch("sys.stderr"),
+            pytest.raises(SystemExit) as excinfo,
+        ):
+            launcher.main([])
+
+        assert excinfo.value.code == 2
+
+    def test_stale_spec(self):
+        launcher.main([])
+        key = launcher.settings_key("tests.settings")
+        assert key is not None
+        path = launcher.spec_path(key, "default")
+        spec = json.loads(path.read_text())
+        spec["key"]["mtime_ns"] -= 1
+        path.write_text(json.dumps(spec))
+
+        assert launcher.read_spec("tests.settings", "default") is None
+
+    def test_harlequin_config_changed(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        config_path = Path(tmpdir.name) / "harlequin.toml"
+        paths_mocker = mock.patch.object(
+            profiles, "harlequin_config_paths", return_value=[config_path]
+        )
+        paths_mocker.start()
+        self.addCleanup(paths_mocker.stop)
+
+        command = ["harlequin", "--config-path", "config.toml"]
+        launcher.write_spec("tests.settings", "default", command, {})
+        assert launcher.read_spec("tests.settings", "default") is not None
+
+        config_path.write_text('default_profile = "work"\n')
+
+        assert launcher.read_spec("tests.settings", "default") is None
+
+    def test_corrupt_spec(self):
+        launcher.main([])
+        key = launcher.settings_key("tests.settings")
+        assert key is not None
+        launcher.spec_path(key, "default").write_text("{")
+
+        assert launcher.read_spec("tests.settings", "default") is None
+
+    def test_unknown_settings_module(self):
+        assert launcher.settings_key("tests.nonexistent") is None
+        assert launcher.settings_key("nonexistent.settings") is None
+        assert launcher.read_spec("tests.nonexistent", "default") is None
+
+    def test_spec_is_private(self):
+        launcher.main([])
+        key = launcher.settings_key("tests.settings")
+        assert key is not None
+
+        assert launcher.spec_path(key, "default").stat().st_mode & 0o777 == 0o600
+
+    @mock.patch.object(
+        harlequin_command, "connections", ConnectionHandler(POSTGRES_DATABASES)
+    )
+    def test_secrets_not_cached(self):
+        launcher.main([])
+        self.execvpe_mock.reset_mock()
+
+        key = launcher.settings_key("tests.settings")
+        assert key is not None
+        content = launcher.spec_path(key, "default").read_text()
+        assert "password123" not in content
+
+        with (
+            pytest.warns(UserWarning, match="Overriding setting DATABASES"),
+            override_settings(DATABASES=POSTGRES_DATABASES),
+            mock.patch("django.setup") as setup_mock,
+        ):
+            launcher.main([])
+
+        assert setup_mock.mock_calls == []
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                [
+                    "harlequin",
+                    "-a",
+                    "postgres",
+                    "--user",
+                    "user",
+                    "--host",
+                    "localhost",
+                    "--port",
+                    "5433",
+                    "--dbname",
+                    "exampledb",
+                ],
+                env=mock.ANY,
+            ),
+        ]
+        assert (
+            self.execvpe_mock.mock_calls[0].kwargs["env"]["PGPASSWORD"] == "password123"
+        )
+
+
+class ExtendParametersTests(SimpleTestCase):
+    command = ["harlequin", "-a", "postgres", "--dbname", "db", "keepalives=1"]
+
+    def test_no_conninfo(self):
+        command = self.command[:]
+
+        launcher.extend_parameters(command, ["--theme", "monokai"])
+
+        assert command == [*self.command, "--theme", "monokai"]
+
+    def test_other_adapter(self):
+        command = ["harlequin", "-a", "sqlite", "db.sqlite3"]
+
+        launcher.extend_parameters(command, ["a=b"])
+
+        assert command == ["harlequin", "-a", "sqlite", "db.sqlite3", "a=b"]
+
+    def test_keywords(self):
+        command = [*self.command[:-1], "keepalives=1 keepalives_idle=30"]
+
+        launcher.extend_parameters(
+            command, ["--theme", "monokai", "application_name='my app' keepalives=0"]
+        )
+
+        assert command == [
+            *self.command[:-1],
+            "--theme",
+            "monokai",
+            "application_name='my app' keepalives=0 keepalives_idle=30",
+        ]
+
+    def test_keywords_all_set(self):
+        command = self.command[:]
+
+        launcher.extend_parameters(command, ["keepalives=0"])
+
+        assert command == [*self.command[:-1], "keepalives=0"]
+
+    def test_uri(self):
+        command = self.command[:]
+
+        launcher.extend_parameters(command, ["postgresql://host/db"])
+
+        assert command == [*self.command[:-1], "postgresql://host/db?keepalives=1"]
+
+    def test_uri_query(self):
+        command = self.command[:]
+
+        launcher.extend_parameters(command, ["postgres://host/db?sslmode=require"])
+
+        assert command == [
+            *self.command[:-1],
+            "postgres://host/db?sslmode=require&keepalives=1",
+        ]
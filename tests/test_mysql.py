@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from django_harlequin.management.commands import harlequin as harlequin_command
+from django_harlequin.mysql import read_option_file
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class ReadOptionFileTests(SimpleTestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = Path(tmpdir.name) / "my.cnf"
+
+    def test_client(self):
+        self.path.write_text(
+            "!includedir /etc/mysql/conf.d/\n"
+            + "[client]\n"
+            + "host = db.example.com\n"
+            + "user = app  # inline comment\n"
+            + 'password = "p@ss word"\n'
+            + "default-character-set = utf8mb4\n"
+            + "[mysqld]\n"
+            + "port = 3307\n"
+        )
+
+        assert read_option_file(str(self.path), None) == {
+            "host": "db.example.com",
+            "user": "app",
+            "password": "p@ss word",
+        }
+
+    def test_group(self):
+        self.path.write_text(
+            "[client]\n"
+            + "host = db.example.com\n"
+            + "user = app\n"
+            + "[reporting]\n"
+            + "user = reporter\n"
+            + "database = reports\n"
+            + "unix-socket = /ignored\n"
+            + "socket = /run/mysqld/mysqld.sock\n"
+        )
+
+        assert read_option_file(str(self.path), "reporting") == {
+            "host": "db.example.com",
+            "user": "reporter",
+            "database": "reports",
+            "socket": "/run/mysqld/mysqld.sock",
+        }
+
+    def test_missing_group(self):
+        self.path.write_text("[client]\nuser = app\n")
+
+        assert read_option_file(str(self.path), "other") == {"user": "app"}
+
+    def test_missing_file(self):
+        assert read_option_file(str(self.path), None) == {}
+
+    def test_invalid_file(self):
+        self.path.write_text("user = app\n")
+
+        assert read_option_file(str(self.path), None) == {}
+
+
+class MySQLCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def run_with(
+        self, settings: dict[str, object], *args: str
+    ) -> tuple[list[str], str]:
+        connections = ConnectionHandler(
+            {"default": {"ENGINE": "django.db.backends.mysql", **settings}}
+        )
+        with mock.patch.object(harlequin_command, "connections", connections):
+            _, err, _ = call_command(*args)
+        return self.execvpe_mock.mock_calls[0].args[1], err
+
+    def test_unix_socket(self):
+        command, _ = self.run_with(
+            {
+                "NAME": "exampledb",
+                "HOST": "localhost",
+                "PORT": "3306",
+                "OPTIONS": {"unix_socket": "/run/mysqld/mysqld.sock"},
+            }
+        )
+
+        assert command == [
+            "harlequin",
+            "-a",
+            "mysql",
+            "--database",
+            "exampledb",
+            "--unix_socket",
+            "/run/mysqld/mysqld.sock",
+        ]
+
+    def test_host_socket_path(self):
+        command, _ = self.run_with(
+            {"NAME": "exampledb", "HOST": "/run/mysqld/mysqld.sock"}
+        )
+
+        assert command[-2:] == ["--unix_socket", "/run/mysqld/mysqld.sock"]
+
+    def test_connect_timeout(self):
+        command, _ = self.run_with(
+            {
+                "NAME": "exampledb",
+                "HOST": "db.example.com",
+                "PORT": 3306,
+                "OPTIONS": {"connect_timeout": 5},
+            }
+        )
+
+        assert command[-6:] == [
+            "--host",
+            "db.example.com",
+            "--port",
+            "3306",
+            "--connect_timeout",
+            "5",
+        ]
+
+    def test_compress(self):
+        _, err = self.run_with(
+            {"NAME": "exampledb", "HOST": "db", "OPTIONS": {"compress": True}}
+        )
+
+        assert err == (
+            "Harlequin’s mysql adapter cannot enable protocol compression, so the "
+            + "compress option is ignored.\n"
+        )
+
+    def test_compress_quiet(self):
+        _, err = self.run_with(
+            {"NAME": "exampledb", "HOST": "db", "OPTIONS": {"compress": True}},
+            "--verbosity",
+            "0",
+        )
+
+        assert err == ""
+
+    def test_read_default_file_socket(self):
+        path = self.cache_dir / "my.cnf"
+        path.write_text("[client]\nsocket = /run/mysqld/mysqld.sock\n")
+
+        command, _ = self.run_with(
+            {"NAME": "exampledb", "OPTIONS": {"read_default_file": str(path)}}
+        )
+
+        assert command[-2:] == ["--unix_socket", "/run/mysqld/mysqld.sock"]
+
+    def test_read_default_file_socket_host(self):
+        path = self.cache_dir / "my.cnf"
+        path.write_text("[client]\nsocket = /run/mysqld/mysqld.sock\n")
+
+        command, _ = self.run_with(
+            {
+                "NAME": "exampledb",
+                "HOST": "db.example.com",
+                "PORT": 3306,
+                "OPTIONS": {"read_default_file": str(path)},
+            }
+        )
+
+        assert command[-4:] == ["--host", "db.example.com", "--port", "3306"]
+
+    def test_read_default_file(self):
+        path = self.cache_dir / "my.cnf"
+        path.write_text(
+            "[client]\n"
+            + "host = db.example.com\n"
+            + "user = app\n"
+            + "password = secret\n"
+            + "database = fromfile\n"
+            + "port = 3307\n"
+            + "[reporting]\n"
+            + "user = reporter\n"
+        )
+
+        command, _ = self.run_with(
+            {
+                "NAME": "exampledb",
+                "OPTIONS": {
+                    "read_default_file": str(path),
+                    "read_default_group": "reporting",
+                },
+            }
+        )
+
+        assert command == [
+            "harlequin",
+            "-a",
+            "mysql",
+            "--database",
+            "exampledb",
+            "--user",
+            "reporter",
+            "--password",
+            "secret",
+            "--host",
+            "db.example.com",
+            "--port",
+            "3307",
+        ]
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from decimal import Decimal
+from functools import partial
+from typing import Any
+from unittest import mock
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from django.core.management.base import CommandError
+from django.db import connection, models
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import isolate_apps
+
+from django_harlequin import parquet
+from django_harlequin.parquet import arrow_converter, arrow_type
+from tests.testapp.models import Author, Book, Tag
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class ArrowTypeTests(SimpleTestCase):
+    @isolate_apps("tests.testapp")
+    def test_types(self):
+        class Everything(models.Model):
+            big: models.BigIntegerField[int, int] = models.BigIntegerField()
+            small: models.SmallIntegerField[int, int] = models.SmallIntegerField()
+            positive: models.PositiveIntegerField[int, int] = (
+                models.PositiveIntegerField()
+            )
+            flag: models.BooleanField[bool, bool] = models.BooleanField()
+            ratio: models.FloatField[float, float] = models.FloatField()
+            amount: models.DecimalField[Decimal, Decimal] = models.DecimalField(
+                max_digits=8, decimal_places=3
+            )
+            created: models.DateTimeField[dt.datetime, dt.datetime] = (
+                models.DateTimeField()
+            )
+            day: models.DateField[dt.date, dt.date] = models.DateField()
+            at: models.TimeField[dt.time, dt.time] = models.TimeField()
+            took: models.DurationField[dt.timedelta, dt.timedelta] = (
+                models.DurationField()
+            )
+            data: models.BinaryField[bytes, bytes | memoryview] = models.BinaryField()
+            text: models.TextField[str, str] = models.TextField()
+            uuid: models.UUIDField[uuid.UUID, uuid.UUID] = models.UUIDField()
+            extra = models.JSONField()
+            author: models.ForeignKey[Author] = models.ForeignKey(
+                Author, on_delete=models.CASCADE
+            )
+
+            class Meta:
+                app_label = "testapp"
+
+        types = {
+            field.name: arrow_type(field, pa)
+            for field in Everything._meta.local_concrete_fields
+        }
+
+        assert types == {
+            "id": pa.int32(),
+            "big": pa.int64(),
+            "small": pa.int16(),
+            "positive": pa.int64(),
+            "flag": pa.bool_(),
+            "ratio": pa.float64(),
+            "amount": pa.decimal128(8, 3),
+            "created": pa.timestamp("us", tz="UTC"),
+            "day": pa.date32(),
+            "at": pa.time64("us"),
+            "took": pa.duration("us"),
+            "data": pa.binary(),
+            "text": pa.string(),
+            "uuid": pa.string(),
+            "extra": pa.string(),
+            "author": pa.int32(),
+        }
+
+    @override_settings(USE_TZ=False)
+    def test_naive_datetime(self):
+        assert arrow_type(models.DateTimeField(), pa) == pa.timestamp("us")
+
+
+class ArrowConverterTests(SimpleTestCase):
+    def test_converters(self):
+        uuid_converter = arrow_converter(models.UUIDField())
+        json_converter = arrow_converter(models.JSONField())
+        binary_converter = arrow_converter(models.BinaryField())
+
+        assert uuid_converter is not None
+        assert json_converter is not None
+        assert binary_converter is not None
+        assert arrow_converter(models.TextField()) is None
+        assert arrow_converter(Book._meta.local_concrete_fields[1]) is None
+        assert uuid_converter(None) is None
+        assert json_converter({"a": 1}) == '{"a": 1}'
+        assert json_converter(None) is None
+        assert binary_converter(memoryview(b"x")) == b"x"
+        assert binary_converter(None) is None
+
+
+class ParquetTestCase(TestCase):
+    def setUp(self) -> None:
+        self.cache_dir = use_cache_dir(self)
+
+
+class ExportModelTests(ParquetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ada = Author.objects.create(name="Ada", email="ada@example.com")
+        Book.objects.create(
+            author=ada,
+            title="Notes",
+            published=dt.date(1843, 10, 1),
+            price=Decimal("9.99"),
+            metadata={"a": 1},
+        )
+        Book.objects.create(author=ada, title="Letters")
+
+    def test_export(self):
+        path, count = parquet.export_model(
+            "default", "testapp.Book", str(self.cache_dir)
+        )
+
+        assert count == 2
+        assert path == str(self.cache_dir / "testapp_book.parquet")
+        table = pq.read_table(path)
+        assert table.column_names == [
+            "id",
+            "author_id",
+            "title",
+            "published",
+            "pages",
+            "price",
+            "metadata",
+        ]
+        rows = sorted(table.to_pylist(), key=lambda row: row["title"])
+        assert rows[1]["title"] == "Notes"
+        assert rows[1]["published"] == dt.date(1843, 10, 1)
+        assert rows[1]["price"] == Decimal("9.99")
+        assert rows[1]["metadata"] == '{"a": 1}'
+        assert rows[0]["published"] is None
+        assert list(self.cache_dir.iterdir()) == [
+            self.cache_dir / "testapp_book.parquet"
+        ]
+
+    def test_row_groups(self):
+        with mock.patch.object(parquet, "ROW_GROUP_SIZE", 1):
+            path, _ = parquet.export_model(
+                "default", "testapp.Book", str(self.cache_dir)
+            )
+
+        assert pq.ParquetFile(path).num_row_groups == 2
+
+    def test_empty(self):
+        path, count = parquet.export_model(
+            "default", "testapp.Tag", str(self.cache_dir)
+        )
+
+        assert count == 0
+        assert pq.read_table(path).num_rows == 0
+
+    def test_uuid(self):
+        path, _ = parquet.export_model("default", "testapp.Author", str(self.cache_dir))
+
+        (row,) = pq.read_table(path).to_pylist()
+        assert row["uuid"] == str(Author.objects.get().uuid)
+
+
+class ExportParquetTests(ParquetTestCase):
+    def test_export(self):
+        Tag.objects.create(name="python")
+        messages: list[str] = []
+
+        init_path = parquet.export_parquet(
+            connection, ["testapp.Tag", "testapp.Author"], messages.append
+        )
+
+        directory = self.cache_dir / "parquet" / "default"
+        assert init_path == directory / "init.sql"
+        assert init_path.read_text() == (
+            'CREATE OR REPLACE VIEW "testapp_tag" AS SELECT * FROM '
+            + f"read_parquet('{directory / 'testapp_tag.parquet'}');\n"
+            + 'CREATE OR REPLACE VIEW "testapp_author" AS SELECT * FROM '
+            + f"read_parquet('{directory / 'testapp_author.parquet'}');\n"
+        )
+        assert messages == [
+            "Exported 1 rows from testapp_tag.",
+            "Exported 0 rows from testapp_author.",
+        ]
+
+    def test_large_tables_in_pool(self):
+        Tag.objects.create(name="python")
+
+        # Threads would need their own connections, and processes would need
+        # a database, so run the "parallel" exports inline.
+        class InlineExecutor(ThreadPoolExecutor):
+            def __init__(self, **kwargs: Any) -> None:
+                super().__init__(max_workers=1)
+
+            def submit(self, fn: Any, /, *args: Any, **kwargs: Any) -> Any:
+                future: Future[Any] = Future()
+                future.set_result(fn(*args, **kwargs))
+                return future
+
+        with (
+            mock.patch.object(
+                parquet, "row_estimates", return_value={"testapp_tag": 10**6}
+            ),
+            mock.patch.object(parquet, "ProcessPoolExecutor", InlineExecutor),
+        ):
+            parquet.export_parquet(
+                connection, ["testapp.Tag", "testapp.Author"], lambda message: None
+            )
+
+        directory = self.cache_dir / "parquet" / "default"
+        assert pq.read_table(directory / "testapp_tag.parquet").num_rows == 1
+        assert pq.read_table(directory / "testapp_author.parquet").num_rows == 0
+
+    def test_unknown_model(self):
+        with pytest.raises(CommandError) as excinfo:
+            parquet.export_parquet(connection, ["testapp.Missing"], lambda m: None)
+
+        assert excinfo.value.args[0] == "Unknown model 'testapp.Missing'."
+
+    def test_missing_pyarrow(self):
+        with (
+            mock.patch.dict("sys.modules", {"pyarrow": None}),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            parquet.export_parquet(connection, ["testapp.Tag"], lambda m: None)
+
+        assert excinfo.value.args[0] == (
+            "--parquet requires pyarrow. Install it with: "
+            + "python -m pip install 'django-harlequin[parquet]'"
+        )
+
+
+class ParquetCommandTests(ParquetTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+    def test_parquet(self):
+        _, err, _ = call_command("--parquet", "testapp.Tag")
+
+        init_path = self.cache_dir / "parquet" / "default" / "init.sql"
+        assert err == "Exported 0 rows from testapp_tag.\n"
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                [
+                    "harlequin",
+                    "-a",
+                    "duckdb",
+                    "--init-path",
+                    str(init_path),
+                    ":memory:",
+                ],
+                env=mock.ANY,
+            ),
+        ]
+
+    def test_parquet_quiet(self):
+        _, err, _ = call_command("--parquet", "testapp.Tag", "--verbosity", "0")
+
+        assert err == ""
+
+    def test_parquet_with_sample(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("--parquet", "testapp.Tag", "--sample", "1%")
+
+        assert excinfo.value.args[0] == (
+            "--parquet cannot be combined with --snapshot or --sample."
+        )
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+
+from django_harlequin import profiles
+from django_harlequin.profiles import (
+    config_toml,
+    default_profile,
+    extend_command,
+    get_profile,
+    harlequin_config_paths,
+    toml_value,
+)
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+def ignore_user_config(test: SimpleTestCase) -> None:
+    """
+    Keep Harlequin config files on the machine running the tests out of them.
+    """
+    mocker = mock.patch.object(profiles, "harlequin_config_paths", return_value=[])
+    mocker.start()
+    test.addCleanup(mocker.stop)
+
+
+PROFILES = {
+    "default": {"limit": 10_000, "read_only": True, "theme": "github-dark"},
+    "replica": {"read_only": True},
+}
+
+
+class GetProfileTests(SimpleTestCase):
+    def test_none(self):
+        assert get_profile("default") == {}
+
+    @override_settings(HARLEQUIN_PROFILES=PROFILES)
+    def test_settings(self):
+        assert get_profile("replica") == {"read_only": True}
+
+    @override_settings(HARLEQUIN_PROFILES={"default": {"limt": 10}})
+    def test_unknown(self):
+        with pytest.raises(CommandError) as excinfo:
+            get_profile("default")
+
+        assert excinfo.value.args[0] == (
+            "Unknown HARLEQUIN_PROFILES option for 'default': limt."
+        )
+
+
+class HarlequinConfigPathsTests(SimpleTestCase):
+    def test_linux(self):
+        with (
+            mock.patch.object(sys, "platform", "linux"),
+            mock.patch.dict(os.environ, {"XDG_CONFIG_HOME": "/config"}),
+            mock.patch.object(Path, "cwd", return_value=Path("/project")),
+            mock.patch.object(Path, "home", return_value=Path("/home/user")),
+        ):
+            paths = harlequin_config_paths()
+
+        assert paths == [
+            Path("/project/harlequin.toml"),
+            Path("/project/.harlequin.toml"),
+            Path("/project/pyproject.toml"),
+            Path("/config/harlequin/harlequin.toml"),
+            Path("/config/harlequin/.harlequin.toml"),
+            Path("/config/harlequin/config.toml"),
+            Path("/home/user/harlequin.toml"),
+            Path("/home/user/.harlequin.toml"),
+            Path("/home/user/pyproject.toml"),
+        ]
+
+    def test_linux_default(self):
+        with (
+            mock.patch.object(sys, "platform", "linux"),
+            mock.patch.dict(os.environ, {"XDG_CONFIG_HOME": ""}),
+            mock.patch.object(Path, "home", return_value=Path("/home/user")),
+        ):
+            paths = harlequin_config_paths()
+
+        assert paths[3] == Path("/home/user/.config/harlequin/harlequin.toml")
+
+    def test_macos(self):
+        with (
+            mock.patch.object(sys, "platform", "darwin"),
+            mock.patch.object(Path, "home", return_value=Path("/Users/user")),
+        ):
+            paths = harlequin_config_paths()
+
+        assert paths[3] == Path(
+            "/Users/user/Library/Application Support/harlequin/harlequin.toml"
+        )
+
+    def test_windows(self):
+        with (
+            mock.patch.object(sys, "platform", "win32"),
+            mock.patch.dict(os.environ, {"LOCALAPPDATA": "/local"}),
+        ):
+            paths = harlequin_config_paths()
+
+        assert paths[3] == Path("/local/harlequin/harlequin.toml")
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="Needs tomllib.")
+class DefaultProfileTests(SimpleTestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = Path(tmpdir.name)
+        (self.tmpdir / "project").mkdir()
+        (self.tmpdir / "config" / "harlequin").mkdir(parents=True)
+        (self.tmpdir / "home").mkdir()
+        platform_mocker = mock.patch.object(sys, "platform", "linux")
+        platform_mocker.start()
+        self.addCleanup(platform_mocker.stop)
+        env_mocker = mock.patch.dict(
+            os.environ, {"XDG_CONFIG_HOME": str(self.tmpdir / "config")}
+        )
+        env_mocker.start()
+        self.addCleanup(env_mocker.stop)
+        cwd_mocker = mock.patch.object(
+            Path, "cwd", return_value=self.tmpdir / "project"
+        )
+        cwd_mocker.start()
+        self.addCleanup(cwd_mocker.stop)
+        home_mocker = mock.patch.object(Path, "home", return_value=self.tmpdir / "home")
+        home_mocker.start()
+        self.addCleanup(home_mocker.stop)
+
+    def test_merged(self):
+        (self.tmpdir / "project" / "pyproject.toml").write_text(
+            '[tool.harlequin]\ndefault_profile = "work"\n'
+        )
+        (self.tmpdir / "project" / ".harlequin.toml").write_text("[unclosed\n")
+        (self.tmpdir / "config" / "harlequin" / "config.toml").write_text(
+            "[profiles.work]\n"
+            + 'adapter = "postgres"\n'
+            + 'conn_str = ["postgresql://elsewhere"]\n'
+            + 'keymap_name = ["vscode"]\n'
+            + "limit = 500\n"
+            + 'show_files = "."\n'
+            + 'theme = "nord"\n'
+        )
+        (self.tmpdir / "home" / "harlequin.toml").write_text(
+            'default_profile = "other"\n\n[profiles.work]\ntheme = "ignored"\n'
+        )
+        (self.tmpdir / "home" / "pyproject.toml").write_text("[tool.black]\n")
+
+        assert default_profile() == {
+            "keymap_name": ["vscode"],
+            "limit": 500,
+            "show_files": ".",
+            "theme": "nord",
+        }
+
+    def test_no_default_profile(self):
+        (self.tmpdir / "home" / "harlequin.toml").write_text(
+            '[profiles.work]\ntheme = "nord"\n'
+        )
+
+        assert default_profile() == {}
+
+    def test_missing_profile(self):
+        (self.tmpdir / "home" / "harlequin.toml").write_text(
+            'default_profile = "work"\n'
+        )
+
+        assert default_profile() == {}
+
+
+class TomlValueTests(SimpleTestCase):
+    def test_values(self):
+        assert toml_value(True) == "true"
+        assert toml_value(False) == "false"
+        assert toml_value(5) == "5"
+        assert toml_value(0.5) == "0.5"
+        assert toml_value(["a", 1]) == '["a", 1]'
+        assert toml_value('say "hi"') == '"say \\"hi\\""'
+
+
+class ConfigTomlTests(SimpleTestCase):
+    def setUp(self) -> None:
+        ignore_user_config(self)
+
+    @override_settings(HARLEQUIN_PROFILES=PROFILES)
+    def test_config(self):
+        assert config_toml() == (
+            "# Generated by django-harlequin from HARLEQUIN_PROFILES.\n"
+            + "\n"
+            + '[profiles."django-default"]\n'
+            + "limit = 10000\n"
+            + 'theme = "github-dark"\n'
+            + "\n"
+            + '[profiles."django-replica"]\n'
+        )
+
+    @override_settings(HARLEQUIN_PROFILES={"default": {"theme": 'say "hi"'}})
+    def test_quoting(self):
+        assert config_toml().endswith('theme = "say \\"hi\\""\n')
+
+    @override_settings(HARLEQUIN_PROFILES=PROFILES)
+    def test_inherited(self):
+        inherited = {"keymap_name": ["vscode"], "limit": 500, "theme": "nord"}
+
+        with mock.patch.object(profiles, "default_profile", return_value=inherited):
+            toml = config_toml()
+
+        assert toml == (
+            "# Generated by django-harlequin from HARLEQUIN_PROFILES.\n"
+            + "\n"
+            + '[profiles."django-default"]\n'
+            + 'keymap_name = ["vscode"]\n'
+            + "limit = 10000\n"
+            + 'theme = "github-dark"\n'
+            + "\n"
+            + '[profiles."django-replica"]\n'
+            + 'keymap_name = ["vscode"]\n'
+            + "limit = 500\n"
+            + 'theme = "nord"\n'
+        )
+
+
+class ExtendCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.cache_dir = use_cache_dir(self)
+        ignore_user_config(self)
+
+    @override_settings(HARLEQUIN_PROFILES=PROFILES)
+    def test_profile(self):
+        command = ["harlequin"]
+
+        extend_command("default", command)
+
+        path = self.cache_dir / "harlequin" / "config.toml"
+        assert command == [
+            "harlequin",
+            "--config-path",
+            str(path),
+            "--profile",
+            "django-default",
+        ]
+        assert path.stat().st_mode & 0o777 == 0o600
+
+    @override_settings(HARLEQUIN_PROFILES=PROFILES)
+    def test_no_config_options(self):
+        command = ["harlequin"]
+
+        extend_command("replica", command)
+
+        assert command == ["harlequin"]
+        assert not (self.cache_dir / "harlequin").exists()
+
+
+class ProfilesCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+        ignore_user_config(self)
+
+    @override_settings(HARLEQUIN_PROFILES=PROFILES)
+    def test_profile(self):
+        call_command("--", "--limit", "5")
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[:3] == ["harlequin", "-a", "sqlite"]
+        assert command[-6:] == [
+            "--config-path",
+            str(self.cache_dir / "harlequin" / "config.toml"),
+            "--profile",
+            "django-default",
+            "--limit",
+            "5",
+        ]
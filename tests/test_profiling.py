@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from django_harlequin.profiling import (
+    TRACE_ENV,
+    NullProfiler,
+    Profiler,
+    now_us,
+    process_start_us,
+)
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class ProcessStartTests(SimpleTestCase):
+    def test_before_now(self):
+        started = process_start_us()
+
+        assert started is not None
+        assert 0 < started <= now_us()
+
+
+class ProfilerTests(SimpleTestCase):
+    def test_span(self):
+        profiler = Profiler()
+
+        with profiler.span("phase", alias="default"):
+            pass
+
+        (event,) = profiler.events
+        assert event["name"] == "phase"
+        assert event["ph"] == "X"
+        assert event["dur"] >= 0
+        assert event["pid"] == os.getpid()
+        assert event["args"] == {"alias": "default"}
+
+    def test_write(self):
+        profiler = Profiler()
+        profiler.add("phase", 1.0, 3.0)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "trace.json"
+            profiler.write(path, "harlequin")
+            trace = json.loads(path.read_text())
+
+        assert trace["displayTimeUnit"] == "ms"
+        first, last = trace["traceEvents"]
+        assert first["dur"] == 2.0
+        assert last["name"] == "execvpe"
+        assert last["ph"] == "i"
+        assert last["args"] == {"command": "harlequin"}
+
+    def test_null(self):
+        profiler = NullProfiler()
+
+        with profiler.span("phase"):
+            pass
+
+        assert profiler.events == []
+
+
+class ProfileCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_profile(self):
+        path = self.cache_dir / "trace.json"
+
+        _, err, _ = call_command("--profile", str(path))
+
+        assert err == f"Profile written to {path}.\n"
+        names = [event["name"] for event in json.loads(path.read_text())["traceEvents"]]
+        assert names == [
+            "startup",
+            "resolve settings",
+            "execvpe",
+        ]
+        env = self.execvpe_mock.mock_calls[0].kwargs["env"]
+        assert env[TRACE_ENV] == str(path)
+
+    def test_profile_default_path(self):
+        _, err, _ = call_command("--profile", "--verbosity", "0")
+
+        assert err == ""
+        (path,) = (self.cache_dir / "profiles").iterdir()
+        env = self.execvpe_mock.mock_calls[0].kwargs["env"]
+        assert env[TRACE_ENV] == str(path)
+
+    def test_no_profile(self):
+        call_command()
+
+        env = self.execvpe_mock.mock_calls[0].kwargs["env"]
+        assert TRACE_ENV not in env
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+from functools import partial
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from django_harlequin.querysets import (
+    compile_queryset,
+    evaluate_queryset,
+    queryset_workspace_sql,
+)
+from tests.testapp.models import Book
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+postgres_connection = ConnectionHandler(
+    {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": "exampledb",
+        }
+    }
+)["default"]
+
+
+class EvaluateQuerysetTests(SimpleTestCase):
+    def test_model(self):
+        queryset = evaluate_queryset("testapp.Book.objects.filter(pages__gt=10)")
+
+        assert queryset.model is Book
+
+    def test_namespace(self):
+        queryset = evaluate_queryset(
+            "testapp.Author.objects.annotate(n=Count('book')).filter(Q(n__gt=1))"
+        )
+
+        assert "COUNT" in str(queryset.query)
+
+    def test_error(self):
+        with pytest.raises(CommandError) as excinfo:
+            evaluate_queryset("testapp.Missing.objects.all()")
+
+        assert excinfo.value.args[0] == (
+            "Could not evaluate queryset 'testapp.Missing.objects.all()': "
+            + "'types.SimpleNamespace' object has no attribute 'Missing'"
+        )
+
+    def test_not_queryset(self):
+        with pytest.raises(CommandError) as excinfo:
+            evaluate_queryset("testapp.Book.objects.count")
+
+        assert excinfo.value.args[0] == (
+            "Expression 'testapp.Book.objects.count' evaluated to method, "
+            + "not a QuerySet."
+        )
+
+
+class CompileQuerysetTests(SimpleTestCase):
+    def test_sqlite(self):
+        sql = compile_queryset(Book.objects.filter(title="O'Reilly"), connection)
+
+        assert sql.endswith(""" WHERE "testapp_book"."title" = 'O''Reilly'""")
+
+    def test_postgresql(self):
+        sql = compile_queryset(
+            Book.objects.filter(pages__in=[1, 2]), postgres_connection
+        )
+
+        assert sql.endswith(' WHERE "testapp_book"."pages" IN (1, 2)')
+
+    def test_empty(self):
+        with pytest.raises(CommandError) as excinfo:
+            compile_queryset(Book.objects.filter(pk__in=[]), connection)
+
+        assert excinfo.value.args[0] == (
+            "The queryset cannot match any rows, so has no SQL."
+        )
+
+
+class QuerysetWorkspaceSqlTests(SimpleTestCase):
+    def test_sqlite(self):
+        expression = "testapp.Book.objects.filter(pages=1)"
+
+        content = queryset_workspace_sql(expression, connection)
+
+        assert content.startswith(
+            "-- testapp.Book.objects.filter(pages=1)\n"
+            + "-- Compiled for database 'default' (sqlite).\n"
+            + "\n"
+            + "SELECT "
+        )
+        assert content.count('WHERE "testapp_book"."pages" = 1;\n') == 2
+        assert "\nEXPLAIN QUERY PLAN SELECT " in content
+        assert content.endswith(";\n")
+
+    def test_postgresql(self):
+        content = queryset_workspace_sql(
+            "testapp.Book.objects.values('id')", postgres_connection
+        )
+
+        assert "-- EXPLAIN ANALYZE runs the query to measure it.\n" in content
+        assert "\nEXPLAIN (ANALYZE, BUFFERS) SELECT" in content
+
+
+class QuerysetCommandTests(SimpleTestCase):
+    def setUp(self):
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_queryset(self):
+        call_command("--queryset", "testapp.Book.objects.filter(pages__gt=10)")
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        workspace = self.cache_dir / "workspaces" / "default"
+        assert command[-2:] == ["--show-files", str(workspace)]
+        content = (workspace / "queryset" / "queryset.sql").read_text()
+        assert 'WHERE "testapp_book"."pages" > 10;\n' in content
@@ -0,0 +1,580 @@
+from __future__ import annotations
+
+import datetime as dt
+import itertools
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from django_harlequin import replay
+from django_harlequin.replay import (
+    Replayer,
+    history_paths,
+    latency_summary,
+    read_history,
+    read_sql_file,
+)
+from tests.utils import run_command
+
+call_command = partial(run_command, "harlequin_replay")
+
+
+def write_history(path: Path, rows: list[tuple[str, str, str]]) -> None:
+    """
+    Write a query history store as Harlequin 2.14+ does, with rows of adapter,
+    status, and SQL.
+    """
+    db = sqlite3.connect(path)
+    db.executescript(
+        """
+        CREATE TABLE queries (
+          id          integer primary key,
+          run_at      text    not null,
+          program     text    not null,
+          connection  text,
+          profile     text,
+          adapter     text,
+          sql         text    not null,
+          status      text    not null,
+          rows        integer,
+          truncated   integer,
+          elapsed_ms  real,
+          error       text
+        );
+        CREATE INDEX queries_connection_at ON queries (connection, id desc);
+        CREATE TABLE migrated_connections (
+          connection   text primary key,
+          migrated_at  text    not null,
+          records      integer not null
+        );
+        PRAGMA user_version = 2;
+        """
+    )
+    db.executemany(
+        """
+        INSERT INTO queries (run_at, program, connection, adapter, status, sql)
+        VALUES ('2026-10-17T00:00:00+00:00', 'harlequin', 'abc', ?, ?, ?)
+        """,
+        rows,
+    )
+    db.commit()
+    db.close()
+
+
+def harlequin_modules() -> dict[str, ModuleType]:
+    """
+    Stand-ins for the Harlequin modules whose classes its catalog cache
+    pickles, so one can be written without Harlequin installed.
+    """
+    history = ModuleType("harlequin.history")
+    catalog_cache = ModuleType("harlequin.catalog_cache")
+
+    @dataclass
+    class QueryExecution:
+        query_text: str
+        executed_at: dt.datetime
+        result_row_count: int
+        elapsed: float
+
+    @dataclass
+    class History:
+        queries: deque[QueryExecution]
+
+    @dataclass
+    class CatalogCache:
+        databases: dict[str, Any]
+        s3: dict[Any, Any]
+        history: dict[str, History]
+
+    def recursive_dict() -> defaultdict[Any, Any]:
+        return defaultdict(recursive_dict)
+
+    contents: list[tuple[ModuleType, list[Any]]] = [
+        (history, [QueryExecution, History]),
+        (catalog_cache, [CatalogCache, recursive_dict]),
+    ]
+    for module, objects in contents:
+        for obj in objects:
+            obj.__module__ = module.__name__
+            obj.__qualname__ = obj.__name__
+            setattr(module, obj.__name__, obj)
+    return {
+        "harlequin": ModuleType("harlequin"),
+        "harlequin.history": history,
+        "harlequin.catalog_cache": catalog_cache,
+    }
+
+
+def write_history_cache(
+    path: Path, histories: dict[str, list[tuple[str, int]]]
+) -> None:
+    """
+    Write a catalog cache as Harlequin before 2.14 does, with a history of
+    SQL and row counts per connection, oldest first.
+    """
+    modules = harlequin_modules()
+    history = modules["harlequin.history"]
+    catalog_cache = modules["harlequin.catalog_cache"]
+    started = dt.datetime(2026, 10, 17)
+    counter = itertools.count()
+    cache = catalog_cache.CatalogCache(
+        databases={},
+        s3={("bucket", None, None): catalog_cache.recursive_dict()},
+        history={
+            connection: history.History(
+                queries=deque(
+                    [
+                        history.QueryExecution(
+                            query_text=sql,
+                            executed_at=started + dt.timedelta(seconds=next(counter)),
+                            result_row_count=rows,
+                            elapsed=0.1,
+                        )
+                        for sql, rows in executions
+                    ],
+                    maxlen=500,
+                )
+            )
+            for connection, executions in histories.items()
+        },
+    )
+    with mock.patch.dict(sys.modules, modules):
+        path.write_bytes(pickle.dumps(cache))
+
+
+class RunsCommand:
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (os.system, ("false",))
+
+
+class ReadSqlFileTests(SimpleTestCase):
+    def test_statements(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "queries.sql"
+            path.write_text(
+                "-- Tuned.\nSELECT 1;\n\nSELECT ';' AS semicolon;\n-- The end.\n"
+            )
+
+            queries = read_sql_file(path)
+
+        assert queries == ["-- Tuned.\nSELECT 1", "SELECT ';' AS semicolon"]
+
+    def test_missing(self):
+        with pytest.raises(CommandError) as excinfo:
+            read_sql_file(Path("/nonexistent/queries.sql"))
+
+        assert excinfo.value.args[0] == (
+            "Cannot read '/nonexistent/queries.sql': No such file or directory."
+        )
+
+
+class HistoryPathsTests(SimpleTestCase):
+    def test_linux(self):
+        with (
+            mock.patch.object(sys, "platform", "linux"),
+            mock.patch.dict(
+                "os.environ", {"XDG_STATE_HOME": "/state", "XDG_CACHE_HOME": "/cache"}
+            ),
+        ):
+            paths = history_paths()
+
+        assert paths == [
+            Path("/state/harlequin/history.db"),
+            Path("/cache/harlequin/catalog-cache-2.pickle"),
+        ]
+
+    def test_linux_defaults(self):
+        with (
+            mock.patch.object(sys, "platform", "linux"),
+            mock.patch.dict("os.environ", {"XDG_STATE_HOME": "", "XDG_CACHE_HOME": ""}),
+        ):
+            paths = history_paths()
+
+        assert paths == [
+            Path.home() / ".local/state/harlequin/history.db",
+            Path.home() / ".cache/harlequin/catalog-cache-2.pickle",
+        ]
+
+    def test_macos(self):
+        with mock.patch.object(sys, "platform", "darwin"):
+            paths = history_paths()
+
+        assert paths == [
+            Path.home() / "Library/Application Support/harlequin/history.db",
+            Path.home() / "Library/Caches/harlequin/catalog-cache-2.pickle",
+        ]
+
+    def test_windows(self):
+        with (
+            mock.patch.object(sys, "platform", "win32"),
+            mock.patch.dict("os.environ", {"LOCALAPPDATA": "/local"}),
+        ):
+            paths = history_paths()
+
+        assert paths == [
+            Path("/local/harlequin/harlequin/history.db"),
+            Path("/local/harlequin/harlequin/Cache/catalog-cache-2.pickle"),
+        ]
+
+
+class ReadHistoryTests(SimpleTestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.store = Path(tmpdir.name) / "history.db"
+        self.cache = Path(tmpdir.name) / "catalog-cache-2.pickle"
+
+    def test_store(self):
+        write_history(
+            self.store,
+            [
+                ("sqlite", "ok", "SELECT 1;"),
+                ("sqlite", "ok", "SELECT 2"),
+                ("sqlite", "error", "SELEC 3"),
+                ("sqlite", "canceled", "SELECT 6"),
+                ("postgres", "ok", "SELECT 4"),
+                ("sqlite", "ok", "SELECT 1"),
+                ("sqlite", "ok", "SELECT 5"),
+            ],
+        )
+
+        assert read_history([self.store, self.cache], "sqlite", 10) == [
+            "SELECT 2",
+            "SELECT 1",
+            "SELECT 5",
+        ]
+        assert read_history([self.store], "sqlite", 2) == ["SELECT 1", "SELECT 5"]
+        assert read_history([self.store], "postgresql", 10) == ["SELECT 4"]
+
+    def test_store_unmigrated(self):
+        db = sqlite3.connect(self.store)
+        db.execute("CREATE TABLE other (id INTEGER)")
+        db.commit()
+        db.close()
+
+        assert read_history([self.store], "sqlite", 10) == []
+
+    def test_cache(self):
+        write_history_cache(
+            self.cache,
+            {
+                "first": [("SELECT 1;", 1), ("SELEC 2", -1), ("SELECT 3", 0)],
+                "second": [("SELECT 4", 5), ("SELECT 1", 1)],
+            },
+        )
+
+        assert read_history([self.store, self.cache], "sqlite", 10) == [
+            "SELECT 3",
+            "SELECT 4",
+            "SELECT 1",
+        ]
+        assert read_history([self.cache], "sqlite", 1) == ["SELECT 1"]
+
+    def test_cache_code(self):
+        # A pickle that would run a command loads as an inert object.
+        self.cache.write_bytes(pickle.dumps(RunsCommand()))
+
+        with mock.patch.object(os, "system") as system_mock:
+            queries = read_history([self.cache], "sqlite", 10)
+
+        assert queries == []
+        assert system_mock.mock_calls == []
+
+    def test_cache_unexpected(self):
+        modules = harlequin_modules()
+        cache = modules["harlequin.catalog_cache"].CatalogCache(
+            databases={}, s3={}, history=["SELECT 1"]
+        )
+        with mock.patch.dict(sys.modules, modules):
+            self.cache.write_bytes(pickle.dumps(cache))
+
+        with pytest.raises(CommandError) as excinfo:
+            read_history([self.cache], "sqlite", 10)
+
+        assert excinfo.value.args[0] == (
+            "Cannot read Harlequin query history: unexpected catalog cache format."
+        )
+
+    def test_cache_corrupt(self):
+        self.cache.write_bytes(b"not a pickle")
+
+        with pytest.raises(CommandError) as excinfo:
+            read_history([self.cache], "sqlite", 10)
+
+        assert excinfo.value.args[0].startswith("Cannot read Harlequin query history: ")
+
+    def test_missing(self):
+        with pytest.raises(CommandError) as excinfo:
+            read_history(
+                [Path("/nonexistent/history.db"), Path("/nonexistent/cache.pickle")],
+                "sqlite",
+                10,
+            )
+
+        assert excinfo.value.args[0] == (
+            "No Harlequin query history found at '/nonexistent/history.db' or "
+            + "'/nonexistent/cache.pickle'."
+        )
+
+    def test_unreadable(self):
+        self.store.write_bytes(b"SQLite format 3\x00" + b"\x00" * 100)
+
+        with pytest.raises(CommandError) as excinfo:
+            read_history([self.store], "sqlite", 10)
+
+        assert excinfo.value.args[0].startswith("Cannot read Harlequin query history")
+
+
+class LatencySummaryTests(SimpleTestCase):
+    def test_summary(self):
+        latencies = [index / 1000 for index in range(1, 101)]
+
+        assert latency_summary(latencies) == {
+            "p50": 50.0,
+            "p95": 95.0,
+            "p99": 99.0,
+            "mean": 50.5,
+            "max": 100.0,
+        }
+
+    def test_empty(self):
+        assert latency_summary([]) == {
+            "p50": None,
+            "p95": None,
+            "p99": None,
+            "mean": None,
+            "max": None,
+        }
+
+
+class ReplayerTests(TestCase):
+    def test_iterations(self):
+        report = Replayer("default", ["SELECT 1", "SELEC 2"], 2, 3, None).run()
+
+        assert report["workers"] == 2
+        assert report["executions"] == 12
+        assert report["errors"] == 6
+        assert report["throughput_qps"] > 0
+        assert report["latency_ms"]["p50"] is not None
+        select, typo = report["queries"]
+        assert select["executions"] == 6
+        assert select["errors"] == {}
+        assert typo["errors"] == {
+            'OperationalError: near "SELEC": syntax error': 6,
+        }
+        assert typo["latency_ms"]["p99"] is None
+
+    def test_duration(self):
+        report = Replayer("default", ["SELECT 1"], 1, None, 0.05).run()
+
+        assert report["elapsed_s"] >= 0.05
+        assert report["executions"] > 0
+
+    def test_no_results(self):
+        report = Replayer(
+            "default",
+            ["CREATE TEMP TABLE IF NOT EXISTS replayed (id INTEGER)"],
+            1,
+            2,
+            None,
+        ).run()
+
+        assert report["executions"] == 2
+        assert report["errors"] == 0
+
+    @override_settings(HARLEQUIN_GUARDS={"default": {"read_only": True}})
+    def test_guards(self):
+        report = Replayer(
+            "default", ["CREATE TABLE replayed (id INTEGER)"], 1, 1, None
+        ).run()
+
+        assert report["queries"][0]["errors"] == {
+            "OperationalError: attempt to write a readonly database": 1,
+        }
+
+    def test_connect_failure(self):
+        replayer = Replayer("default", ["SELECT 1"], 3, 1, None)
+        connected = 0
+        lock = threading.Lock()
+
+        def statements(vendor: str, guards: dict[str, Any]) -> list[str]:
+            nonlocal connected
+            with lock:
+                connected += 1
+                if connected == 3:
+                    # The others wait, or will, at the barrier.
+                    raise ValueError("Invalid duration 'nope'.")
+            return []
+
+        with (
+            mock.patch.object(replay, "session_statements", statements),
+            mock.patch.object(threading, "excepthook") as excepthook_mock,
+            pytest.raises(CommandError) as excinfo,
+        ):
+            replayer.run()
+
+        assert excinfo.value.args[0] == (
+            "Cannot connect to database 'default': Invalid duration 'nope'."
+        )
+        assert excepthook_mock.mock_calls == []
+
+
+class ReplayCommandTests(TestCase):
+    def test_sql_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "queries.sql"
+            path.write_text("SELECT 1;\nSELECT 2;\n")
+
+            out, err, returncode = call_command(str(path), "--workers", "2")
+
+        assert returncode == 0
+        report = json.loads(out)
+        assert report["database"] == "default"
+        assert report["vendor"] == "sqlite"
+        assert report["executions"] == 4
+        assert [query["sql"] for query in report["queries"]] == [
+            "SELECT 1",
+            "SELECT 2",
+        ]
+        assert err.startswith("Replayed 4 queries in ")
+
+    def test_history_output(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            history = Path(tmpdir) / "history.db"
+            write_history(history, [("sqlite", "ok", "SELECT 1")])
+            output = Path(tmpdir) / "report.json"
+
+            out, err, _ = call_command(
+                "--history",
+                str(history),
+                "--iterations",
+                "5",
+                "--output",
+                str(output),
+                "--verbosity",
+                "0",
+            )
+            report = json.loads(output.read_text())
+
+        assert out == ""
+        assert err == ""
+        assert report["executions"] == 20
+
+    def test_default_history(self):
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            mock.patch.dict("os.environ", {"XDG_STATE_HOME": tmpdir}),
+            mock.patch.object(sys, "platform", "linux"),
+        ):
+            (Path(tmpdir) / "harlequin").mkdir()
+            write_history(
+                Path(tmpdir) / "harlequin" / "history.db",
+                [("sqlite", "ok", "SELECT 1")],
+            )
+
+            out, _, _ = call_command("--history", "--duration", "0.01")
+
+        assert json.loads(out)["queries"][0]["sql"] == "SELECT 1"
+
+    def test_default_history_cache(self):
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            mock.patch.dict(
+                "os.environ",
+                {
+                    "XDG_STATE_HOME": str(Path(tmpdir) / "state"),
+                    "XDG_CACHE_HOME": str(Path(tmpdir) / "cache"),
+                },
+            ),
+            mock.patch.object(sys, "platform", "linux"),
+        ):
+            (Path(tmpdir) / "cache" / "harlequin").mkdir(parents=True)
+            write_history_cache(
+                Path(tmpdir) / "cache" / "harlequin" / "catalog-cache-2.pickle",
+                {"abc": [("SELECT 2", 1)]},
+            )
+
+            out, _, _ = call_command("--history", "--iterations", "1")
+
+        assert json.loads(out)["queries"][0]["sql"] == "SELECT 2"
+
+    def test_no_source(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command()
+
+        assert excinfo.value.args[0] == "Pass either a SQL file or --history."
+
+    def test_both_sources(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("queries.sql", "--history")
+
+        assert excinfo.value.args[0] == "Pass either a SQL file or --history."
+
+    def test_no_workers(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("queries.sql", "--workers", "0")
+
+        assert excinfo.value.args[0] == "--workers must be at least 1."
+
+    def test_no_iterations(self):
+        for iterations in ["0", "-1"]:
+            with (
+                self.subTest(iterations=iterations),
+                pytest.raises(CommandError) as excinfo,
+            ):
+                call_command("queries.sql", "--iterations", iterations)
+
+            assert excinfo.value.args[0] == "--iterations must be at least 1."
+
+    def test_history_writes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            history = Path(tmpdir) / "history.db"
+            write_history(
+                history,
+                [
+                    ("sqlite", "ok", "PRAGMA user_version"),
+                    ("sqlite", "ok", "VALUES (1)"),
+                    ("sqlite", "ok", "SELECT 1"),
+                ],
+            )
+
+            out, err, _ = call_command("--history", str(history))
+            written, _, _ = call_command(
+                "--history", str(history), "--history-writes", "--verbosity", "0"
+            )
+
+        assert [query["sql"] for query in json.loads(out)["queries"]] == ["SELECT 1"]
+        assert err.startswith(
+            "Skipped 2 queries from the history that aren’t SELECT statements. "
+            + "Pass --history-writes to replay them.\n"
+        )
+        assert [query["sql"] for query in json.loads(written)["queries"]] == [
+            "PRAGMA user_version",
+            "VALUES (1)",
+            "SELECT 1",
+        ]
+
+    def test_no_queries(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "queries.sql"
+            path.write_text("-- Nothing yet.\n")
+
+            with pytest.raises(CommandError) as excinfo:
+                call_command(str(path))
+
+        assert excinfo.value.args[0] == "No queries to replay."
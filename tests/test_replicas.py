@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from functools import partial
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.db.utils import ConnectionHandler, ConnectionRouter
+from django.test import TestCase
+
+from django_harlequin import replicas
+from django_harlequin.management.commands import harlequin as harlequin_command
+from django_harlequin.replicas import Probe
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    },
+    "broken": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "/nonexistent/directory/db.sqlite3",
+    },
+}
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return "replica"
+
+
+class ProbeTests(TestCase):
+    def test_probe(self):
+        result = replicas.probe(ConnectionHandler(DATABASES), "default", 1.0)
+
+        assert result.alias == "default"
+        assert result.error is None
+        assert result.connect_time is not None
+        assert result.latency is not None
+        assert result.lag == 0.0
+
+    def test_probe_error(self):
+        result = replicas.probe(ConnectionHandler(DATABASES), "broken", 1.0)
+
+        assert result.alias == "broken"
+        assert result.error == "unable to open database file"
+
+    def test_probe_all_timeout(self):
+        finished = threading.Event()
+
+        def slow_probe(connections, alias, timeout):
+            if alias == "replica":
+                time.sleep(0.2)
+                finished.set()
+            return Probe(alias, connect_time=0.001, latency=0.001, lag=0.0)
+
+        with mock.patch.object(replicas, "probe", slow_probe):
+            results = replicas.probe_all(
+                ConnectionHandler(DATABASES), ["default", "replica", "broken"], 0.05
+            )
+
+        assert [r.alias for r in results] == ["default", "replica", "broken"]
+        assert results[1].error == "timed out after 0.05s"
+        # The slow probe was waited for.
+        assert finished.is_set()
+
+    def test_candidate_aliases(self):
+        connections = ConnectionHandler(
+            {
+                **DATABASES,
+                "dummy": {"ENGINE": "django.db.backends.dummy", "NAME": ":memory:"},
+            }
+        )
+
+        assert replicas.candidate_aliases(connections, "default") == [
+            "default",
+            "replica",
+        ]
+        assert replicas.candidate_aliases(connections, "broken") == ["broken"]
+
+    def test_read_aliases_default(self):
+        # The only database is the primary.
+        assert replicas.read_aliases() == set()
+
+    def test_read_aliases_router(self):
+        with mock.patch.object(replicas, "router", ConnectionRouter([ReplicaRouter()])):
+            assert replicas.read_aliases() == {"replica"}
+
+    def test_rank(self):
+        probes = [
+            Probe("primary", connect_time=0.001, latency=0.001, lag=0.0),
+            Probe("fast", connect_time=0.001, latency=0.001, lag=0.0),
+            Probe("slow", connect_time=0.1, latency=0.1, lag=0.0),
+            Probe("lagging", connect_time=0.001, latency=0.001, lag=120.0),
+            Probe("unknown", connect_time=0.001, latency=0.001, lag=None),
+            Probe("down", error="timed out after 2s"),
+        ]
+
+        ranked = replicas.rank(probes, {"fast", "slow", "lagging"}, 30.0)
+
+        assert [p.alias for p in ranked] == [
+            "fast",
+            "slow",
+            "primary",
+            "lagging",
+            "unknown",
+        ]
+
+    def test_describe(self):
+        assert (
+            Probe("a", connect_time=0.0012, latency=0.0003, lag=1.25).describe()
+            == "a: connect 1.2ms, latency 0.3ms, lag 1.2s"
+        )
+        assert (
+            Probe("a", connect_time=0.0012, latency=0.0003).describe()
+            == "a: connect 1.2ms, latency 0.3ms, lag unknown"
+        )
+        assert Probe("a", error="boom").describe() == "a: boom"
+
+
+@mock.patch.object(harlequin_command, "connections", ConnectionHandler(DATABASES))
+class PreferReplicaCommandTests(TestCase):
+    def setUp(self):
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        use_cache_dir(self)
+
+    def test_prefer_replica(self):
+        with mock.patch.object(replicas, "router", ConnectionRouter([ReplicaRouter()])):
+            _, err, _ = call_command("--prefer-replica")
+
+        assert "Probed default: " in err
+        assert "Probed replica: " in err
+        # A different database, rather than a replica.
+        assert "Probed broken" not in err
+        assert err.endswith("Using database 'replica'.\n")
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                ["harlequin", "-a", "sqlite", ":memory:"],
+                env=mock.ANY,
+            ),
+        ]
+
+    def test_prefer_replica_quiet(self):
+        _, err, _ = call_command("--prefer-replica", "--verbosity", "0")
+
+        assert err == ""
+        assert len(self.execvpe_mock.mock_calls) == 1
+
+    def test_prefer_replica_none_reachable(self):
+        with (
+            mock.patch.object(
+                replicas,
+                "probe",
+                lambda connections, alias, timeout: Probe(alias, error="down"),
+            ),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            call_command("--prefer-replica", "--probe-timeout", "0.5")
+
+        assert excinfo.value.args[0] == "No database could be reached."
+
+    def test_prefer_replica_none(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("--prefer-replica", "--database", "broken")
+
+        assert excinfo.value.args[0] == (
+            "No replicas of database 'broken' to choose from: no other database "
+            + "has the same vendor and NAME."
+        )
+
+    def test_prefer_replica_seed(self):
+        with (
+            mock.patch.object(replicas, "probe") as probe_mock,
+            pytest.raises(CommandError) as excinfo,
+        ):
+            call_command("--prefer-replica", "--seed", "10")
+
+        assert excinfo.value.args[0] == (
+            "--seed cannot be combined with --prefer-replica."
+        )
+        probe_mock.assert_not_called()
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import random
+import sqlite3
+from decimal import Decimal
+from functools import partial
+from pathlib import Path
+from unittest import mock
+from uuid import UUID
+
+import pytest
+from django.core.management.base import CommandError
+from django.db import connection, models
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import isolate_apps
+
+from django_harlequin import sampling
+from django_harlequin.sampling import (
+    foreign_key_closure,
+    parse_percent,
+    pk_ranges,
+    sample_queries,
+    select_models,
+    to_sqlite,
+)
+from tests.testapp.models import Author, Book, Tag
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+postgres_connection = ConnectionHandler(
+    {"default": {"ENGINE": "django.db.backends.postgresql", "NAME": "exampledb"}}
+)["default"]
+mysql_connection = ConnectionHandler(
+    {"default": {"ENGINE": "django.db.backends.mysql", "NAME": "exampledb"}}
+)["default"]
+
+
+class ParsePercentTests(SimpleTestCase):
+    def test_valid(self):
+        assert parse_percent("1%") == 1.0
+        assert parse_percent(" 0.5 ") == 0.5
+        assert parse_percent("100%") == 100.0
+
+    def test_invalid(self):
+        for value in ["0%", "101", "lots", ""]:
+            with pytest.raises(CommandError) as excinfo:
+                parse_percent(value)
+
+            assert excinfo.value.args[0] == (
+                f"Invalid sample size {value!r}, it should be a percentage "
+                + "between 0 and 100, such as 1%."
+            )
+
+
+class SelectModelsTests(SimpleTestCase):
+    def test_all(self):
+        assert select_models(connection, None) == [
+            Author,
+            Book,
+            Book.tags.through,
+            Tag,
+        ]
+
+    def test_labels(self):
+        assert select_models(connection, ["testapp.Tag", "testapp.Book"]) == [
+            Tag,
+            Book,
+        ]
+
+    def test_unknown(self):
+        with pytest.raises(CommandError) as excinfo:
+            select_models(connection, ["testapp.Missing"])
+
+        assert excinfo.value.args[0] == "Unknown model 'testapp.Missing'."
+
+
+class ForeignKeyClosureTests(SimpleTestCase):
+    def test_closure(self):
+        assert foreign_key_closure([Book]) == [Author, Book]
+        assert foreign_key_closure([Book.tags.through]) == [
+            Author,
+            Book,
+            Book.tags.through,
+            Tag,
+        ]
+
+
+class SampleQueriesTests(SimpleTestCase):
+    def test_postgresql(self):
+        assert sample_queries(postgres_connection, Tag, 1.5, random.Random(0)) == [
+            ('SELECT "id", "name" FROM "testapp_tag" TABLESAMPLE SYSTEM (%s)', [1.5])
+        ]
+
+    def test_mysql_pk_ranges(self):
+        mysql = mysql_connection
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = (1, 2500)
+
+        with mock.patch.object(mysql, "cursor", return_value=cursor):
+            queries = sample_queries(mysql, Tag, 50.0, random.Random(0))
+
+        assert len(queries) == 2
+        for sql, (start, end) in queries:
+            assert sql == (
+                "SELECT `id`, `name` FROM `testapp_tag` WHERE `id` BETWEEN %s AND %s"
+            )
+            assert 1 <= start <= end <= 2500
+
+    def test_mysql_empty(self):
+        mysql = mysql_connection
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = (None, None)
+
+        with mock.patch.object(mysql, "cursor", return_value=cursor):
+            assert sample_queries(mysql, Tag, 50.0, random.Random(0)) == []
+
+    @isolate_apps("tests.testapp")
+    def test_mysql_non_integer_pk(self):
+        class Code(models.Model):
+            code: models.CharField[str, str] = models.CharField(
+                max_length=10, primary_key=True
+            )
+
+            class Meta:
+                app_label = "testapp"
+
+        assert sample_queries(mysql_connection, Code, 5.0, random.Random(0)) == [
+            ("SELECT `code` FROM `testapp_code` WHERE RAND() < %s", [0.05])
+        ]
+
+    def test_sqlite(self):
+        assert sample_queries(connection, Tag, 1.0, random.Random(0)) == [
+            (
+                'SELECT "id", "name" FROM "testapp_tag" '
+                + "WHERE abs(random()) %% 1000000 < %s",
+                [10000.0],
+            )
+        ]
+
+
+class PkRangesTests(SimpleTestCase):
+    def test_ranges(self):
+        ranges = pk_ranges(1, 10_000, 20.0, random.Random(0))
+
+        assert len(ranges) == 2
+        for start, end in ranges:
+            assert (start - 1) % 1000 == 0
+            assert end == start + 999
+
+    def test_minimum_one_range(self):
+        assert pk_ranges(5, 10, 1.0, random.Random(0)) == [(5, 10)]
+
+
+class ToSqliteTests(SimpleTestCase):
+    def test_values(self):
+        assert to_sqlite(None) is None
+        assert to_sqlite(True) is True
+        assert to_sqlite(b"x") == b"x"
+        assert to_sqlite(Decimal("1.50")) == "1.50"
+        assert (
+            to_sqlite(dt.datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt.timezone.utc))
+            == "2024-01-02 03:04:05+00:00"
+        )
+        assert to_sqlite(dt.date(2024, 1, 2)) == "2024-01-02"
+        assert to_sqlite(UUID(int=1)) == "00000000000000000000000000000001"
+        assert to_sqlite(memoryview(b"y")) == b"y"
+        assert to_sqlite({"a": [1]}) == '{"a": [1]}'
+        assert to_sqlite(dt.timedelta(seconds=1)) == "0:00:01"
+
+
+class ExtractSampleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ada = Author.objects.create(name="Ada", email="ada@example.com")
+        bob = Author.objects.create(name="Bob", email="bob@example.com")
+        Author.objects.create(name="Cy", email="cy@example.com")
+        python = Tag.objects.create(name="python")
+        book = Book.objects.create(
+            author=ada,
+            title="Notes",
+            published=dt.date(1843, 10, 1),
+            price=Decimal("9.99"),
+            metadata={"a": 1},
+        )
+        book.tags.add(python)
+        Book.objects.create(author=bob, title="Other")
+
+    def setUp(self):
+        self.cache_dir = use_cache_dir(self)
+
+    def read(self, path: Path, sql: str) -> list[tuple[object, ...]]:
+        db = sqlite3.connect(path)
+        self.addCleanup(db.close)
+        return db.execute(sql).fetchall()
+
+    def test_closure(self):
+        messages: list[str] = []
+
+        path, cached = sampling.extract_sample(
+            connection, 100.0, ["testapp.Book_tags"], 3600.0, messages.append
+        )
+
+        assert not cached
+        assert path.parent == self.cache_dir / "samples"
+        assert path.name.startswith("default-")
+        assert self.read(path, "SELECT name FROM testapp_author") == [("Ada",)]
+        assert self.read(path, "SELECT name FROM testapp_tag") == [("python",)]
+        assert self.read(
+            path, "SELECT title, published, price, metadata FROM testapp_book"
+        ) == [("Notes", "1843-10-01", 9.99, '{"a": 1}')]
+        assert messages == [
+            "Sampled 1 rows from testapp_book_tags.",
+            "Copied 1 referenced rows into testapp_book.",
+            "Copied 1 referenced rows into testapp_tag.",
+            "Copied 1 referenced rows into testapp_author.",
+        ]
+
+    def test_all_models(self):
+        path, _ = sampling.extract_sample(
+            connection, 100.0, None, 3600.0, lambda message: None
+        )
+
+        assert self.read(path, "SELECT COUNT(*) FROM testapp_author") == [(3,)]
+        assert self.read(path, "SELECT COUNT(*) FROM testapp_book") == [(2,)]
+        indexes = self.read(path, "SELECT name FROM sqlite_master WHERE type='index'")
+        assert ("book_title_idx",) in indexes
+
+    def test_cached(self):
+        first, _ = sampling.extract_sample(
+            connection, 100.0, ["testapp.Tag"], 3600.0, lambda message: None
+        )
+
+        with mock.patch.object(sampling, "Sampler") as sampler_mock:
+            second, cached = sampling.extract_sample(
+                connection, 100.0, ["testapp.Tag"], 3600.0, lambda message: None
+            )
+
+        assert cached
+        assert second == first
+        assert sampler_mock.mock_calls == []
+
+    def test_expired(self):
+        sampling.extract_sample(
+            connection, 100.0, ["testapp.Tag"], 3600.0, lambda message: None
+        )
+
+        _, cached = sampling.extract_sample(
+            connection, 100.0, ["testapp.Tag"], 0.0, lambda message: None
+        )
+
+        assert not cached
+
+    def test_error_removes_temporary_file(self):
+        with (
+            mock.patch.object(
+                sampling.Sampler, "run", side_effect=RuntimeError("boom")
+            ),
+            pytest.raises(RuntimeError),
+        ):
+            sampling.extract_sample(
+                connection, 100.0, ["testapp.Tag"], 3600.0, lambda message: None
+            )
+
+        assert list((self.cache_dir / "samples").iterdir()) == []
+
+
+class SampleCommandTests(TestCase):
+    def setUp(self):
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        use_cache_dir(self)
+
+    def test_sample(self):
+        Tag.objects.create(name="python")
+
+        _, err, _ = call_command(
+            "--sample", "100%", "--sample-models", "testapp.Tag", "--verbosity", "2"
+        )
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        path = command[-1]
+        assert command == ["harlequin", "-a", "sqlite", path]
+        assert err == (
+            "Sampled 1 rows from testapp_tag.\n" + f"Sample written to {path}.\n"
+        )
+
+        _, err, _ = call_command("--sample", "100%", "--sample-models", "testapp.Tag")
+
+        assert err == f"Reusing sample {path}.\n"
+
+    def test_sample_quiet(self):
+        _, err, _ = call_command("--sample", "1", "--verbosity", "0")
+
+        assert err == ""
@@ -0,0 +1,475 @@
+from __future__ import annotations
+
+import datetime as dt
+import importlib
+import os
+import random
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from decimal import Decimal
+from functools import partial
+from typing import Any
+from unittest import mock
+from uuid import UUID
+
+import pytest
+from django.core.management.base import CommandError
+from django.db import connection, models
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import isolate_apps
+
+from django_harlequin import seeding
+from django_harlequin.seeding import (
+    Plan,
+    dependency_order,
+    model_rows,
+    random_value,
+    seed_database,
+    table_offset,
+    unique_field_names,
+    unique_value,
+    write_rows,
+)
+from tests.testapp.models import Author, Book, Tag
+from tests.utils import get_field, run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+BookTags = Book.tags.through
+
+
+def plan(rows: int = 10, seed: int = 1) -> Plan:
+    return Plan(
+        rows=rows,
+        seed=seed,
+        offsets={
+            "testapp.Author": 0,
+            "testapp.Book": 100,
+            "testapp.Book_tags": 0,
+            "testapp.Tag": 0,
+        },
+    )
+
+
+# Threads would need their own connections, and processes would need the
+# test settings, so run the "parallel" generation inline.
+class InlineExecutor(ThreadPoolExecutor):
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(max_workers=1)
+
+    def submit(self, fn: Any, /, *args: Any, **kwargs: Any) -> Any:
+        future: Future[Any] = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class DependencyOrderTests(SimpleTestCase):
+    def test_order(self):
+        ordered = dependency_order([BookTags, Book, Tag, Author])
+
+        assert ordered == [Author, Book, Tag, BookTags]
+
+    @isolate_apps("tests.testapp")
+    def test_cycle(self):
+        class Team(models.Model):
+            captain: models.ForeignKey[Player] = models.ForeignKey(
+                "Player", models.CASCADE, related_name="+"
+            )
+
+            class Meta:
+                app_label = "testapp"
+
+        class Player(models.Model):
+            team: models.ForeignKey[Team] = models.ForeignKey(Team, models.CASCADE)
+
+            class Meta:
+                app_label = "testapp"
+
+        assert dependency_order([Team, Player]) == [Player, Team]
+
+
+class UniqueFieldNamesTests(SimpleTestCase):
+    def test_fields(self):
+        assert unique_field_names(Author) == {"id", "name"}
+
+    def test_unique_together(self):
+        assert unique_field_names(BookTags) == {"id", "book", "tag"}
+
+    @isolate_apps("tests.testapp")
+    def test_constraints(self):
+        class Post(models.Model):
+            slug: models.SlugField[str, str] = models.SlugField()
+            site: models.IntegerField[int, int] = models.IntegerField()
+
+            class Meta:
+                app_label = "testapp"
+                constraints = [
+                    models.UniqueConstraint(fields=["slug", "site"], name="u"),
+                    models.CheckConstraint(condition=models.Q(site__gte=0), name="c"),
+                ]
+
+        assert unique_field_names(Post) == {"id", "slug", "site"}
+
+
+class UniqueValueTests(SimpleTestCase):
+    def test_offset(self):
+        assert unique_value(plan(), Book, Book._meta.pk, 0) == 101
+
+    def test_foreign_key(self):
+        assert unique_value(plan(), Book, get_field(Book, "author"), 4) == 5
+
+    def test_text(self):
+        assert unique_value(plan(), Author, get_field(Author, "name"), 1) == "name-2"
+
+    @isolate_apps("tests.testapp")
+    def test_types(self):
+        class Post(models.Model):
+            code: models.CharField[str, str] = models.CharField(
+                max_length=4, unique=True
+            )
+            email: models.EmailField[str, str] = models.EmailField(unique=True)
+            day: models.DateField[dt.date, dt.date] = models.DateField(unique=True)
+            moment: models.DateTimeField[dt.datetime, dt.datetime] = (
+                models.DateTimeField(unique=True)
+            )
+            key: models.UUIDField[UUID, UUID] = models.UUIDField(unique=True)
+            ratio: models.FloatField[float, float] = models.FloatField(unique=True)
+
+            class Meta:
+                app_label = "testapp"
+
+        posts = Plan(rows=10, seed=1, offsets={"testapp.Post": 99})
+
+        def value(name: str) -> Any:
+            return unique_value(posts, Post, get_field(Post, name), 0)
+
+        assert value("code") == "-100"
+        assert value("email") == "email100@example.com"
+        assert value("day") == dt.date(2000, 4, 10)
+        assert value("moment") == dt.datetime(
+            2000, 1, 1, 0, 1, 40, tzinfo=dt.timezone.utc
+        )
+        assert value("key") == value("key")
+        assert isinstance(value("key"), UUID)
+        with pytest.raises(CommandError) as excinfo:
+            value("ratio")
+
+        assert excinfo.value.args[0] == (
+            "Cannot generate unique values for testapp.Post.ratio, a FloatField."
+        )
+
+    @override_settings(USE_TZ=False)
+    def test_naive(self):
+        with isolate_apps("tests.testapp"):
+
+            class Post(models.Model):
+                moment: models.DateTimeField[dt.datetime, dt.datetime] = (
+                    models.DateTimeField(unique=True)
+                )
+
+                class Meta:
+                    app_label = "testapp"
+
+            value = unique_value(
+                Plan(rows=1, seed=1, offsets={"testapp.Post": 0}),
+                Post,
+                get_field(Post, "moment"),
+                0,
+            )
+
+        assert value == dt.datetime(2000, 1, 1, 0, 0, 1)
+
+
+@isolate_apps("tests.testapp")
+class RandomValueTests(SimpleTestCase):
+    def test_types(self):
+        class Post(models.Model):
+            flag: models.BooleanField[bool, bool] = models.BooleanField()
+            small: models.PositiveSmallIntegerField[int, int] = (
+                models.PositiveSmallIntegerField()
+            )
+            ratio: models.FloatField[float, float] = models.FloatField()
+            price: models.DecimalField[Decimal, Decimal] = models.DecimalField(
+                max_digits=4, decimal_places=2
+            )
+            email: models.EmailField[str, str] = models.EmailField()
+            url: models.URLField[str, str] = models.URLField()
+            slug: models.SlugField[str, str] = models.SlugField(max_length=5)
+            body: models.TextField[str, str] = models.TextField()
+            day: models.DateField[dt.date, dt.date] = models.DateField()
+            moment: models.DateTimeField[dt.datetime, dt.datetime] = (
+                models.DateTimeField()
+            )
+            time: models.TimeField[dt.time, dt.time] = models.TimeField()
+            duration: models.DurationField[dt.timedelta, dt.timedelta] = (
+                models.DurationField()
+            )
+            key: models.UUIDField[UUID, UUID] = models.UUIDField()
+            data = models.JSONField()
+            blob: models.BinaryField[bytes, bytes | memoryview] = models.BinaryField()
+            ip: models.GenericIPAddressField[str, str] = models.GenericIPAddressField()
+            status: models.CharField[str, str] = models.CharField(
+                max_length=1, choices=[("a", "A"), ("b", "B")]
+            )
+
+            class Meta:
+                app_label = "testapp"
+
+        rng = random.Random(1)
+        values = {
+            field.name: random_value(Post, field, rng)
+            for field in Post._meta.local_concrete_fields
+            if not field.primary_key
+        }
+
+        assert isinstance(values["flag"], bool)
+        assert 0 <= values["small"] <= 32_767
+        assert 0 <= values["ratio"] <= 1000
+        assert isinstance(values["price"], Decimal)
+        assert values["price"] < 100
+        assert values["email"].endswith("@example.com")
+        assert values["url"].startswith("https://example.com/")
+        assert len(values["slug"]) <= 5
+        assert " " not in values["slug"]
+        assert values["body"].split()[0] in seeding.WORDS
+        assert isinstance(values["day"], dt.date)
+        assert values["moment"].tzinfo is dt.timezone.utc
+        assert isinstance(values["time"], dt.time)
+        assert isinstance(values["duration"], dt.timedelta)
+        assert isinstance(values["key"], UUID)
+        assert set(values["data"]) == {"word", "number"}
+        assert len(values["blob"]) == 16
+        assert values["ip"].startswith("10.")
+        assert values["status"] in ("a", "b")
+
+    def test_unknown_types(self):
+        class Post(models.Model):
+            default: models.FilePathField[str, str] = models.FilePathField(
+                path="/", default="/tmp"
+            )
+            nullable: models.FilePathField[str | None, str | None] = (
+                models.FilePathField(path="/", null=True)
+            )
+            required: models.FilePathField[str, str] = models.FilePathField(path="/")
+
+            class Meta:
+                app_label = "testapp"
+
+        rng = random.Random(1)
+
+        assert random_value(Post, get_field(Post, "default"), rng) == "/tmp"
+        assert random_value(Post, get_field(Post, "nullable"), rng) is None
+        with pytest.raises(CommandError) as excinfo:
+            random_value(Post, get_field(Post, "required"), rng)
+
+        assert excinfo.value.args[0] == (
+            "Cannot generate values for testapp.Post.required, a FilePathField."
+        )
+
+
+class ModelRowsTests(SimpleTestCase):
+    def test_reproducible(self):
+        assert model_rows(plan(), Book, 0, 5) == model_rows(plan(), Book, 0, 5)
+        assert model_rows(plan(), Book, 0, 5) != model_rows(plan(seed=2), Book, 0, 5)
+
+    def test_foreign_keys(self):
+        rows = model_rows(plan(), Book, 0, 10)
+
+        assert [row[0] for row in rows] == list(range(101, 111))
+        assert all(1 <= row[1] <= 10 for row in rows)
+
+    def test_unique_together(self):
+        rows = model_rows(plan(), BookTags, 0, 3)
+
+        assert rows == [[1, 101, 1], [2, 102, 2], [3, 103, 3]]
+
+    def test_nulls(self):
+        published = [row[3] for row in model_rows(plan(rows=100), Book, 0, 100)]
+
+        assert None in published
+        assert any(value is not None for value in published)
+
+    @isolate_apps("tests.testapp")
+    def test_self_reference(self):
+        class Category(models.Model):
+            parent: models.ForeignKey[Category] = models.ForeignKey(
+                "self", models.CASCADE
+            )
+
+            class Meta:
+                app_label = "testapp"
+
+        rows = model_rows(
+            Plan(rows=10, seed=1, offsets={"testapp.Category": 0}), Category, 0, 10
+        )
+
+        assert all(parent <= id_ for id_, parent in rows)
+
+
+class TableOffsetTests(TestCase):
+    def test_integer_pk(self):
+        Author.objects.create(id=41, name="a")
+
+        assert table_offset(connection, Author) == 41
+
+    def test_other_pk(self):
+        Author.objects.create(id=41, name="a")
+
+        with mock.patch.object(Author._meta, "pk", get_field(Author, "uuid")):
+            offset = table_offset(connection, Author)
+
+        assert offset == 1
+
+
+class WriteRowsTests(TestCase):
+    def test_multi_row_insert(self):
+        rows = model_rows(plan(rows=3), Author, 0, 3)
+
+        with (
+            mock.patch.object(connection, "vendor", "mysql"),
+            mock.patch.object(seeding, "INSERT_BATCH_SIZE", 2),
+        ):
+            write_rows(connection, Author, rows)
+
+        assert list(Author.objects.values_list("name", flat=True)) == [
+            "name-1",
+            "name-2",
+            "name-3",
+        ]
+
+
+class SeedDatabaseTests(TestCase):
+    def test_seed(self):
+        messages: list[str] = []
+
+        seeded = seed_database(connection, 5, None, 1, 1, messages.append)
+
+        assert seeded == [Author, Book, Tag, BookTags]
+        assert Author.objects.count() == 5
+        assert Book.objects.count() == 5
+        assert BookTags.objects.count() == 5
+        assert Book.objects.filter(author__isnull=False).count() == 5
+        assert messages == [
+            "Seeded 5 rows into testapp_author.",
+            "Seeded 5 rows into testapp_book.",
+            "Seeded 5 rows into testapp_tag.",
+            "Seeded 5 rows into testapp_book_tags.",
+        ]
+
+    def test_populated(self):
+        Author.objects.create(name="name-1")
+
+        seed_database(connection, 3, ["testapp.Author"], 1, 1, lambda m: None)
+
+        assert sorted(Author.objects.values_list("name", flat=True)) == [
+            "name-1",
+            "name-2",
+            "name-3",
+            "name-4",
+        ]
+
+    def test_foreign_key_closure(self):
+        seeded = seed_database(connection, 2, ["testapp.Book"], 1, 1, lambda m: None)
+
+        assert seeded == [Author, Book]
+
+    def test_chunks_in_pool(self):
+        with (
+            mock.patch.object(seeding, "CHUNK_SIZE", 1),
+            mock.patch.object(seeding, "ProcessPoolExecutor", InlineExecutor),
+        ):
+            seed_database(connection, 5, ["testapp.Tag"], 1, 2, lambda m: None)
+
+        assert Tag.objects.count() == 5
+
+    def test_too_few_rows(self):
+        with pytest.raises(CommandError) as excinfo:
+            seed_database(connection, 0, None, 1, 1, lambda m: None)
+
+        assert excinfo.value.args[0] == "--seed must be at least 1."
+
+    def test_ungeneratable(self):
+        with (
+            mock.patch.object(
+                seeding, "random_value", side_effect=CommandError("Nope.")
+            ),
+            pytest.raises(CommandError),
+        ):
+            seed_database(connection, 1, ["testapp.Tag"], 1, 1, lambda m: None)
+
+        assert Tag.objects.count() == 0
+
+
+class SeedCommandTests(TestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        use_cache_dir(self)
+
+    def test_seed(self):
+        out, err, returncode = call_command(
+            "--seed",
+            "3",
+            "--seed-models",
+            "testapp.Tag",
+            "--random-seed",
+            "7",
+            "--seed-workers",
+            "1",
+            "--no-input",
+            "--verbosity",
+            "2",
+        )
+
+        assert returncode == 0
+        assert err == (
+            "Seeding with --random-seed 7.\n"
+            + "Seeded 3 rows into testapp_tag.\n"
+            + "Seeded 3 rows into each of 1 tables.\n"
+        )
+        assert Tag.objects.count() == 3
+        assert self.execvpe_mock.call_count == 1
+
+    def test_random_seed(self):
+        with mock.patch.object(seeding, "seed_database", return_value=[]) as seed_mock:
+            _, err, _ = call_command("--seed", "3", "--no-input", "--verbosity", "0")
+
+        assert err == ""
+        assert 0 <= seed_mock.call_args.args[3] < 2**32
+
+    def test_confirm(self):
+        with mock.patch("builtins.input", return_value="yes") as input_mock:
+            call_command("--seed", "1", "--seed-models", "testapp.Tag")
+
+        assert (
+            "1 rows into each table in database 'default'"
+            in (input_mock.call_args.args[0])
+        )
+        assert Tag.objects.count() == 1
+
+    def test_cancel(self):
+        with (
+            mock.patch("builtins.input", return_value="no"),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            call_command("--seed", "1")
+
+        assert excinfo.value.args[0] == "Seeding cancelled."
+        assert Tag.objects.count() == 0
+        assert self.execvpe_mock.call_count == 0
+
+
+class ImportTests(SimpleTestCase):
+    def test_without_psycopg(self):
+        with mock.patch.dict(sys.modules, {"psycopg": None, "psycopg2": None}):
+            for name in [
+                "django.db.backends.postgresql.psycopg_any",
+                "django_harlequin.seeding",
+            ]:
+                sys.modules.pop(name, None)
+
+            module = importlib.import_module("django_harlequin.seeding")
+
+        assert module.write_rows.__name__ == "write_rows"
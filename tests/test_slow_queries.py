@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import warnings
+from functools import partial
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pytest
+from django.apps import apps
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.db.backends.signals import connection_created
+from django.test import TestCase, override_settings
+
+from django_harlequin import slow_queries
+from django_harlequin.slow_queries import SlowQueryRecorder, percentile
+from tests.testapp.models import Author
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class SlowQueriesTestCase(TestCase):
+    def setUp(self) -> None:
+        self.cache_dir = use_cache_dir(self)
+
+    def make_recorder(self, **kwargs: Any) -> SlowQueryRecorder:
+        options = {
+            "threshold": 0.0,
+            "max_queries": 10,
+            "samples": 10,
+            "flush_interval": 3600.0,
+            "directory": self.cache_dir / "slow-queries",
+            **kwargs,
+        }
+        recorder = SlowQueryRecorder(**options)
+        # Stops the flush thread the first recorded query starts.
+        self.addCleanup(lambda: recorder.stopped.set())
+        return recorder
+
+
+class PercentileTests(SlowQueriesTestCase):
+    def test_percentile(self):
+        values = [float(n) for n in range(1, 101)]
+
+        assert percentile(values, 0.5) == 50.0
+        assert percentile(values, 0.95) == 95.0
+        assert percentile([3.0], 0.95) == 3.0
+        assert percentile([2.0, 1.0], 0.0) == 1.0
+
+
+class SlowQueryRecorderTests(SlowQueriesTestCase):
+    def test_records_queries(self):
+        recorder = self.make_recorder()
+
+        with connection.execute_wrapper(recorder):
+            Author.objects.filter(name="Ada").count()
+            Author.objects.filter(name="Bob").count()
+
+        (entries,) = recorder.entries["default"].values()
+        assert entries.count == 2
+        assert len(entries.samples) == 2
+        assert 'WHERE "testapp_author"."name" = \'Ada\'' in entries.sql
+        assert "= ?" in entries.fingerprint
+
+    def test_threshold(self):
+        recorder = self.make_recorder(threshold=3600.0)
+
+        with connection.execute_wrapper(recorder):
+            Author.objects.count()
+
+        assert recorder.entries == {}
+
+    def test_bounded(self):
+        recorder = self.make_recorder(max_queries=2, samples=2)
+
+        for sql in ["SELECT 1", "SELECT a", "SELECT 2", "SELECT b", "SELECT 3"]:
+            recorder.record(connection, sql, None, False, 0.1)
+
+        entries = recorder.entries["default"]
+        assert list(entries) == ["SELECT b", "SELECT ?"]
+        assert entries["SELECT ?"].count == 3
+        assert list(entries["SELECT ?"].samples) == [0.1, 0.1]
+
+    def test_query_error(self):
+        recorder = self.make_recorder()
+
+        with (
+            connection.execute_wrapper(recorder),
+            pytest.raises(DatabaseError),
+            connection.cursor() as cursor,
+        ):
+            cursor.execute("SELEC 1")
+
+        assert list(recorder.entries["default"]) == ["SELEC ?"]
+
+    def test_record_failure(self):
+        recorder = self.make_recorder()
+
+        with (
+            mock.patch.object(recorder, "record", side_effect=ValueError("Oops")),
+            self.assertLogs("django_harlequin.slow_queries") as logs,
+            connection.execute_wrapper(recorder),
+        ):
+            assert Author.objects.count() == 0
+
+        assert logs.output[0].startswith(
+            "ERROR:django_harlequin.slow_queries:Failed to record slow query."
+        )
+
+    def test_record_failure_query_error(self):
+        recorder = self.make_recorder()
+
+        with (
+            mock.patch.object(recorder, "record", side_effect=ValueError("Oops")),
+            self.assertLogs("django_harlequin.slow_queries"),
+            connection.execute_wrapper(recorder),
+            pytest.raises(DatabaseError) as excinfo,
+            connection.cursor() as cursor,
+        ):
+            cursor.execute("SELEC 1")
+
+        assert "syntax error" in str(excinfo.value)
+
+    def test_record_does_not_flush(self):
+        recorder = self.make_recorder(flush_interval=0.0)
+
+        with mock.patch.object(recorder, "start") as start_mock:
+            recorder.record(connection, "SELECT 1", None, False, 0.25)
+
+        assert list(recorder.entries["default"]) == ["SELECT ?"]
+        assert not (self.cache_dir / "slow-queries").exists()
+        assert start_mock.mock_calls == [mock.call()]
+
+    def test_record_starts_once(self):
+        recorder = self.make_recorder()
+
+        recorder.record(connection, "SELECT 1", None, False, 0.25)
+        thread = recorder.thread
+        recorder.record(connection, "SELECT 2", None, False, 0.25)
+
+        assert thread is not None
+        assert thread.is_alive()
+        assert recorder.thread is thread
+
+    def test_start(self):
+        recorder = self.make_recorder(flush_interval=0.01)
+        self.addCleanup(recorder.stopped.set)
+        flushed = threading.Event()
+        calls = iter([ValueError("Oops")])
+
+        def flush() -> None:
+            error = next(calls, None)
+            if error is not None:
+                raise error
+            flushed.set()
+
+        with (
+            mock.patch.object(recorder, "flush", flush),
+            self.assertLogs("django_harlequin.slow_queries") as logs,
+        ):
+            recorder.start()
+            assert flushed.wait(5)
+
+        assert logs.output[0].startswith(
+            "ERROR:django_harlequin.slow_queries:Failed to write slow queries."
+        )
+
+    def test_flush(self):
+        recorder = self.make_recorder()
+
+        recorder.record(connection, "SELECT 1", None, False, 0.25)
+        recorder.flush()
+
+        assert recorder.entries == {}
+        directory = self.cache_dir / "slow-queries"
+        data = json.loads((directory / "default.json").read_text())
+        assert data == [
+            {
+                "fingerprint": "SELECT ?",
+                "sql": "SELECT 1",
+                "count": 1,
+                "total": 0.25,
+                "p50": 0.25,
+                "p95": 0.25,
+                "samples": [0.25],
+            }
+        ]
+        assert (directory / ".default.json.lock").exists()
+
+    def test_flush_locks(self):
+        first = self.make_recorder()
+        second = self.make_recorder()
+        first.record(connection, "SELECT a", None, False, 1.0)
+        second.record(connection, "SELECT b", None, False, 2.0)
+        merging = threading.Event()
+        resume = threading.Event()
+        load = slow_queries.load_slow_queries
+
+        def slow_load(path: Path) -> list[dict[str, Any]]:
+            data = load(path)
+            merging.set()
+            resume.wait(5)
+            return data
+
+        # The second flush waits for the first to write, rather than
+        # overwriting it with what it read before.
+        with mock.patch.object(slow_queries, "load_slow_queries", slow_load):
+            thread = threading.Thread(target=first.flush)
+            thread.start()
+            assert merging.wait(5)
+            other = threading.Thread(target=second.flush)
+            other.start()
+            resume.set()
+            thread.join()
+            other.join()
+
+        data = load(self.cache_dir / "slow-queries" / "default.json")
+        assert [(e["sql"], e["count"]) for e in data] == [
+            ("SELECT b", 1),
+            ("SELECT a", 1),
+        ]
+
+    def test_flush_merges(self):
+        recorder = self.make_recorder(samples=3)
+        recorder.record(connection, "SELECT 1", None, False, 1.0)
+        recorder.record(connection, "SELECT 1", None, False, 2.0)
+        recorder.flush()
+        recorder.record(connection, "SELECT 2", None, False, 3.0)
+        recorder.record(connection, "SELECT 2", None, False, 4.0)
+        recorder.record(connection, "SELECT x", None, False, 0.5)
+        recorder.flush()
+
+        data = slow_queries.load_slow_queries(
+            self.cache_dir / "slow-queries" / "default.json"
+        )
+
+        assert [(e["sql"], e["count"], e["total"]) for e in data] == [
+            ("SELECT 2", 4, 10.0),
+            ("SELECT x", 1, 0.5),
+        ]
+        assert data[0]["samples"] == [2.0, 3.0, 4.0]
+
+    def test_example_sql_many(self):
+        assert (
+            slow_queries.example_sql(
+                connection, "INSERT INTO t VALUES (%s)", [["a"], ["b"]], True
+            )
+            == "INSERT INTO t VALUES ('a')"
+        )
+
+    def test_example_sql_dict(self):
+        assert (
+            slow_queries.example_sql(connection, "SELECT %(a)s", {"a": 1}, False)
+            == "SELECT 1"
+        )
+
+    def test_example_sql_mismatch(self):
+        assert (
+            slow_queries.example_sql(connection, "SELECT %s, %s", [1], False)
+            == "SELECT %s, %s"
+        )
+
+    def test_load_missing(self):
+        assert slow_queries.load_slow_queries(self.cache_dir / "missing.json") == []
+
+    @override_settings(HARLEQUIN_SLOW_QUERIES={"PATH": "/tmp/example"})
+    def test_config(self):
+        config = slow_queries.get_config()
+
+        assert config["THRESHOLD"] == 0.5
+        assert slow_queries.slow_queries_dir(config) == Path("/tmp/example")
+
+    @override_settings(HARLEQUIN_SLOW_QUERIES={"THRESHOLD": 0.0})
+    def test_install(self):
+        with (
+            mock.patch("atexit.register") as register_mock,
+            mock.patch.object(os, "register_at_fork") as register_at_fork_mock,
+        ):
+            recorder = slow_queries.install()
+        self.addCleanup(connection_created.disconnect, recorder.connection_created)
+        self.addCleanup(connection.execute_wrappers.remove, recorder)
+
+        assert recorder.thread is None
+        assert register_mock.mock_calls == [mock.call(recorder.flush)]
+        assert register_at_fork_mock.mock_calls == [
+            mock.call(after_in_child=recorder.after_fork)
+        ]
+        assert recorder.directory == self.cache_dir / "slow-queries"
+        assert connection.execute_wrappers == [recorder]
+        connection_created.send(sender=None, connection=connection)
+        assert connection.execute_wrappers == [recorder]
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="Needs os.fork().")
+    @override_settings(HARLEQUIN_SLOW_QUERIES={"THRESHOLD": 0.0})
+    def test_fork(self):
+        with mock.patch("atexit.register"):
+            recorder = slow_queries.install()
+        self.addCleanup(connection_created.disconnect, recorder.connection_created)
+        self.addCleanup(connection.execute_wrappers.remove, recorder)
+        self.addCleanup(lambda: recorder.stopped.set())
+        recorder.record(connection, "SELECT 1", None, False, 0.25)
+        parent_thread = recorder.thread
+
+        # As if another thread were recording a query as the process forked.
+        with recorder.lock, warnings.catch_warnings():
+            # Python 3.12+ warns about forking with threads running.
+            warnings.simplefilter("ignore", DeprecationWarning)
+            pid = os.fork()
+        if pid == 0:
+            recorded = False
+            try:
+                recorder.record(connection, "SELECT 2", None, False, 0.5)
+                recorder.flush()
+                recorded = (
+                    recorder.thread is not None
+                    and recorder.thread is not parent_thread
+                    and recorder.thread.is_alive()
+                )
+            finally:
+                os._exit(0 if recorded else 1)
+        _, status = os.waitpid(pid, 0)
+
+        assert os.waitstatus_to_exitcode(status) == 0
+        data = json.loads(
+            (self.cache_dir / "slow-queries" / "default.json").read_text()
+        )
+        assert [(entry["count"], entry["total"]) for entry in data] == [(1, 0.5)]
+        assert list(recorder.entries["default"]) == ["SELECT ?"]
+        assert recorder.thread is parent_thread
+
+    @override_settings(HARLEQUIN_SLOW_QUERIES={})
+    def test_app_ready(self):
+        with mock.patch.object(slow_queries, "install") as install_mock:
+            apps.get_app_config("django_harlequin").ready()
+
+        assert install_mock.mock_calls == [mock.call()]
+
+
+class SlowQueriesCommandTests(SlowQueriesTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+    def test_slow_queries(self):
+        recorder = self.make_recorder()
+        recorder.record(connection, "SELECT 1", None, False, 0.002)
+        recorder.record(connection, "SELECT a", None, False, 0.001)
+        recorder.record(connection, "SELECT b", None, False, 0.003)
+        recorder.flush()
+
+        call_command("--slow-queries", "2")
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        workspace = self.cache_dir / "workspaces" / "default"
+        assert command[-2:] == ["--show-files", str(workspace)]
+        directory = workspace / "slow-queries"
+        assert sorted(p.name for p in directory.iterdir()) == ["01.sql", "02.sql"]
+        assert (directory / "01.sql").read_text() == (
+            "-- Recorded on database 'default'.\n"
+            + "-- Count: 1\n"
+            + "-- Total: 3.0ms\n"
+            + "-- p50: 3.0ms\n"
+            + "-- p95: 3.0ms\n"
+            + "-- Fingerprint: SELECT b\n"
+            + "\n"
+            + "SELECT b;\n"
+        )
+        assert (directory / "02.sql").read_text().endswith("\nSELECT 1;\n")
+
+    def test_slow_queries_none(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("--slow-queries")
+
+        path = self.cache_dir / "slow-queries" / "default.json"
+        assert excinfo.value.args[0] == f"No slow queries recorded in {str(path)!r}."
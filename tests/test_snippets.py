@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import datetime
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+from django.db import connection, models
+from django.db.models.functions import Lower
+from django.test import SimpleTestCase
+from django.test.utils import isolate_apps
+
+from django_harlequin.snippets import (
+    example_value,
+    keyset_sql,
+    model_snippets,
+    ordering_fields,
+    write_snippets,
+)
+from tests.testapp.models import Author, Book
+from tests.utils import get_field, run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class ExampleValueTests(SimpleTestCase):
+    def test_types(self):
+        assert example_value(get_field(Book, "pages"), connection) == "0"
+        assert example_value(get_field(Book, "title"), connection) == "''"
+        assert example_value(get_field(Book, "published"), connection) == "'2000-01-01'"
+
+    def test_foreign_key(self):
+        assert example_value(get_field(Book, "author"), connection) == "0"
+
+    def test_stored_form(self):
+        # SQLite stores UUIDs as hex strings.
+        assert example_value(get_field(Author, "uuid"), connection) == (
+            "'00000000000000000000000000000000'"
+        )
+
+
+@isolate_apps("tests.testapp")
+class OrderingFieldsTests(SimpleTestCase):
+    def test_no_ordering(self):
+        assert ordering_fields(Book) is None
+
+    def test_indexed(self):
+        class Post(models.Model):
+            title: models.CharField[str, str] = models.CharField(max_length=100)
+            created: models.DateTimeField[datetime.datetime, datetime.datetime] = (
+                models.DateTimeField()
+            )
+            author: models.ForeignKey[Author] = models.ForeignKey(
+                Author, on_delete=models.CASCADE
+            )
+
+            class Meta:
+                app_label = "testapp"
+                ordering = ["-created", "author_id"]
+                indexes = [models.Index(fields=["-created", "author"], name="x")]
+
+        fields = ordering_fields(Post)
+
+        assert fields == [
+            (get_field(Post, "created"), True),
+            (get_field(Post, "author"), False),
+            (Post._meta.pk, False),
+        ]
+
+    def test_pk(self):
+        class Post(models.Model):
+            class Meta:
+                app_label = "testapp"
+                ordering = ["-pk"]
+
+        assert ordering_fields(Post) == [(Post._meta.pk, True)]
+
+    def test_unindexed(self):
+        class Post(models.Model):
+            title: models.CharField[str, str] = models.CharField(max_length=100)
+
+            class Meta:
+                app_label = "testapp"
+                ordering = ["title"]
+
+        assert ordering_fields(Post) is None
+
+    def test_nullable(self):
+        class Post(models.Model):
+            created: models.DateTimeField[
+                datetime.datetime | None, datetime.datetime | None
+            ] = models.DateTimeField(null=True, db_index=True)
+
+            class Meta:
+                app_label = "testapp"
+                ordering = ["created"]
+
+        assert ordering_fields(Post) is None
+
+    def test_relation(self):
+        class Post(models.Model):
+            author: models.ForeignKey[Author] = models.ForeignKey(
+                Author, on_delete=models.CASCADE
+            )
+
+            class Meta:
+                app_label = "testapp"
+                ordering = ["author"]
+
+        assert ordering_fields(Post) is None
+
+    def test_lookup(self):
+        class Post(models.Model):
+            author: models.ForeignKey[Author] = models.ForeignKey(
+                Author, on_delete=models.CASCADE
+            )
+
+            class Meta:
+                app_label = "testapp"
+                ordering = ["author__name"]
+
+        assert ordering_fields(Post) is None
+
+
+class KeysetSqlTests(SimpleTestCase):
+    def test_one_column(self):
+        first, after = keyset_sql(connection, "t", [(Book._meta.pk, False)])
+
+        assert first == 'SELECT * FROM "t"\nORDER BY "id"\nLIMIT 100;'
+        assert after == 'SELECT * FROM "t"\nWHERE "id" > 0\nORDER BY "id"\nLIMIT 100;'
+
+    def test_row_values(self):
+        _, after = keyset_sql(
+            connection,
+            "t",
+            [(get_field(Book, "pages"), True), (Book._meta.pk, True)],
+        )
+
+        assert after == (
+            'SELECT * FROM "t"\n'
+            + 'WHERE ("pages", "id") < (0, 0)\n'
+            + 'ORDER BY "pages" DESC, "id" DESC\n'
+            + "LIMIT 100;"
+        )
+
+    def test_mixed_directions(self):
+        _, after = keyset_sql(
+            connection,
+            "t",
+            [(get_field(Book, "title"), False), (get_field(Book, "pages"), True)],
+        )
+
+        assert after == (
+            'SELECT * FROM "t"\n'
+            + 'WHERE ("title" > \'\') OR ("title" = \'\' AND "pages" < 0)\n'
+            + 'ORDER BY "title", "pages" DESC\n'
+            + "LIMIT 100;"
+        )
+
+
+class ModelSnippetsTests(SimpleTestCase):
+    def test_book(self):
+        snippets = model_snippets(Book, connection)
+
+        assert snippets.startswith("-- testapp.Book\n-- Table: testapp_book\n")
+        assert (
+            "-- Lookup through the index on (id), which is unique.\n"
+            + 'SELECT * FROM "testapp_book"\n'
+            + 'WHERE "id" = 0;\n'
+        ) in snippets
+        assert (
+            "-- Lookup through the index on (title, published).\n"
+            + 'SELECT * FROM "testapp_book"\n'
+            + "WHERE \"title\" = '' AND \"published\" = '2000-01-01'\n"
+            + "LIMIT 100;\n"
+        ) in snippets
+        assert (
+            "-- Join testapp.Author through author, on its indexed id column.\n"
+            + 'SELECT * FROM "testapp_book"\n'
+            + 'JOIN "testapp_author" ON "testapp_author"."id" = '
+            + '"testapp_book"."author_id"\n'
+            + 'ORDER BY "testapp_book"."id"\n'
+            + "LIMIT 100;\n"
+        ) in snippets
+        assert "Meta.ordering" not in snippets
+
+    def test_referenced(self):
+        snippets = model_snippets(Author, connection)
+
+        assert snippets.endswith(
+            "-- testapp.Book rows referencing one row, joined through the index "
+            + "on testapp_book.author_id.\n"
+            + 'SELECT "testapp_book".* FROM "testapp_author"\n'
+            + 'JOIN "testapp_book" ON "testapp_book"."author_id" = '
+            + '"testapp_author"."id"\n'
+            + 'WHERE "testapp_author"."id" = 0\n'
+            + 'ORDER BY "testapp_book"."id"\n'
+            + "LIMIT 100;\n"
+        )
+
+    @isolate_apps("tests.testapp")
+    def test_ordering_and_unindexed_references(self):
+        class Post(models.Model):
+            created: models.DateTimeField[datetime.datetime, datetime.datetime] = (
+                models.DateTimeField(db_index=True)
+            )
+
+            class Meta:
+                app_label = "testapp"
+                ordering = ["-created"]
+                indexes = [models.Index(fields=["-created"], name="created_idx")]
+
+        class Comment(models.Model):
+            post: models.ForeignKey[Post] = models.ForeignKey(
+                Post, on_delete=models.CASCADE, db_index=False
+            )
+
+            class Meta:
+                app_label = "testapp"
+
+        snippets = model_snippets(Post, connection)
+
+        assert (
+            "-- Keyset pagination by Meta.ordering: first page.\n"
+            + 'SELECT * FROM "testapp_post"\n'
+            + 'ORDER BY "created" DESC, "id" DESC\n'
+        ) in snippets
+        assert snippets.count("through the index on (created).") == 1
+        assert "testapp.Comment" not in snippets
+
+    @isolate_apps("tests.testapp")
+    def test_expression_index(self):
+        class Post(models.Model):
+            name: models.CharField[str, str] = models.CharField(max_length=50)
+
+            class Meta:
+                app_label = "testapp"
+                ordering = ["name"]
+                indexes = [models.Index(Lower("name"), name="post_lower_name")]
+
+        class Comment(models.Model):
+            post: models.ForeignKey[Post] = models.ForeignKey(
+                Post, on_delete=models.CASCADE, db_index=False
+            )
+
+            class Meta:
+                app_label = "testapp"
+                indexes = [models.Index(Lower("post"), name="comment_lower_post")]
+
+        snippets = model_snippets(Post, connection)
+
+        assert "WHERE \n" not in snippets
+        assert "Lookup through the index on ()" not in snippets
+        assert "Meta.ordering" not in snippets
+        assert "testapp.Comment" not in snippets
+
+
+class WriteSnippetsTests(SimpleTestCase):
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_snippets(Path(tmpdir), connection)
+            files = sorted(
+                str(path.relative_to(tmpdir)) for path in Path(tmpdir).rglob("*.sql")
+            )
+
+        assert "testapp/testapp_book.sql" in files
+        assert "testapp/testapp_book_tags.sql" in files
+
+
+class SnippetsCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_snippets(self):
+        call_command("--snippets")
+
+        root = self.cache_dir / "workspaces" / "default"
+        assert (root / "snippets" / "testapp" / "testapp_author.sql").exists()
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[-2:] == ["--show-files", str(root)]
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import os
+import signal
+import sys
+from functools import partial
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from django_harlequin import spawn
+from django_harlequin.spawn import (
+    Limits,
+    Usage,
+    format_size,
+    parse_size,
+    run,
+    wrap_command,
+)
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class LimitsTests(SimpleTestCase):
+    def test_bool(self):
+        assert not Limits()
+        assert Limits(nice=0)
+
+
+class ParseSizeTests(SimpleTestCase):
+    def test_units(self):
+        assert parse_size("512") == 512
+        assert parse_size("64kB") == 65_536
+        assert parse_size(" 4 GB ") == 4 * 1024**3
+
+    def test_invalid(self):
+        with pytest.raises(CommandError) as excinfo:
+            parse_size("4 gigs")
+
+        assert excinfo.value.args[0] == "Invalid size '4 gigs'."
+
+
+class FormatSizeTests(SimpleTestCase):
+    def test_format(self):
+        assert format_size(512) == "512.0B"
+        assert format_size(150 * 1024**2) == "150.0MB"
+        assert format_size(3 * 1024**4) == "3.0TB"
+
+
+class WrapCommandTests(SimpleTestCase):
+    def test_no_limits(self):
+        assert wrap_command(["harlequin"], Limits()) == ["harlequin"]
+
+    def test_limits(self):
+        with mock.patch("shutil.which", return_value="/usr/bin/x"):
+            command = wrap_command(
+                ["harlequin"],
+                Limits(memory=1024, cpu=60, nice=10, ionice=7, cgroup_memory=1024**3),
+            )
+
+        assert command == [
+            "systemd-run",
+            "--user",
+            "--scope",
+            "--quiet",
+            "--property",
+            "MemoryMax=1073741824",
+            "--property",
+            "MemorySwapMax=0",
+            "--",
+            "ionice",
+            "--class",
+            "2",
+            "--classdata",
+            "7",
+            "prlimit",
+            "--as=1024",
+            "--cpu=60",
+            "--",
+            "nice",
+            "-n",
+            "10",
+            "harlequin",
+        ]
+
+    def test_cpu_limit(self):
+        with mock.patch("shutil.which", return_value="/usr/bin/x"):
+            command = wrap_command(["harlequin"], Limits(cpu=60))
+
+        assert command == ["prlimit", "--cpu=60", "--", "harlequin"]
+
+    def test_memory_limit(self):
+        with mock.patch("shutil.which", return_value="/usr/bin/x"):
+            command = wrap_command(["harlequin"], Limits(memory=1024))
+
+        assert command == ["prlimit", "--as=1024", "--", "harlequin"]
+
+    def test_no_systemd_run(self):
+        with (
+            mock.patch("shutil.which", return_value=None),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            wrap_command(["harlequin"], Limits(cgroup_memory=1024))
+
+        assert excinfo.value.args[0] == "--cgroup-memory-max requires systemd-run."
+
+    def test_no_ionice(self):
+        with (
+            mock.patch("shutil.which", return_value=None),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            wrap_command(["harlequin"], Limits(ionice=0))
+
+        assert excinfo.value.args[0] == "--ionice requires ionice."
+
+    def test_no_prlimit(self):
+        with (
+            mock.patch("shutil.which", return_value=None),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            wrap_command(["harlequin"], Limits(memory=1024))
+
+        assert excinfo.value.args[0] == (
+            "--memory-limit and --cpu-limit require prlimit."
+        )
+
+    def test_no_nice(self):
+        with (
+            mock.patch("shutil.which", return_value=None),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            wrap_command(["harlequin"], Limits(nice=10))
+
+        assert excinfo.value.args[0] == "--nice requires nice."
+
+
+class RunTests(SimpleTestCase):
+    def test_run(self):
+        usage = run(
+            [sys.executable, "-c", "import sys; sys.exit(3)"],
+            dict(os.environ),
+            Limits(cpu=60),
+        )
+
+        assert usage.returncode == 3
+        assert usage.peak_rss > 1024**2
+        assert usage.wall_time > 0
+        assert signal.getsignal(signal.SIGINT) is signal.default_int_handler
+
+    def test_missing(self):
+        with pytest.raises(CommandError) as excinfo:
+            run(["/nonexistent/harlequin"], {}, Limits())
+
+        assert excinfo.value.args[0].startswith("Cannot run '/nonexistent/harlequin': ")
+
+
+class SpawnCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_spawn(self):
+        with mock.patch.object(
+            spawn, "run", return_value=Usage(0, 150 * 1024**2, 12.25)
+        ) as run_mock:
+            _, err, _ = call_command("--spawn")
+
+        assert self.execvpe_mock.mock_calls == []
+        ((command, env, limits), _) = run_mock.call_args
+        assert command[:3] == ["harlequin", "-a", "sqlite"]
+        assert "PATH" in env
+        assert limits == Limits()
+        assert err == "Harlequin exited after 12.2s, with a peak RSS of 150.0MB.\n"
+
+    def test_limits_imply_spawn(self):
+        with mock.patch.object(spawn, "run", return_value=Usage(0, 0, 0.0)) as run_mock:
+            _, err, _ = call_command(
+                "--memory-limit",
+                "4GB",
+                "--cpu-limit",
+                "600",
+                "--nice",
+                "10",
+                "--ionice",
+                "7",
+                "--cgroup-memory-max",
+                "2GB",
+                "--verbosity",
+                "0",
+            )
+
+        assert self.execvpe_mock.mock_calls == []
+        assert run_mock.call_args.args[2] == Limits(
+            memory=4 * 1024**3,
+            cpu=600,
+            nice=10,
+            ionice=7,
+            cgroup_memory=2 * 1024**3,
+        )
+        assert err == ""
+
+    def test_exit_code(self):
+        with (
+            mock.patch.object(spawn, "run", return_value=Usage(2, 0, 0.0)),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            call_command("--spawn")
+
+        assert excinfo.value.args[0] == "Harlequin exited with code 2."
+        assert excinfo.value.returncode == 2
+
+    def test_killed(self):
+        with (
+            mock.patch.object(spawn, "run", return_value=Usage(-9, 0, 0.0)),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            call_command("--spawn")
+
+        assert excinfo.value.args[0] == "Harlequin was killed by SIGKILL."
+        assert excinfo.value.returncode == 137
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import datetime as dt
+from decimal import Decimal
+from uuid import UUID
+
+from django.test import SimpleTestCase
+
+from django_harlequin.sql import explain, fingerprint, interpolate, quote_literal
+
+
+class JsonAdapter:
+    def __init__(self, obj: object) -> None:
+        self.obj = obj
+
+
+class QuoteLiteralTests(SimpleTestCase):
+    def test_none(self):
+        assert quote_literal(None, "postgresql") == "NULL"
+
+    def test_bool(self):
+        assert quote_literal(True, "postgresql") == "TRUE"
+        assert quote_literal(False, "mysql") == "FALSE"
+        assert quote_literal(True, "sqlite") == "1"
+        assert quote_literal(False, "sqlite") == "0"
+
+    def test_numbers(self):
+        assert quote_literal(12, "sqlite") == "12"
+        assert quote_literal(1.5, "sqlite") == "1.5"
+        assert quote_literal(Decimal("9.99"), "sqlite") == "9.99"
+
+    def test_bytes(self):
+        assert quote_literal(b"\x00\xff", "postgresql") == "'\\x00ff'::bytea"
+        assert quote_literal(memoryview(b"\x01"), "mysql") == "X'01'"
+
+    def test_sequences(self):
+        assert quote_literal([1, "a"], "postgresql") == "ARRAY[1, 'a']"
+        assert quote_literal((1, 2), "sqlite") == "(1, 2)"
+
+    def test_dates(self):
+        value = dt.datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt.timezone.utc)
+        assert quote_literal(value, "postgresql") == "'2024-01-02 03:04:05+00:00'"
+        assert quote_literal(dt.date(2024, 1, 2), "mysql") == "'2024-01-02'"
+        assert quote_literal(dt.time(3, 4), "sqlite") == "'03:04:00'"
+
+    def test_uuid(self):
+        value = UUID("12345678-1234-5678-1234-567812345678")
+        assert (
+            quote_literal(value, "postgresql")
+            == "'12345678-1234-5678-1234-567812345678'"
+        )
+
+    def test_json(self):
+        assert quote_literal({"a": 1}, "sqlite") == """'{"a": 1}'"""
+        assert quote_literal(JsonAdapter(["x"]), "postgresql") == """'["x"]'"""
+
+    def test_strings(self):
+        assert quote_literal("it's", "postgresql") == "'it''s'"
+        assert quote_literal("a\\b", "postgresql") == "'a\\b'"
+        assert quote_literal("a\\b'", "mysql") == "'a\\\\b'''"
+
+
+class InterpolateTests(SimpleTestCase):
+    def test_interpolate(self):
+        assert (
+            interpolate("SELECT %s, %s LIKE '%%x'", [1, "y"], "sqlite")
+            == "SELECT 1, 'y' LIKE '%x'"
+        )
+
+
+class ExplainTests(SimpleTestCase):
+    def test_postgresql(self):
+        assert (
+            explain("SELECT 1", "postgresql") == "EXPLAIN (ANALYZE, BUFFERS) SELECT 1"
+        )
+
+    def test_mysql(self):
+        assert explain("SELECT 1", "mysql") == "EXPLAIN FORMAT=JSON SELECT 1"
+
+    def test_sqlite(self):
+        assert explain("SELECT 1", "sqlite") == "EXPLAIN QUERY PLAN SELECT 1"
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_placeholders(self):
+        assert (
+            fingerprint('SELECT *\n  FROM "t" WHERE "id" IN (%s, %s, %s) AND x = %s')
+            == 'SELECT * FROM "t" WHERE "id" IN (...) AND x = ?'
+        )
+
+    def test_literals(self):
+        assert (
+            fingerprint("SELECT * FROM t1 WHERE name = 'O''Reilly' AND n > 1.5")
+            == "SELECT * FROM t1 WHERE name = ? AND n > ?"
+        )
+
+    def test_same_fingerprint(self):
+        assert fingerprint("SELECT 1 WHERE x IN (1, 2)") == fingerprint(
+            "SELECT  2 WHERE x IN (3)"
+        )
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.db.utils import ConnectionHandler, OperationalError
+from django.test import SimpleTestCase, TestCase
+
+from django_harlequin import launcher
+from django_harlequin import sqlite as harlequin_sqlite
+from django_harlequin.management.commands import harlequin as harlequin_command
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+
+class SqliteTestCase(SimpleTestCase):
+    def setUp(self):
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def make_database(self, rows: int) -> Path:
+        path = self.cache_dir / "live.sqlite3"
+        with sqlite3.connect(path) as db:
+            db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, data TEXT)")
+            db.executemany("INSERT INTO t (data) VALUES (?)", [("x" * 1000,)] * rows)
+        db.close()
+        return path
+
+    def connections(self, path: Path) -> ConnectionHandler:
+        return ConnectionHandler(
+            {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": str(path)}}
+        )
+
+
+class SnapshotTests(SqliteTestCase):
+    databases = {"default"}
+
+    def test_snapshot(self):
+        path = self.make_database(rows=5000)
+        connection = self.connections(path)["default"]
+        calls = []
+
+        result = harlequin_sqlite.snapshot(
+            connection, lambda remaining, total: calls.append((remaining, total))
+        )
+        connection.close()
+
+        assert result == self.cache_dir / "snapshots" / "default.sqlite3"
+        with sqlite3.connect(result) as db:
+            assert db.execute("SELECT COUNT(*) FROM t").fetchone() == (5000,)
+        db.close()
+        assert len(calls) > 1
+        assert calls[-1][0] == 0
+        assert list(result.parent.iterdir()) == [result]
+
+    def test_snapshot_error_removes_temporary_file(self):
+        connection = self.connections(self.cache_dir / "missing" / "db.sqlite3")[
+            "default"
+        ]
+
+        with pytest.raises(OperationalError):
+            harlequin_sqlite.snapshot(connection)
+
+        assert list((self.cache_dir / "snapshots").iterdir()) == []
+
+    @mock.patch.object(harlequin_command.Command, "write_launcher_spec", True)
+    def test_command(self):
+        path = self.make_database(rows=10)
+
+        with mock.patch.object(
+            harlequin_command, "connections", self.connections(path)
+        ):
+            _, err, _ = call_command("--snapshot", "--verbosity", "2")
+
+        snapshot_path = self.cache_dir / "snapshots" / "default.sqlite3"
+        assert err.startswith("Copied ")
+        assert err.endswith(f"Snapshot written to {snapshot_path}.\n")
+        assert self.execvpe_mock.mock_calls == [
+            mock.call(
+                "harlequin",
+                ["harlequin", "-a", "sqlite", str(snapshot_path)],
+                env=mock.ANY,
+            ),
+        ]
+        assert launcher.read_spec("tests.settings", "default") is None
+
+    def test_command_quiet(self):
+        path = self.make_database(rows=10)
+
+        with mock.patch.object(
+            harlequin_command, "connections", self.connections(path)
+        ):
+            _, err, _ = call_command("--snapshot", "--verbosity", "0")
+
+        assert err == ""
+
+    @mock.patch.object(
+        harlequin_command,
+        "connections",
+        ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "django.db.backends.postgresql",
+                    "NAME": "exampledb",
+                }
+            }
+        ),
+    )
+    def test_command_not_sqlite(self):
+        with pytest.raises(CommandError) as excinfo:
+            call_command("--snapshot")
+
+        assert excinfo.value.args[0] == (
+            "--snapshot is only supported for SQLite databases."
+        )
+
+
+class ReadOnlyTests(SqliteTestCase):
+    def test_read_only_uri(self):
+        assert harlequin_sqlite.read_only_uri("/srv/db.sqlite3") == (
+            "file:///srv/db.sqlite3?mode=ro"
+        )
+        assert harlequin_sqlite.read_only_uri(":memory:") == ":memory:"
+        assert harlequin_sqlite.read_only_uri("file:x?mode=memory") == (
+            "file:x?mode=memory"
+        )
+
+    def test_mmap_init_script(self):
+        with mock.patch.object(Path, "home", return_value=self.cache_dir):
+            path = harlequin_sqlite.mmap_init_script()
+
+        assert path.read_text() == "PRAGMA mmap_size = 1073741824;\n"
+        assert path.stat().st_mode & 0o777 == 0o600
+
+    def test_mmap_init_script_sqliterc(self):
+        (self.cache_dir / ".sqliterc").write_text("PRAGMA cache_size = -64000;\n\n")
+
+        with mock.patch.object(Path, "home", return_value=self.cache_dir):
+            path = harlequin_sqlite.mmap_init_script()
+
+        assert path.read_text() == (
+            "PRAGMA mmap_size = 1073741824;\n\nPRAGMA cache_size = -64000;\n"
+        )
+
+    def test_command_read_only(self):
+        path = self.make_database(rows=1)
+
+        with mock.patch.object(
+            harlequin_command, "connections", self.connections(path)
+        ):
+            call_command("--read-only")
+
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[-4:] == [
+            "--read-only",
+            "--init-path",
+            str(self.cache_dir / "sqlite" / "mmap.sql"),
+            f"{path.as_uri()}?mode=ro",
+        ]
+        uri = command[-1]
+        db = sqlite3.connect(uri, uri=True)
+        self.addCleanup(db.close)
+        with pytest.raises(sqlite3.OperationalError):
+            db.execute("INSERT INTO t (data) VALUES ('y')")
+
+
+class SnapshotLiveDatabaseTests(TestCase):
+    def test_snapshot_test_database(self):
+        from django.db import connection
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch.dict(os.environ, {"DJANGO_HARLEQUIN_CACHE_DIR": tmp}):
+                path = harlequin_sqlite.snapshot(connection)
+
+            with sqlite3.connect(path) as db:
+                tables = {
+                    row[0] for row in db.execute("SELECT name FROM sqlite_master")
+                }
+            db.close()
+
+        assert "testapp_book" in tables
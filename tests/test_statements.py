@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from django_harlequin import statements
+from django_harlequin.statements import (
+    Statement,
+    statement_models,
+    top_statements,
+    write_top_statements,
+)
+from tests.utils import run_command, use_cache_dir
+
+call_command = partial(run_command, "harlequin")
+
+# A query of SQLite’s own tables shaped like the statistics queries.
+SQLITE_QUERY = """
+    SELECT 'SELECT * FROM testapp_book', 3, 12.5, 4.25, 30, 7
+    ORDER BY '{order}'
+    LIMIT %s
+"""
+
+
+class TopStatementsTests(TestCase):
+    def test_unsupported(self):
+        with pytest.raises(CommandError) as excinfo:
+            top_statements(connection, 20)
+
+        assert excinfo.value.args[0] == (
+            "--top-statements requires PostgreSQL or MySQL, not SQLite."
+        )
+
+    def test_fetch(self):
+        with mock.patch.dict(statements.STATEMENT_QUERIES, {"sqlite": SQLITE_QUERY}):
+            result = top_statements(connection, 20)
+
+        statement = Statement("SELECT * FROM testapp_book", 3, 12.5, 4.25, 30, 7)
+        assert result == {
+            "time": [statement],
+            "io": [statement],
+            "rows": [statement],
+        }
+
+    def test_statistics_unavailable(self):
+        with (
+            mock.patch.dict(
+                statements.STATEMENT_QUERIES,
+                {"sqlite": statements.STATEMENT_QUERIES["postgresql"]},
+            ),
+            pytest.raises(CommandError) as excinfo,
+        ):
+            top_statements(connection, 20)
+
+        assert excinfo.value.args[0].startswith(
+            "Cannot read statement statistics for database 'default': "
+        )
+
+
+class StatementModelsTests(SimpleTestCase):
+    def test_models(self):
+        tables = {"testapp_author": "testapp.Author", "testapp_book": "testapp.Book"}
+
+        labels = statement_models(
+            'SELECT * FROM "testapp_book" INNER JOIN `TESTAPP_AUTHOR` '
+            + "ON testapp_author.id = testapp_book.author_id WHERE title = $1",
+            tables,
+        )
+
+        assert labels == ["testapp.Book", "testapp.Author"]
+
+    def test_none(self):
+        assert statement_models("SELECT 1", {"testapp_book": "testapp.Book"}) == []
+
+
+class WriteTopStatementsTests(SimpleTestCase):
+    def test_write(self):
+        result = {
+            "time": [
+                Statement("SELECT * FROM testapp_book;", 1_000, 2_500.0, 2.5, 10, 300),
+                Statement("SELECT 1", 5, 1.0, 0.2, 5, 0),
+            ],
+            "io": [],
+            "rows": [],
+        }
+
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            mock.patch.object(connection, "vendor", "postgresql"),
+        ):
+            directory = Path(tmpdir)
+            write_top_statements(result, directory, connection)
+            first = (directory / "by-time" / "01.sql").read_text()
+            second = (directory / "by-time" / "02.sql").read_text()
+            io = list((directory / "by-io").iterdir())
+
+        assert first == (
+            "-- Rank 1 by total time on database 'default'.\n"
+            + "-- Models: testapp.Book\n"
+            + "-- Calls: 1,000\n"
+            + "-- Total time: 2,500.0ms\n"
+            + "-- Mean time: 2.5ms\n"
+            + "-- Rows: 10\n"
+            + "-- Blocks read or written: 300\n"
+            + "\n"
+            + "SELECT * FROM testapp_book;\n"
+        )
+        assert "-- Models: none found\n" in second
+        assert io == []
+
+
+class TopStatementsCommandTests(SimpleTestCase):
+    def setUp(self) -> None:
+        execvpe_mocker = mock.patch.object(os, "execvpe")
+        self.execvpe_mock = execvpe_mocker.start()
+        self.addCleanup(execvpe_mocker.stop)
+
+        self.cache_dir = use_cache_dir(self)
+
+    def test_top_statements(self):
+        result: dict[str, list[Statement]] = {"time": [], "io": [], "rows": []}
+        with (
+            mock.patch.object(
+                statements, "top_statements", return_value=result
+            ) as top_mock,
+            mock.patch.dict(statements.IO_LABELS, {"sqlite": "I/O"}),
+        ):
+            call_command("--top-statements", "5")
+
+        assert top_mock.call_args.args[1] == 5
+        root = self.cache_dir / "workspaces" / "default"
+        assert sorted(path.name for path in (root / "top-statements").iterdir()) == [
+            "by-io",
+            "by-rows",
+            "by-time",
+        ]
+        command = self.execvpe_mock.mock_calls[0].args[1]
+        assert command[-2:] == ["--show-files", str(root)]
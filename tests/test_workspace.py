@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from django.test import SimpleTestCase
+
+from django_harlequin.workspace import Workspace
+from tests.utils import use_cache_dir
+
+
+class WorkspaceTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = use_cache_dir(self)
+
+    def test_unused(self):
+        command = ["harlequin"]
+
+        Workspace("default").extend_command(command)
+
+        assert command == ["harlequin"]
+
+    def test_sections(self):
+        root = self.cache_dir / "workspaces" / "replica"
+        (root / "stale").mkdir(parents=True)
+        workspace = Workspace("replica")
+
+        first = workspace.section("first")
+        (first / "a.sql").write_text("SELECT 1;")
+        second = workspace.section("second")
+        command = ["harlequin"]
+        workspace.extend_command(command)
+
+        assert sorted(p.name for p in root.iterdir()) == ["first", "second"]
+        assert second.is_dir()
+        assert command == ["harlequin", "--show-files", str(root)]
+
+    def test_section_replaced(self):
+        workspace = Workspace("default")
+        (workspace.section("catalog") / "a.sql").write_text("SELECT 1;")
+
+        path = workspace.section("catalog")
+
+        assert list(path.iterdir()) == []
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import datetime
+import decimal
+import uuid
+
+from django.db import models
+
+
+class Author(models.Model):
+    name: models.CharField[str, str] = models.CharField(max_length=100, unique=True)
+    email: models.EmailField[str, str] = models.EmailField(db_index=True)
+    uuid: models.UUIDField[uuid.UUID, uuid.UUID] = models.UUIDField(default=uuid.uuid4)
+
+
+class Tag(models.Model):
+    name: models.CharField[str, str] = models.CharField(max_length=50)
+
+
+class Book(models.Model):
+    author: models.ForeignKey[Author] = models.ForeignKey(
+        Author, on_delete=models.CASCADE
+    )
+    title: models.CharField[str, str] = models.CharField(max_length=200)
+    published: models.DateField[datetime.date | None, datetime.date | None] = (
+        models.DateField(null=True)
+    )
+    pages: models.IntegerField[int, int] = models.IntegerField(default=0)
+    price: models.DecimalField[decimal.Decimal, decimal.Decimal] = models.DecimalField(
+        max_digits=6, decimal_places=2, default=0
+    )
+    metadata = models.JSONField(default=dict)
+    tags = models.ManyToManyField(Tag)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["title", "-published"], name="book_title_idx"),
+        ]
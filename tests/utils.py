@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import os
+import tempfile
+import unittest
 from io import StringIO
+from pathlib import Path
+from typing import Any
+from unittest import mock
 
 from django.core.management import call_command
+from django.db import models
 
 
 def run_command(*args, **kwargs):
@@ -14,3 +21,24 @@ def run_command(*args, **kwargs):
     except SystemExit as exc:  # pragma: no cover
         returncode = exc.code
     return out.getvalue(), err.getvalue(), returncode
+
+
+def use_cache_dir(test: unittest.TestCase) -> Path:
+    """
+    Point the cache directory at a temporary directory for the test, and
+    return it.
+    """
+    cache_dir = tempfile.TemporaryDirectory()
+    test.addCleanup(cache_dir.cleanup)
+    env_mocker = mock.patch.dict(
+        os.environ, {"DJANGO_HARLEQUIN_CACHE_DIR": cache_dir.name}
+    )
+    env_mocker.start()
+    test.addCleanup(env_mocker.stop)
+    return Path(cache_dir.name)
+
+
+def get_field(model: type[models.Model], name: str) -> models.Field[Any, Any]:
+    field = model._meta.get_field(name)
+    assert isinstance(field, models.Field)
+    return field